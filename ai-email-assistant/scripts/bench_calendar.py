@@ -0,0 +1,120 @@
+# scripts/bench_calendar.py
+"""
+Scheduling many meetings with per-event Calendar API calls versus CalendarSync
+(one free/busy read, an interval index, one batched write), against
+FakeCalendarHttp.
+
+    python -m scripts.bench_calendar
+"""
+import datetime
+import time
+
+from googleapiclient.discovery import build
+
+from src.services.calendar_service import (
+    CalendarSync,
+    IntervalIndex,
+    localize_datetime,
+)
+from tests.fakes.google_calendar import FakeCalendarHttp
+
+
+def _interval(event):
+    start, end = (
+        datetime.datetime.fromisoformat(event[key]["dateTime"].replace("Z", "+00:00"))
+        for key in ("start", "end")
+    )
+    return start, end, event
+
+
+def main(busy_events=400, meetings=120):
+    length = datetime.timedelta(minutes=30)
+    origin = localize_datetime(datetime.datetime.now()).replace(second=0, microsecond=0)
+    requests = [
+        (f"Meeting {i}", origin + datetime.timedelta(minutes=45 * i + 20))
+        for i in range(meetings)
+    ]
+    print(f"\n--- Scheduling {meetings} meetings over {busy_events} busy events ---")
+
+    # Before: one events.list conflict check and one insert per meeting
+    http = FakeCalendarHttp.with_events(busy_events)
+    service = build("calendar", "v3", http=http, static_discovery=True)
+    start = time.perf_counter()
+    scheduled = 0
+    for summary, begin in requests:
+        busy = (
+            service.events()
+            .list(
+                calendarId="primary",
+                timeMin=begin.isoformat(),
+                timeMax=(begin + length).isoformat(),
+                singleEvents=True,
+            )
+            .execute()
+        )
+        if not busy.get("items"):
+            body = {
+                "summary": summary,
+                "start": {"dateTime": begin.isoformat()},
+                "end": {"dateTime": (begin + length).isoformat()},
+            }
+            service.events().insert(calendarId="primary", body=body).execute()
+            scheduled += 1
+    elapsed = time.perf_counter() - start
+    print(
+        f"Per-event calls: {http.round_trips} round trips, {scheduled} scheduled, "
+        f"{elapsed * 1000:.0f} ms"
+    )
+
+    # After: one read into the interval index, one batched write
+    http = FakeCalendarHttp.with_events(busy_events)
+    sync = CalendarSync(
+        service=build("calendar", "v3", http=http, static_discovery=True)
+    )
+    start = time.perf_counter()
+    sync.load(origin)
+    for summary, begin in requests:
+        if not sync.conflicts(begin, begin + length):
+            sync.queue_event(summary, begin, begin + length)
+    created = sync.flush()
+    elapsed = time.perf_counter() - start
+    print(
+        f"CalendarSync:    {http.round_trips} round trips ({sync.reads} list pages, "
+        f"{sync.writes} batch), {sum(1 for e in created.values() if e)} scheduled, "
+        f"{elapsed * 1000:.0f} ms"
+    )
+    # Queued events block later requests: nothing scheduled twice or overlapping
+    intervals = sorted((_interval(e) for e in http.events), key=lambda item: item[0])
+    index = IntervalIndex(intervals)
+    overlaps = sum(len(index.conflicts(s, e)) > 1 for s, e, _ in intervals)
+    print(f"Overlapping events after sync: {overlaps}")
+
+    # Conflict query cost: linear scan vs the index
+    probes = [begin for _, begin in requests] * 50
+    start = time.perf_counter()
+    for begin in probes:
+        any(s < begin + length and e > begin for s, e, _ in intervals)
+    linear = (time.perf_counter() - start) / len(probes)
+    start = time.perf_counter()
+    for begin in probes:
+        index.overlaps(begin, begin + length)
+    indexed = (time.perf_counter() - start) / len(probes)
+    print(
+        f"Conflict query over {len(intervals)} events: linear {linear * 1e6:.1f} us, "
+        f"index {indexed * 1e6:.1f} us"
+    )
+    # A long early event (an off-site week) overlaps every probe but must not
+    # make each query walk back over everything after it
+    index.add(origin, origin + datetime.timedelta(days=7), {"summary": "Off-site"})
+    start = time.perf_counter()
+    for begin in probes:
+        index.conflicts(begin, begin + length)
+    long_event = (time.perf_counter() - start) / len(probes)
+    print(f"Conflict listing behind a week-long event: {long_event * 1e6:.1f} us")
+    slot = sync.find_free_slot(length, origin)
+    print(f"Next free 30 minutes from now: {slot.strftime('%Y-%m-%d %I:%M %p %Z')}")
+    print("------------------------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
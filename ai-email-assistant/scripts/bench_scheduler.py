@@ -0,0 +1,67 @@
+# scripts/bench_scheduler.py
+"""
+Per-cycle latency and idle CPU of the adaptive polling loop
+(src/utils/scheduler.py) against FakeGmailHttp, with mail arriving in bursts.
+
+    python -m scripts.bench_scheduler
+"""
+import contextlib
+import io
+import os
+import tempfile
+import threading
+
+from googleapiclient.discovery import build
+
+import src.storage.database as database
+from src.services.email_service import sync_inbox
+from src.utils.scheduler import AdaptiveInterval, PollingScheduler
+from tests.fakes.gmail import FakeGmailHttp, make_message
+
+
+class RecordingInterval(AdaptiveInterval):
+    """AdaptiveInterval that keeps every wait it hands out."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = []
+
+    def next(self, found):
+        self.waits.append(super().next(found))
+        return self.waits[-1]
+
+
+def main():
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "scheduler_test.db")
+    database.initialize_database()
+    http = FakeGmailHttp.with_messages(50)
+    service = build("gmail", "v1", http=http, static_discovery=True)
+
+    arrivals = {3: 5, 4: 2, 12: 8}  # cycle number -> messages delivered before it
+    next_id = [1000]
+
+    def cycle():
+        for _ in range(arrivals.get(scheduler.cycles, 0)):
+            http.add_message(make_message(next_id[0]))
+            next_id[0] += 1
+        with contextlib.redirect_stdout(io.StringIO()):
+            return sync_inbox(service, mode="incremental")
+
+    scheduler = PollingScheduler(cycle, RecordingInterval(0.01, 0.16))
+    print("\n--- Adaptive polling against FakeGmailHttp ---")
+    stats = scheduler.run(max_cycles=20)
+    print("Waits (s):", " ".join(f"{w:.2f}" for w in scheduler.interval.waits))
+    print(f"Stats: {stats}")
+    print(f"Round trips: {http.round_trips} for {stats['cycles']} cycles")
+
+    # Idle CPU over a longer quiet period
+    scheduler = PollingScheduler(lambda: 0, AdaptiveInterval(0.5, 0.5))
+    timer = threading.Timer(3.0, scheduler.stop)
+    timer.start()
+    stats = scheduler.run()
+    print(f"Idle for 3s: {stats['cycles']} cycles, {stats['idle_cpu_percent']}% CPU")
+    print("----------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# scripts/bench_slack.py
+"""
+One Slack post per important email versus the digest SlackNotifier, against
+FakeSlackServer (1 post/s per channel, like Slack).
+
+    python -m scripts.bench_slack
+"""
+import statistics
+import time
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+from src.services.slack_service import SlackNotifier
+from tests.fakes.slack import FakeSlackServer
+
+
+def main(count=40):
+    emails = [
+        {
+            "sender": f"person{i}@example.com",
+            "subject": f"Contract <draft {i}> & pricing",
+            "intent": "Action Required",
+            "message_id": f"msg{i:04d}",
+        }
+        for i in range(count)
+    ]
+    print(f"\n--- {count} important emails, Slack at 1 post/s per channel ---")
+
+    with FakeSlackServer() as slack:
+        client = WebClient(token="xoxb-fake", base_url=slack.url)
+        start, sent = time.perf_counter(), 0
+        for email in emails:
+            try:
+                client.chat_postMessage(channel="C1", text=email["subject"])
+                sent += 1
+            except SlackApiError:
+                pass  # Rate limited: the old code logs this and moves on
+        elapsed = time.perf_counter() - start
+        print(
+            f"One post per email:  processing blocked {elapsed:.2f}s, "
+            f"{sent}/{count} delivered, {slack.rate_limited} rate-limited"
+        )
+
+    with FakeSlackServer() as slack:
+        client = WebClient(token="xoxb-fake", base_url=slack.url)
+        notifier = SlackNotifier(client, "C1", window_seconds=0.5, max_batch=10)
+        futures, enqueue = [], []
+        start = time.perf_counter()
+        for email in emails:
+            t = time.perf_counter()
+            futures.append(notifier.notify(email["subject"], email))
+            enqueue.append(time.perf_counter() - t)
+            time.sleep(0.02)  # Emails finish processing over ~1s
+        blocked = sum(enqueue)
+        notifier.flush(timeout=30)
+        elapsed = time.perf_counter() - start
+        delivered = sum(f.result() for f in futures)
+        print(
+            f"Digest notifier:     processing blocked {blocked * 1000:.2f}ms "
+            f"(notify p50 {statistics.median(enqueue) * 1e6:.0f}us), "
+            f"{delivered}/{count} delivered in {len(slack.messages)} posts "
+            f"after {elapsed:.2f}s"
+        )
+        print(f"  Notifier stats: {notifier.stats()}")
+        print(f"  First digest: {len(slack.messages[0]['blocks'])} blocks")
+
+        # A 429 and a 500 are retried; Retry-After (1s) is honoured
+        slack.fail_next = [429, 500]
+        start = time.perf_counter()
+        future = notifier.notify("Retried notification")
+        notifier.flush(timeout=30)
+        print(
+            f"429 then 500 then OK: delivered={future.result()} after "
+            f"{time.perf_counter() - start:.2f}s, {notifier.retries} retries in total"
+        )
+        notifier.close()
+    print("--------------------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# scripts/fake_gmail.py
+"""
+Runs the assistant against an in-memory Gmail mailbox (tests/fakes/gmail.py)
+and a throwaway database, so `run` and `serve` can be tried without a Google
+account. assistant.db is left alone.
+
+    python -m scripts.fake_gmail run 15
+    python -m scripts.fake_gmail serve 20 --arrival 5 --min-interval 1
+"""
+import argparse
+import os
+import tempfile
+import threading
+
+from googleapiclient.discovery import build
+
+import src.storage.database as database
+import src.utils.metrics as metrics
+from src.main import run_assistant, serve_assistant
+from src.utils.config import POLL_MAX_SECONDS, POLL_MIN_SECONDS
+from tests.fakes.gmail import FakeGmailHttp, make_message
+
+
+def use_temporary_storage():
+    """Points the database and the metrics file at a fresh temporary folder."""
+    folder = tempfile.mkdtemp()
+    database.DB_PATH = os.path.join(folder, "fake_gmail.db")
+    metrics.METRICS_FILE = os.path.join(folder, os.path.basename(metrics.METRICS_FILE))
+    return folder
+
+
+def deliver_mail(http, every_seconds, stop_event):
+    """Adds a message to the fake mailbox every `every_seconds` until stopped."""
+
+    def deliver():
+        index = len(http.messages) + 100000
+        while not stop_event.wait(every_seconds):
+            http.add_message(make_message(index))
+            index += 1
+
+    threading.Thread(target=deliver, name="fake-mail", daemon=True).start()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python -m scripts.fake_gmail")
+    parser.add_argument("command", choices=["run", "serve"])
+    parser.add_argument("messages", type=int, help="messages in the fake mailbox")
+    parser.add_argument(
+        "--arrival",
+        type=float,
+        metavar="SECONDS",
+        help="with serve, deliver a new message every SECONDS",
+    )
+    parser.add_argument("--min-interval", type=float, default=POLL_MIN_SECONDS)
+    parser.add_argument("--max-interval", type=float, default=POLL_MAX_SECONDS)
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    use_temporary_storage()
+    http = FakeGmailHttp.with_messages(args.messages)
+    service = build("gmail", "v1", http=http, static_discovery=True)
+    print(f"[*] Using a fake Gmail mailbox ({args.messages} messages).")
+    if args.command == "run":
+        run_assistant(service)
+        return
+
+    def on_start(scheduler):
+        if args.arrival:
+            deliver_mail(http, args.arrival, scheduler.stop_event)
+
+    serve_assistant(args.min_interval, args.max_interval, service, on_start)
+
+
+if __name__ == "__main__":
+    main()
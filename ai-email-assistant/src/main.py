@@ -1,37 +1,66 @@
 # src/main.py
-import time
+import argparse
 import datetime  # Import datetime
-from dotenv import load_dotenv
-
-load_dotenv()
+import signal
+from email.utils import parseaddr
 
 # --- Service Imports ---
-from src.services.email_service import (
-    get_google_api_service,
-    fetch_and_store_unread_emails,
-)  # Use generic getter
+from src.services.email_service import sync_inbox
+from src.services.google_auth_service import get_google_api_service
 from src.storage.database import (
     initialize_database,
-    get_unprocessed_emails,
+    count_unprocessed_emails,
+    iter_unprocessed_emails,
+    get_approvals,
     mark_email_processed,
+    search_mailbox,
 )
+from src.services.analysis_backend import get_analysis_backend
 from src.services.llm_service import (
-    analyze_email_content,
+    INTENT_CATEGORIES,
     draft_reply,
+    get_analysis_metrics,
+    llm_batch_size,
+    llm_cache,
 )  # Add draft_reply
-from src.services.web_search_service import search_web
-from src.services.slack_service import send_slack_message
-from src.services.calendar_service import (
-    create_calendar_event,
-)  # Import calendar function
+from src.services.web_search_service import (
+    get_search_stats,
+    normalize_query,
+    search_web,
+)
+from src.services.approvals import (
+    apply_approved,
+    decide,
+    format_approval,
+    reserve_pending_events,
+    request_calendar_event,
+    request_slack_message,
+)
+from src.services.calendar_service import get_calendar_sync
+from src.services.slack_service import get_slack_notifier
 
 # --- Util Imports ---
 from src.utils.parsing import parse_extracted_datetime  # Import datetime parser
+from src.utils.pipeline import Pipeline, Stage
+from src.utils.metrics import dump_metrics, format_timers, get_metrics
+from src.utils.scheduler import AdaptiveInterval, PollingScheduler
+from src.utils.rules import get_rule_engine
+from src.utils.config import (
+    PIPELINE_ANALYZE_WORKERS,
+    PIPELINE_ACT_WORKERS,
+    PIPELINE_DRAFT_WORKERS,
+    PIPELINE_MARK_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    LLM_BATCH_SIZE_MAX,
+    POLL_BACKOFF,
+    POLL_MAX_SECONDS,
+    POLL_MIN_SECONDS,
+)
 
 
 # --- Helper Function for Confirmation ---
 def confirm_action(prompt_message):
-    """Asks the user for confirmation before proceeding."""
+    """Asks the user for confirmation before proceeding (used by `approvals review`)."""
     while True:
         response = input(f"{prompt_message} Proceed? (y/n): ").lower().strip()
         if response == "y":
@@ -43,256 +72,591 @@ def confirm_action(prompt_message):
             print("Please enter 'y' or 'n'.")
 
 
-# --- Main Assistant Function ---
-def run_assistant():
+def _address(sender):
+    """Lower-cased email address of a From header value ('' if none)."""
+    return parseaddr(sender or "")[1].lower()
+
+
+# --- Pipeline Stages ---
+# Each email travels through the stages as a context dict. A stage fills in
+# its part of the dict and hands it on; see run_assistant() for the wiring.
+
+
+def _start_context(email):
+    """Builds the processing context for one stored email (body loaded here)."""
+    print("-" * 30)
+    msg_id = email.message_id
+    print(f"[*] Processing Email - Message-ID: {msg_id}")
+    subject = email.subject or ""
+    body = email.body_plain or ""  # Loaded from the DB on first access
+    print(f"  Subject: {subject}")
+    return {
+        "msg_id": msg_id,
+        "thread_id": email.thread_id,
+        "rule_match": get_rule_engine().scan(subject, body),
+        "subject": subject,
+        "body": body,
+        "sender": email.sender or "Unknown Sender",
+        "analysis": None,
+        "skipped": False,  # True when the email is deliberately not analyzed
+        "reply_context": "Email processed.",  # Default context
+        "draft_context": None,  # Set when an action wants a reply drafted
+        "drafted_reply_text": None,
+    }
+
+
+def _rule_analysis(ctx):
+    """Analysis for emails a keyword rule classifies outright, else None."""
+    rule = get_rule_engine().classify(ctx["rule_match"])
+    if rule is None:
+        return None
     print(
-        "--- Starting AI Email Assistant (Day 6: Debugging Confirmations) ---"
-    )  # Updated title
+        f"  Rule '{rule.name}' classified the email as '{rule.intent}' (no LLM call)."
+    )
+    return {
+        "raw": "",
+        "intent": rule.intent,
+        "summary": f"Matched keyword rule '{rule.name}'",
+        "meeting_details": None,
+        "backend": "rules",
+    }
+
+
+def analyze_stage(email):
+    """Runs LLM analysis for one stored email and starts its processing context."""
+    ctx = _start_context(email)
+    ctx["analysis"] = _rule_analysis(ctx)
+    if ctx["analysis"]:
+        return ctx
+    if not ctx["subject"] and not ctx["body"]:
+        print("  [!] Skipping LLM analysis: Both subject and body are empty.")
+        ctx["skipped"] = True
+    else:
+        backend = get_analysis_backend()
+        analyses = backend.analyze_many([(ctx["msg_id"], ctx["subject"], ctx["body"])])
+        ctx["analysis"] = analyses.get(ctx["msg_id"])
+    return ctx
+
+
+def analyze_batch_stage(emails):
+    """Batched variant of analyze_stage: one LLM request covers several emails."""
+    contexts = [_start_context(email) for email in emails]
+    to_analyze = []
+    for ctx in contexts:
+        ctx["analysis"] = _rule_analysis(ctx)
+        if ctx["analysis"]:
+            continue
+        if not ctx["subject"] and not ctx["body"]:
+            print(
+                f"  [!] Skipping LLM analysis for {ctx['msg_id']}: Both subject and body are empty."
+            )
+            ctx["skipped"] = True
+        else:
+            to_analyze.append((ctx["msg_id"], ctx["subject"], ctx["body"]))
+
+    if to_analyze:
+        analyses = get_analysis_backend().analyze_many(to_analyze)
+        for ctx in contexts:
+            if ctx["msg_id"] in analyses:
+                ctx["analysis"] = analyses[ctx["msg_id"]]
+    return contexts
+
+
+def act_stage(ctx):
+    """Applies the safety filter and performs the actions for the detected intent."""
+    analysis_result = ctx["analysis"]
+    msg_id = ctx["msg_id"]
+    subject = ctx["subject"]
+    body = ctx["body"]
+    sender = ctx["sender"]
+
+    if not analysis_result:  # LLM Analysis failed
+        print(f"  [!] Skipping actions for {msg_id} due to failed LLM analysis.")
+        ctx["reply_context"] = (
+            "Email received, but encountered an error during analysis."
+        )
+        return ctx
+
+    intent = analysis_result.get("intent", "Unknown")
+    meeting_details = analysis_result.get("meeting_details")
+    print(f"  LLM Intent: {intent}")  # Print initial intent
+
+    # --- SAFETY FILTER for Meeting Requests ---
+    if intent == "Meeting Request":
+        # Keyword sets come from the compiled rules (config/rules.json)
+        rule_match = ctx["rule_match"]
+        is_likely_promo = rule_match.hit("promotion")
+        has_meeting_cues = rule_match.hit("meeting_cues")
+
+        if is_likely_promo or not has_meeting_cues:
+            print(
+                f"  [!] Overriding LLM Intent '{intent}' based on keywords. Likely not a real meeting request."
+            )
+            intent = "Information Sharing"  # Re-classify
+            meeting_details = None  # Ensure no action taken
+    # --- END SAFETY FILTER ---
+
+    ctx["intent"] = intent
+
+    # --- Action based on Intent (using potentially overridden intent) ---
+
+    # ** Meeting Request Handling **
+    if intent == "Meeting Request" and meeting_details:
+        print(f"  Action: Attempting to schedule meeting based on extracted details...")
+        cal_summary = meeting_details.get("event_summary", subject)
+        date_str = meeting_details.get("date")
+        time_str = meeting_details.get("time")
+        duration_min = meeting_details.get("duration_minutes", 60)
+
+        start_dt = parse_extracted_datetime(date_str, time_str)
+
+        if start_dt:
+            try:
+                duration_min = int(duration_min)
+                end_dt = start_dt + datetime.timedelta(minutes=duration_min)
+
+                # Conflicts are checked against the run's local free/busy index,
+                # and the slot is held there while the event waits for approval.
+                calendar = get_calendar_sync()
+                clashes = calendar.reserve(msg_id, cal_summary, start_dt, end_dt)
+                if clashes:
+                    busy_summary = clashes[0][0]
+                    free_start = calendar.find_free_slot(
+                        end_dt - start_dt, clashes[0][2]
+                    )
+                    suggestion = (
+                        f" Next free slot: {free_start.strftime('%Y-%m-%d %I:%M %p %Z')}."
+                        if free_start
+                        else ""
+                    )
+                    ctx["reply_context"] = (
+                        f"Meeting '{cal_summary}' was not scheduled: the requested time conflicts with '{busy_summary}'.{suggestion}"
+                    )
+                else:
+                    approval_id = request_calendar_event(
+                        msg_id, cal_summary, start_dt, end_dt
+                    )
+                    event_start_str = start_dt.strftime("%Y-%m-%d %I:%M %p %Z")
+                    if approval_id:
+                        print(
+                            f"  Action: Calendar event queued for approval (#{approval_id})."
+                        )
+                        ctx["reply_context"] = (
+                            f"Meeting requested: '{cal_summary}' on {event_start_str}. The time is free; a calendar invite will follow once confirmed."
+                        )
+                    else:
+                        calendar.release(msg_id)
+                        ctx["reply_context"] = (
+                            f"Attempted to schedule meeting '{cal_summary}', but could not queue the calendar event."
+                        )
+            except ValueError:
+                ctx["reply_context"] = (
+                    f"Could not schedule meeting: Invalid duration '{duration_min}'."
+                )
+            except Exception as e:
+                ctx["reply_context"] = (
+                    f"Could not schedule meeting: Unexpected error ({e})."
+                )
+        else:
+            ctx["reply_context"] = (
+                f"Meeting requested, but could not parse date/time ('{date_str}' '{time_str}') from email details."
+            )
+
+        # Draft reply based on scheduling outcome
+        ctx["draft_context"] = ctx["reply_context"]
+
+    # ** Question Handling **
+    elif intent == "Question":
+        search_query = subject if subject else "Inquiry from email"
+        # Earlier mail on the same topic often already holds the answer. Not
+        # from this thread (it quotes the question back), not the asker's own
+        # mail and not other questions.
+        candidates = search_mailbox(
+            normalize_query(subject),
+            limit=10,
+            exclude_message_id=msg_id,
+            exclude_thread_id=ctx["thread_id"],
+        )
+        asker = _address(sender)
+        past_emails = [
+            row
+            for row in candidates
+            if row["intent"] != "Question" and _address(row["sender"]) != asker
+        ][:3]
+        if past_emails:
+            print(f"  Action: Found {len(past_emails)} related emails in the mailbox.")
+            found = "\n".join(
+                f"{i + 1}. '{row['subject']}' from {row['sender']} "
+                f"({row['received_at']}): {row['snippet']}"
+                for i, row in enumerate(past_emails)
+            )
+            ctx["reply_context"] = (
+                f"Regarding your question about '{subject}', these earlier emails may answer it:\n\n{found}"
+            )
+            ctx["draft_context"] = ctx["reply_context"]
+        elif search_query:
+            print("  Action: Performing web search based on intent 'Question'...")
+            search_results_text = search_web(search_query)
+            print("\n--- Web Search Results ---")
+            print(search_results_text)
+            print("-------------------------\n")
+            ctx["reply_context"] = (
+                f"Regarding your question about '{subject}', here are some search results:\n\n{search_results_text}"
+            )
+            ctx["draft_context"] = ctx["reply_context"]
+        else:
+            print("  [!] Could not determine a suitable query for web search.")
+            ctx["reply_context"] = (
+                f"Could not perform web search for your question '{subject}'."
+            )
+
+    # ** Slack Notification for Important **
+    important_intents = ["Action Required"]
+    if intent.lower() in [i.lower() for i in important_intents]:  # Case-insensitive
+        slack_message = (
+            f"🚨 *Important Email Notification* 🚨\n\n"
+            f"*From:* {sender}\n*Subject:* {subject}\n"
+            f"*LLM Intent:* `{intent}`\n"
+            f"(Message ID: {msg_id})"
+        )
+        approval_id = request_slack_message(
+            msg_id,
+            slack_message,
+            f"Send Slack notification for '{subject}' (Intent: {intent})",
+            {
+                "sender": sender,
+                "subject": subject,
+                "intent": intent,
+                "message_id": msg_id,
+            },
+        )
+        if approval_id:
+            print(f"  Action: Slack notification queued for approval (#{approval_id}).")
+            ctx["reply_context"] = (
+                f"Detected as '{intent}', relevant parties will be notified via Slack."
+            )
+        else:
+            ctx["reply_context"] = (
+                f"Detected as '{intent}', but failed to queue the Slack notification."
+            )
+
+    return ctx
+
+
+def draft_stage(ctx):
+    """Drafts a reply with the LLM when an action asked for one."""
+    if ctx["draft_context"]:
+        ctx["drafted_reply_text"] = draft_reply(
+            ctx["subject"], ctx["sender"], ctx["draft_context"]
+        )
+    return ctx
+
+
+def mark_stage(ctx):
+    """
+    Prints the draft reply and marks the email as processed. Emails whose
+    analysis failed (e.g. the LLM was unavailable) stay unprocessed, so the
+    next run analyzes them again.
+    """
+    msg_id = ctx["msg_id"]
+    if not ctx["analysis"] and not ctx["skipped"]:
+        print(f"[!] Leaving email {msg_id} unprocessed; it will be analyzed next run.")
+        return ctx
+
+    # --- Print Draft Reply ---
+    if ctx["drafted_reply_text"]:
+        print("\n--- Draft Reply ---")
+        print(f"To: {ctx['sender']}")
+        print(f"Subject: Re: {ctx['subject']}")
+        print("---")
+        print(ctx["drafted_reply_text"])
+        print("-------------------\n")
+
+    # --- Mark as Processed ---
+    # Intents decided by the LLM become training labels for the local classifier
+    analysis = ctx["analysis"] or {}
+    label = ctx.get("intent") if analysis.get("backend") == "remote" else None
+    if mark_email_processed(
+        msg_id, intent=label if label in INTENT_CATEGORIES else None
+    ):
+        print(f"[*] Successfully marked email {msg_id} as processed.")
+    else:
+        print(f"[!] Failed to mark email {msg_id} as processed.")
+    return ctx
+
+
+def build_pipeline():
+    """Wires the processing stages together with the configured concurrency."""
+    if LLM_BATCH_SIZE_MAX > 1:
+        # Several emails per LLM request; the batch size adapts at runtime
+        analyze = Stage(
+            "analyze",
+            analyze_batch_stage,
+            workers=PIPELINE_ANALYZE_WORKERS,
+            batch_size=llm_batch_size.size,
+        )
+    else:
+        analyze = Stage("analyze", analyze_stage, workers=PIPELINE_ANALYZE_WORKERS)
+    stages = [
+        analyze,
+        Stage("act", act_stage, workers=PIPELINE_ACT_WORKERS),
+        Stage("draft", draft_stage, workers=PIPELINE_DRAFT_WORKERS),
+        Stage("mark", mark_stage, workers=PIPELINE_MARK_WORKERS),
+    ]
+    return Pipeline(stages, queue_size=PIPELINE_QUEUE_SIZE)
 
+
+# --- Main Assistant Function ---
+def process_inbox(gmail_service, stop=None):
+    """
+    One poll cycle: syncs the inbox, then runs every unprocessed email through
+    the pipeline. Returns the number of newly stored emails.
+    """
+    print("\n[*] Syncing unread emails and storing new ones...")
+    stored = sync_inbox(gmail_service)
+
+    # --- LLM Processing & Actions ---
+    print("\n[*] Checking for unprocessed emails in the database...")
+    unprocessed_count = count_unprocessed_emails()
+
+    if not unprocessed_count:
+        print("[*] No unprocessed emails found.")
+    else:
+        print(f"[*] Found {unprocessed_count} emails for processing.")
+        # Calendar conflicts are checked against this cycle's free/busy read
+        get_calendar_sync().invalidate()
+        reserve_pending_events()
+        # Emails are streamed from the DB as the pipeline has room for them
+        stats = build_pipeline().run(iter_unprocessed_emails(), stop=stop)
+        print(
+            f"[*] Pipeline processed {stats['items']} emails in {stats['elapsed_seconds']}s."
+        )
+        for name, stage_stats in stats["stages"].items():
+            print(
+                f"    {name}: {stage_stats['processed']} ok, {stage_stats['errors']} errors, "
+                f"{stage_stats['workers']} workers, {stage_stats['busy_seconds']}s busy"
+            )
+    return stored or 0
+
+
+def print_run_report():
+    pending = get_approvals(["pending"])
+    if pending:
+        print(
+            f"\n[*] {len(pending)} actions are waiting for approval. Review them with "
+            "`python -m src.main approvals review` (or `approvals list`)."
+        )
+    calendar = get_calendar_sync()
+    print(
+        f"[*] Calendar API calls: {calendar.reads} reads, {calendar.writes} batched writes"
+    )
+
+    print(f"[*] Keyword rule hits: {get_rule_engine().stats()}")
+    print(f"[*] Analysis metrics: {get_analysis_metrics()}")
+    backend = get_analysis_backend()
+    if hasattr(backend, "stats"):
+        print(f"[*] Analysis backend ({backend.name}): {backend.stats()}")
+    if llm_cache is not None:
+        print(f"[*] LLM cache stats: {llm_cache.stats()}")
+    print(f"[*] Web search stats: {get_search_stats()}")
+
+    print("[*] Timings:")
+    print(format_timers())
+    path = dump_metrics()
+    if path:
+        print(f"[*] Metrics written to {path}")
+
+
+def register_metrics_collectors(scheduler=None):
+    """Folds each component's own counters into the metrics dump."""
+    metrics = get_metrics()
+    calendar = get_calendar_sync()
+    metrics.register_collector(
+        "calendar", lambda: {"reads": calendar.reads, "writes": calendar.writes}
+    )
+    metrics.register_collector("rules", lambda: get_rule_engine().stats())
+    metrics.register_collector("analysis", get_analysis_metrics)
+    backend = get_analysis_backend()
+    if hasattr(backend, "stats"):
+        metrics.register_collector("analysis_backend", backend.stats)
+    if llm_cache is not None:
+        metrics.register_collector("llm_cache", llm_cache.stats)
+    metrics.register_collector("web_search", get_search_stats)
+    metrics.register_collector("slack", lambda: get_slack_notifier().stats())
+    metrics.register_collector(
+        "approvals", lambda: {"pending": len(get_approvals(["pending"]))}
+    )
+    if scheduler is not None:
+        metrics.register_collector("scheduler", scheduler.stats)
+
+
+def _start(gmail_service=None):
+    """
+    Initializes the database and returns the Gmail service (None on failure).
+    A service passed in (e.g. one backed by a fake mailbox, see
+    scripts/fake_gmail.py) is used instead of authenticating with Google.
+    """
     # 1. Initialize DB
     print("\n[*] Initializing database...")
     initialize_database()
 
     # 2. Authenticate
+    if gmail_service is not None:
+        return gmail_service
     print("\n[*] Authenticating with Google APIs...")
     gmail_service = get_google_api_service("gmail", "v1")
     if not gmail_service:
         print("[!] Failed to get Google API access. Exiting.")
-        return
+    return gmail_service
 
-    # 3. Fetch/Store Emails
-    print("\n[*] Fetching unread emails and storing new ones...")
-    fetch_and_store_unread_emails(gmail_service, max_results=10)
 
-    # --- LLM Processing & Actions ---
-    print("\n[*] Checking for unprocessed emails in the database...")
-    unprocessed_emails = get_unprocessed_emails()
-
-    if not unprocessed_emails:
-        print("[*] No unprocessed emails found.")
-    else:
-        print(f"[*] Found {len(unprocessed_emails)} emails for processing.")
-        for email in unprocessed_emails:
-            print("-" * 30)
-            msg_id = email["message_id"]
-            print(f"[*] Processing Email - Message-ID: {msg_id}")
-            subject = email.get("subject", "")
-            body = email.get("body_plain", "")
-            sender = email.get("sender", "Unknown Sender")
-            print(f"  Subject: {subject}")
-
-            analysis_result = None
-            drafted_reply_text = None  # Initialize draft reply
-            reply_context = "Email processed."  # Default context
-
-            if not subject and not body:
-                print("  [!] Skipping LLM analysis: Both subject and body are empty.")
-            else:
-                analysis_result = analyze_email_content(subject, body)
-
-            if analysis_result:
-                intent = analysis_result.get("intent", "Unknown")
-                meeting_details = analysis_result.get("meeting_details")
-                print(f"  LLM Intent: {intent}")  # Print initial intent
-
-                # --- SAFETY FILTER for Meeting Requests ---
-                if intent == "Meeting Request":
-                    # Added/refined keywords
-                    promo_keywords = [
-                        "unsubscribe",
-                        "discount",
-                        "sale",
-                        "offer",
-                        "limited time",
-                        "coupon",
-                        "save now",
-                        "shop now",
-                        "view deal",
-                        "last call",
-                        "percent off",
-                        "% off",
-                        "expires",
-                        "promotion",
-                        "clearance",
-                    ]
-                    meeting_keywords = [
-                        "meet",
-                        "schedule",
-                        "call ",
-                        "zoom",
-                        "available",
-                        "appointment",
-                        "calendar",
-                        "discuss",
-                        "talk",
-                        "catch up",
-                        "sync up",
-                        "proposal",
-                        "next steps",
-                    ]
-                    email_text_lower = (
-                        subject.lower() + " " + (body.lower() if body else "")
-                    )
-                    is_likely_promo = any(
-                        keyword in email_text_lower for keyword in promo_keywords
-                    )
-                    has_meeting_cues = any(
-                        keyword in email_text_lower for keyword in meeting_keywords
-                    )
-
-                    if is_likely_promo or not has_meeting_cues:
-                        print(
-                            f"  [!] Overriding LLM Intent '{intent}' based on keywords. Likely not a real meeting request."
-                        )
-                        intent = "Information Sharing"  # Re-classify
-                        meeting_details = None  # Ensure no action taken
-                # --- END SAFETY FILTER ---
-
-                # --- DEBUG: Print intent *after* potential override by filter ---
-                print(f"DEBUG: Intent *after* safety filter is: '{intent}'")
-
-                # --- Action based on Intent (using potentially overridden intent) ---
+def run_assistant(gmail_service=None):
+    print("--- Starting AI Email Assistant ---")
+    gmail_service = _start(gmail_service)
+    if not gmail_service:
+        return
 
-                # ** Meeting Request Handling **
-                if intent == "Meeting Request" and meeting_details:
-                    print(
-                        f"  Action: Attempting to schedule meeting based on extracted details..."
-                    )
-                    cal_summary = meeting_details.get("event_summary", subject)
-                    date_str = meeting_details.get("date")
-                    time_str = meeting_details.get("time")
-                    duration_min = meeting_details.get("duration_minutes", 60)
-
-                    start_dt = parse_extracted_datetime(date_str, time_str)
-
-                    if start_dt:
-                        try:
-                            duration_min = int(duration_min)
-                            end_dt = start_dt + datetime.timedelta(minutes=duration_min)
-
-                            # --- DEBUG PRINT before Calendar confirmation ---
-                            print(
-                                f"DEBUG: About to ask for Calendar confirmation for '{cal_summary}'."
-                            )
-                            # --- CONFIRMATION for Calendar ---
-                            confirm_prompt = (
-                                f"[*] About to create calendar event: '{cal_summary}'\n"
-                                f"    Start: {start_dt.strftime('%Y-%m-%d %I:%M %p %Z')}\n"
-                                f"    End:   {end_dt.strftime('%Y-%m-%d %I:%M %p %Z')}"
-                            )
-                            if confirm_action(confirm_prompt):
-                                created_event = create_calendar_event(
-                                    cal_summary, start_dt, end_dt
-                                )
-                                if created_event:
-                                    event_link = created_event.get(
-                                        "htmlLink", "Link unavailable"
-                                    )
-                                    event_start_str = start_dt.strftime(
-                                        "%Y-%m-%d %I:%M %p %Z"
-                                    )
-                                    reply_context = f"Meeting scheduled successfully: '{cal_summary}' on {event_start_str}. Event link: {event_link}"
-                                else:
-                                    reply_context = f"Attempted to schedule meeting '{cal_summary}', but failed to create the calendar event (API error or conflict)."
-                            else:
-                                reply_context = "Meeting scheduling cancelled by user."
-                            # --- END CONFIRMATION ---
-                        except ValueError:
-                            reply_context = f"Could not schedule meeting: Invalid duration '{duration_min}'."
-                        except Exception as e:
-                            reply_context = (
-                                f"Could not schedule meeting: Unexpected error ({e})."
-                            )
-                    else:
-                        reply_context = f"Meeting requested, but could not parse date/time ('{date_str}' '{time_str}') from email details."
+    # 3. Fetch/Store Emails and process them
+    register_metrics_collectors()
+    process_inbox(gmail_service)
+    print_run_report()
 
-                    # Draft reply based on scheduling outcome
-                    drafted_reply_text = draft_reply(subject, sender, reply_context)
+    print("\n--- Assistant run finished ---")
 
-                # ** Question Handling **
-                elif intent == "Question":
-                    print(
-                        "  Action: Performing web search based on intent 'Question'..."
-                    )
-                    search_query = subject if subject else "Inquiry from email"
-                    if search_query:
-                        search_results_text = search_web(search_query)
-                        print("\n--- Web Search Results ---")
-                        print(search_results_text)
-                        print("-------------------------\n")
-                        reply_context = f"Regarding your question about '{subject}', here are some search results:\n\n{search_results_text}"
-                        drafted_reply_text = draft_reply(subject, sender, reply_context)
-                    else:
-                        print(
-                            "  [!] Could not determine a suitable query for web search."
-                        )
-                        reply_context = f"Could not perform web search for your question '{subject}'."
 
-                # ** Slack Notification for Important **
-                important_intents = ["Action Required"]
-                # --- DEBUG PRINT before Slack condition check ---
-                print(
-                    f"DEBUG: Checking if intent '{intent.lower()}' is in important list: {[i.lower() for i in important_intents]}"
-                )
-                if intent.lower() in [
-                    i.lower() for i in important_intents
-                ]:  # Case-insensitive check
-                    # --- DEBUG PRINT *inside* Slack condition block ---
-                    print(
-                        f"DEBUG: Condition MET for Slack notification (Intent: '{intent}')."
-                    )
-                    print(f"DEBUG: About to call confirm_action for Slack.")
-                    # --- CONFIRMATION for Slack ---
-                    confirm_prompt = f"[*] About to send Slack notification for '{subject}' (Intent: {intent})"
-                    if confirm_action(confirm_prompt):
-                        print(
-                            f"  Action: Sending Slack notification for intent '{intent}'..."
-                        )
-                        slack_message = (
-                            f"🚨 *Important Email Notification* 🚨\n\n"
-                            f"*From:* {sender}\n*Subject:* {subject}\n"
-                            f"*LLM Intent:* `{intent}`\n"
-                            f"(Message ID: {msg_id})"
-                        )
-                        if send_slack_message(slack_message):
-                            reply_context = f"Detected as '{intent}', notified relevant parties via Slack."
-                        else:
-                            reply_context = f"Detected as '{intent}', but failed to send Slack notification."
-                    else:
-                        reply_context = f"Detected as '{intent}', Slack notification skipped by user."
-                    # --- END CONFIRMATION ---
-                else:
-                    # --- DEBUG PRINT if Slack condition NOT met ---
-                    print(
-                        f"DEBUG: Condition NOT MET for Slack notification (Intent: '{intent}')."
-                    )
+def serve_assistant(
+    min_interval=POLL_MIN_SECONDS,
+    max_interval=POLL_MAX_SECONDS,
+    gmail_service=None,
+    on_start=None,
+):
+    """
+    Long-running mode: one process keeps the database, Google services and
+    caches warm and polls Gmail on an adaptive interval (see utils/scheduler).
+    SIGTERM/SIGINT stop it after the emails already in the pipeline are done.
+    on_start(scheduler) is called just before polling begins.
+    """
+    print("--- Starting AI Email Assistant (serve mode) ---")
+    gmail_service = _start(gmail_service)
+    if not gmail_service:
+        return
 
-                # --- Print Draft Reply ---
-                if drafted_reply_text:
-                    print("\n--- Draft Reply ---")
-                    print(f"To: {sender}")
-                    print(f"Subject: Re: {subject}")
-                    print("---")
-                    print(drafted_reply_text)
-                    print("-------------------\n")
-
-            else:  # LLM Analysis failed
-                print("  [!] Skipping actions due to failed LLM analysis.")
-                reply_context = (
-                    "Email received, but encountered an error during analysis."
-                )
+    def cycle():
+        try:
+            return process_inbox(gmail_service, stop=scheduler.stop_event)
+        finally:
+            dump_metrics()  # Fresh numbers on disk after every poll
+
+    scheduler = PollingScheduler(
+        cycle, AdaptiveInterval(min_interval, max_interval, POLL_BACKOFF)
+    )
+    register_metrics_collectors(scheduler)
+    if on_start is not None:
+        on_start(scheduler)
+    previous = scheduler.install_signal_handlers()
+    try:
+        stats = scheduler.run()
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    print(f"\n[*] Scheduler stats: {stats}")
+    print_run_report()
+    print("\n--- Assistant stopped ---")
+
+
+# --- Approvals CLI ---
+def _selected_ids(args):
+    """Ids given on the command line, or every pending approval with --all."""
+    if args.all:
+        return [row["id"] for row in get_approvals(["pending"])]
+    return args.ids
+
+
+def approvals_command(args):
+    initialize_database()
+    if args.approvals_command == "list":
+        statuses = None if args.status == "all" else [args.status]
+        rows = get_approvals(statuses)
+        for row in rows:
+            print(format_approval(row))
+        print(f"[*] {len(rows)} approvals ({args.status}).")
+        return
 
-            # --- Mark as Processed ---
-            if mark_email_processed(msg_id):
-                print(f"[*] Successfully marked email {msg_id} as processed.")
+    if args.approvals_command == "review":
+        # One prompt per pending action, then everything approved is applied
+        approved, rejected = [], []
+        for row in get_approvals(["pending"]):
+            if confirm_action(f"[*] {row['summary']} [email {row['message_id']}]"):
+                approved.append(row["id"])
             else:
-                print(f"[!] Failed to mark email {msg_id} as processed.")
-
-            print("[*] Waiting 1-2 seconds before next email...")
-            time.sleep(2)
-
-    print("\n--- Assistant run finished ---")
+                rejected.append(row["id"])
+        decide(approved, True)
+        decide(rejected, False)
+        print(f"[*] {len(approved)} approved, {len(rejected)} rejected.")
+    elif args.approvals_command in ("approve", "reject"):
+        ids = _selected_ids(args)
+        if not ids:
+            print("[!] No approvals selected. Pass ids or --all.")
+            return
+        approve = args.approvals_command == "approve"
+        changed = decide(ids, approve)
+        print(
+            f"[*] {changed} approvals marked {'approved' if approve else 'rejected'}."
+        )
+        if args.approvals_command == "reject" or args.no_apply:
+            return
+
+    counts = apply_approved()
+    print(
+        f"[*] Approved actions: {counts['applied']} applied, {counts['failed']} failed."
+    )
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python -m src.main")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser(
+        "run", help="sync the inbox and process new emails once (default)"
+    )
+    serve = commands.add_parser(
+        "serve", help="keep running and poll Gmail on an adaptive interval"
+    )
+    serve.add_argument("--min-interval", type=float, default=POLL_MIN_SECONDS)
+    serve.add_argument("--max-interval", type=float, default=POLL_MAX_SECONDS)
+    approvals = commands.add_parser(
+        "approvals", help="review actions queued during processing"
+    )
+    actions = approvals.add_subparsers(dest="approvals_command", required=True)
+    listing = actions.add_parser("list", help="show queued actions")
+    listing.add_argument(
+        "--status",
+        default="pending",
+        choices=["pending", "approved", "rejected", "applied", "failed", "all"],
+    )
+    for name in ("approve", "reject"):
+        decide = actions.add_parser(name, help=f"{name} actions by id (or --all)")
+        decide.add_argument("ids", nargs="*", type=int)
+        decide.add_argument("--all", action="store_true", help="every pending action")
+        if name == "approve":
+            decide.add_argument(
+                "--no-apply", action="store_true", help="only record the decision"
+            )
+    actions.add_parser(
+        "apply", help="carry out approved actions (e.g. after a failure)"
+    )
+    actions.add_parser("review", help="answer y/n for each pending action, then apply")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.command == "approvals":
+        approvals_command(args)
+    elif args.command == "serve":
+        serve_assistant(args.min_interval, args.max_interval)
+    else:
+        run_assistant()
 
 
 if __name__ == "__main__":
-    run_assistant()
+    main()
@@ -0,0 +1,148 @@
+# src/services/analysis_backend.py
+"""
+Analysis backends: where an email's intent (and meeting details) come from.
+
+Every backend has `name` and `analyze_many(items)`, taking (message_id, subject,
+body) tuples and returning message_id -> analysis dicts shaped like
+analyze_email_content()'s, plus a "backend" key naming who decided.
+"""
+import threading
+
+from src.services.llm_service import analyze_email_content, analyze_emails
+from src.services.local_classifier import email_text, train_from_history
+from src.utils.config import (
+    LLM_BACKEND,
+    LOCAL_MIN_CONFIDENCE,
+    LOCAL_MIN_TRAINING_EMAILS,
+    LOCAL_TRAINING_LIMIT,
+)
+
+# Intents the local model may not settle on its own: meetings need the LLM to
+# extract date, time and attendees.
+REMOTE_ONLY_INTENTS = {"Meeting Request"}
+
+
+class RemoteBackend:
+    """Hugging Face Inference API (batched when more than one email is given)."""
+
+    name = "remote"
+
+    def analyze_many(self, items):
+        items = list(items)
+        if len(items) == 1:
+            message_id, subject, body = items[0]
+            results = {message_id: analyze_email_content(subject, body)}
+        else:
+            results = analyze_emails(items)
+        for analysis in results.values():
+            if analysis:
+                analysis["backend"] = self.name
+        return results
+
+
+class LocalBackend:
+    """Offline TF-IDF classifier. Gives intents only, never meeting details."""
+
+    name = "local"
+
+    def __init__(self, classifier):
+        self.classifier = classifier
+
+    def classify(self, subject, body):
+        intent, confidence = self.classifier.predict(email_text(subject, body))
+        return {
+            "raw": "",
+            "intent": intent or "Unknown",
+            "summary": "Classified locally",
+            "meeting_details": None,
+            "backend": self.name,
+            "confidence": round(confidence, 3),
+        }
+
+    def analyze_many(self, items):
+        return {
+            message_id: self.classify(subject, body)
+            for message_id, subject, body in items
+        }
+
+
+class HybridBackend:
+    """
+    Local classifier first; emails it is unsure about (or that need details
+    extraction) go to the remote backend in one batch.
+    """
+
+    name = "hybrid"
+
+    def __init__(self, local, remote, min_confidence=LOCAL_MIN_CONFIDENCE):
+        self.local = local
+        self.remote = remote
+        self.min_confidence = min_confidence
+        self.local_decisions = 0
+        self.remote_decisions = 0
+        self._lock = threading.Lock()
+
+    def analyze_many(self, items):
+        results = {}
+        escalate = []
+        for message_id, subject, body in items:
+            analysis = self.local.classify(subject, body)
+            if (
+                analysis["confidence"] >= self.min_confidence
+                and analysis["intent"] not in REMOTE_ONLY_INTENTS
+            ):
+                results[message_id] = analysis
+            else:
+                escalate.append((message_id, subject, body))
+        with self._lock:
+            self.local_decisions += len(results)
+            self.remote_decisions += len(escalate)
+        if escalate:
+            results.update(self.remote.analyze_many(escalate))
+        return results
+
+    def stats(self):
+        with self._lock:
+            total = self.local_decisions + self.remote_decisions
+            return {
+                "local": self.local_decisions,
+                "remote": self.remote_decisions,
+                "local_share": round(self.local_decisions / total, 3) if total else 0.0,
+            }
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def build_backend(kind=LLM_BACKEND):
+    """Creates the configured backend, falling back to remote without training data."""
+    remote = RemoteBackend()
+    if kind == "remote":
+        return remote
+    if kind not in ("local", "hybrid"):
+        print(f"[!] Unknown LLM_BACKEND '{kind}'. Using the remote backend.")
+        return remote
+
+    classifier = train_from_history(LOCAL_TRAINING_LIMIT)
+    if classifier is None or classifier.trained_examples < LOCAL_MIN_TRAINING_EMAILS:
+        print(
+            f"[*] Local classifier needs {LOCAL_MIN_TRAINING_EMAILS} labeled emails "
+            "(recorded as emails are processed). Using the remote backend for now."
+        )
+        return remote
+    print(
+        f"[*] Local classifier trained on {classifier.trained_examples} labeled emails "
+        f"({len(classifier.centroids)} intents)."
+    )
+    local = LocalBackend(classifier)
+    return local if kind == "local" else HybridBackend(local, remote)
+
+
+def get_analysis_backend():
+    """Returns the process-wide backend, building (and training) it on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = build_backend()
+        return _backend
@@ -0,0 +1,198 @@
+# src/services/approvals.py
+"""
+Actions that need a person's OK before they happen (calendar events, Slack
+notifications).
+
+While emails are processed, request_*() stores each action in the approvals
+table and processing carries on. Decisions are made later from the command
+line (`python -m src.main approvals ...`), and apply_approved() carries out all
+approved actions in bulk; calendar events go out as one batched insert and
+Slack notifications as Block Kit digests.
+"""
+import datetime
+
+from src.services.calendar_service import get_calendar_sync, localize_datetime
+from src.services.slack_service import get_slack_notifier
+from src.storage.database import (
+    decide_approvals,
+    get_approvals,
+    queue_approval,
+    record_approval_results,
+)
+
+CALENDAR_EVENT = "calendar_event"
+SLACK_MESSAGE = "slack_message"
+
+
+def request_calendar_event(message_id, summary, start, end, description=""):
+    """
+    Queues a calendar event for approval. Returns the approval id (or None).
+    Hold the slot first with get_calendar_sync().reserve(message_id, ...), so
+    later requests see it as busy while the approval is pending.
+    """
+    start, end = localize_datetime(start), localize_datetime(end)
+    return queue_approval(
+        message_id,
+        CALENDAR_EVENT,
+        f"Create calendar event '{summary}' on {start.strftime('%Y-%m-%d %I:%M %p %Z')} "
+        f"({int((end - start).total_seconds() // 60)} min)",
+        {
+            "summary": summary,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "description": description,
+        },
+    )
+
+
+def request_slack_message(message_id, text, description, email=None):
+    """
+    Queues a Slack notification for approval. Returns the approval id (or None).
+    email (sender, subject, intent, message_id) is shown as digest fields.
+    """
+    payload = {"text": text}
+    if email:
+        payload["email"] = email
+    return queue_approval(message_id, SLACK_MESSAGE, description, payload)
+
+
+def reserve_pending_events():
+    """
+    Reserves the slots of calendar events still waiting for a decision or to be
+    applied, e.g. queued by an earlier run, and releases holds whose approval
+    has since been rejected or applied. Returns how many were reserved.
+    """
+    calendar = get_calendar_sync()
+    rows = [
+        row
+        for row in get_approvals(["pending", "approved"])
+        if row["action"] == CALENDAR_EVENT
+    ]
+    live = {row["message_id"] for row in rows}
+    for key in list(calendar.reservations):
+        if key not in live:
+            calendar.release(key)
+    reserved = 0
+    for row in rows:
+        payload = row["payload"]
+        clashes = calendar.reserve(
+            row["message_id"],
+            payload["summary"],
+            datetime.datetime.fromisoformat(payload["start"]),
+            datetime.datetime.fromisoformat(payload["end"]),
+        )
+        reserved += not clashes
+    return reserved
+
+
+def decide(ids, approved):
+    """
+    Marks approvals approved or rejected; rejected calendar events give their
+    reserved slot back. Returns how many changed.
+    """
+    changed = decide_approvals(ids, approved)
+    if not approved and ids:
+        calendar = get_calendar_sync()
+        for row in get_approvals(["rejected"], ids):
+            if row["action"] == CALENDAR_EVENT:
+                calendar.release(row["message_id"])
+    return changed
+
+
+# --- Applying approved actions ---
+def _apply_calendar_events(rows):
+    calendar = get_calendar_sync()
+    now = localize_datetime(datetime.datetime.now())
+    results, queued = [], {}
+    for row in rows:
+        payload = row["payload"]
+        start = datetime.datetime.fromisoformat(payload["start"])
+        end = datetime.datetime.fromisoformat(payload["end"])
+        calendar.release(row["message_id"])  # Its own hold is not a conflict
+        if start <= now:
+            results.append((row["id"], "failed", "Start time has already passed."))
+            continue
+        # Checked again: the calendar (or earlier approvals) may have changed
+        clashes = calendar.conflicts(start, end)
+        if clashes:
+            results.append(
+                (
+                    row["id"],
+                    "failed",
+                    f"Time slot now conflicts with '{clashes[0][0]}'.",
+                )
+            )
+            continue
+        key = calendar.queue_event(
+            payload["summary"], start, end, payload.get("description", "")
+        )
+        queued[key] = row["id"]
+    created = calendar.flush()
+    for key, approval_id in queued.items():
+        event = created.get(key)
+        if event:
+            results.append(
+                (approval_id, "applied", event.get("htmlLink", "Event created."))
+            )
+        else:
+            results.append((approval_id, "failed", "Calendar API error."))
+    return results
+
+
+def _apply_slack_messages(rows):
+    notifier = get_slack_notifier()
+    sent = [
+        (
+            row["id"],
+            notifier.notify(row["payload"]["text"], row["payload"].get("email")),
+        )
+        for row in rows
+    ]
+    notifier.flush()  # Posts them now as digests rather than after the window
+    results = []
+    for approval_id, future in sent:
+        if future.result():
+            results.append((approval_id, "applied", "Slack message sent."))
+        else:
+            results.append((approval_id, "failed", "Slack message could not be sent."))
+    return results
+
+
+APPLIERS = {
+    CALENDAR_EVENT: _apply_calendar_events,
+    SLACK_MESSAGE: _apply_slack_messages,
+}
+
+
+def apply_approved(ids=None):
+    """
+    Carries out every approved action (or only the given approval ids) and
+    records the outcomes. Returns {"applied": n, "failed": n}.
+    """
+    by_action = {}
+    for row in get_approvals(["approved"], ids):
+        by_action.setdefault(row["action"], []).append(row)
+    results = []
+    for action, rows in by_action.items():
+        applier = APPLIERS.get(action)
+        if applier is None:
+            results.extend(
+                (row["id"], "failed", f"Unknown action '{action}'.") for row in rows
+            )
+            continue
+        print(f"[*] Applying {len(rows)} approved {action} action(s)...")
+        results.extend(applier(rows))
+    if results:
+        record_approval_results(results)
+    counts = {"applied": 0, "failed": 0}
+    for _, status, _ in results:
+        counts[status] += 1
+    return counts
+
+
+def format_approval(row):
+    """One line describing an approval, for listings."""
+    line = f"#{row['id']:<5} {row['status']:<9} {row['summary']}"
+    if row.get("result"):
+        line += f" -> {row['result']}"
+    return f"{line}  [email {row['message_id']}]"
@@ -1,12 +1,20 @@
 # src/services/calendar_service.py
 from googleapiclient.errors import HttpError
+import bisect
 import datetime
+import itertools
+import threading
 import pytz  # For timezone handling: pip install pytz
 
-# Import the generic service getter
-from src.services.email_service import (
-    get_google_api_service,
-)  # Adjust import path if you made google_auth_service.py
+# Import the generic service getter (cached per API; no auth work per call)
+from src.services.google_auth_service import get_google_api_service
+from src.utils.config import CALENDAR_WINDOW_DAYS
+from src.utils.metrics import timed
+
+
+# We need pytz for robust timezone handling.
+# Let's use the current location provided (India Standard Time)
+LOCAL_TZ = pytz.timezone("Asia/Kolkata")
 
 
 # --- Helper Function for Time Formatting ---
@@ -14,22 +22,42 @@ def format_datetime_for_google_api(dt_obj):
     """Converts a datetime object to the RFC3339 format Google Calendar API expects."""
     if not isinstance(dt_obj, datetime.datetime):
         return None  # Or raise error
+    if dt_obj.tzinfo is None or dt_obj.tzinfo.utcoffset(dt_obj) is None:
+        print(f"[*] Datetime object is naive. Assuming timezone: {LOCAL_TZ.zone}")
+    return localize_datetime(dt_obj).isoformat()  # RFC3339 compatible string
 
+
+def localize_datetime(dt_obj):
+    """Returns dt_obj as an aware datetime in the assistant's timezone."""
     # If the datetime is naive, assume local timezone (adjust if needed!)
-    # We need pytz for robust timezone handling.
-    # Let's use the current location provided (India Standard Time)
-    local_tz = pytz.timezone("Asia/Kolkata")
     if dt_obj.tzinfo is None or dt_obj.tzinfo.utcoffset(dt_obj) is None:
-        print(f"[*] Datetime object is naive. Assuming timezone: {local_tz.zone}")
-        dt_obj = local_tz.localize(dt_obj)
-    else:
-        # Convert to local timezone if it's different, just to be sure
-        dt_obj = dt_obj.astimezone(local_tz)
+        return LOCAL_TZ.localize(dt_obj)
+    # Convert to local timezone if it's different, just to be sure
+    return dt_obj.astimezone(LOCAL_TZ)
+
 
-    return dt_obj.isoformat()  # isoformat() generates RFC3339 compatible string
+def _event_body(summary, start_time_str, end_time_str, description=""):
+    return {
+        "summary": summary,
+        "description": description,
+        "start": {
+            "dateTime": start_time_str,
+            # 'timeZone': 'Asia/Kolkata', # Included in RFC3339 string
+        },
+        "end": {
+            "dateTime": end_time_str,
+            # 'timeZone': 'Asia/Kolkata',
+        },
+        # 'attendees': [{'email': email} for email in attendees] if attendees else [],
+        # Add attendees later if needed, requires more permissions potentially
+        "reminders": {  # Optional: Add default reminders
+            "useDefault": True,
+        },
+    }
 
 
 # --- Main Calendar Function ---
+@timed("calendar.create_event")
 def create_calendar_event(
     summary, start_datetime, end_datetime, attendees=None, description=""
 ):
@@ -51,23 +79,7 @@ def create_calendar_event(
         print("[!] Invalid start or end datetime object provided.")
         return None
 
-    event = {
-        "summary": summary,
-        "description": description,
-        "start": {
-            "dateTime": start_time_str,
-            # 'timeZone': 'Asia/Kolkata', # Included in RFC3339 string
-        },
-        "end": {
-            "dateTime": end_time_str,
-            # 'timeZone': 'Asia/Kolkata',
-        },
-        # 'attendees': [{'email': email} for email in attendees] if attendees else [],
-        # Add attendees later if needed, requires more permissions potentially
-        "reminders": {  # Optional: Add default reminders
-            "useDefault": True,
-        },
-    }
+    event = _event_body(summary, start_time_str, end_time_str, description)
 
     try:
         print(
@@ -81,30 +93,375 @@ def create_calendar_event(
         print(f"[*] Event created successfully! Link: {created_event.get('htmlLink')}")
         return created_event  # Return the created event object
     except HttpError as error:
-        print(f"[!] An error occurred creating calendar event: {error}")
-        # TODO: Handle specific errors like 409 Conflict (time slot busy?)
+        if error.resp.status == 409:
+            # Calendar only answers 409 for a duplicate event id; overlapping
+            # times are accepted, so check CalendarSync.conflicts() beforehand.
+            print(f"[!] Calendar event '{summary}' already exists: {error}")
+        else:
+            print(f"[!] An error occurred creating calendar event: {error}")
         return None
     except Exception as e:
         print(f"[!] An unexpected error occurred creating event: {e}")
         return None
 
 
-# Example Usage (for testing - requires manual datetime objects)
+# --- Calendar Sync: local free/busy index and batched inserts ---
+CALENDAR_BATCH_SIZE = 50  # Calendar API limit for requests per batch
+
+
+def _later(a, b):
+    """The later of two end times, either of which may be None."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if a > b else b
+
+
+class IntervalIndex:
+    """
+    Busy intervals sorted by start time, with a segment tree of maximum end
+    times over that order. For a query [start, end), bisect finds the intervals
+    starting before `end`, and the tree descends only into ranges whose latest
+    end is after `start`: an overlap test is O(log n) and listing k conflicts
+    O((k + 1) log n), even behind a long early event (an all-day block or an
+    off-site week). Inserts rebuild the arrays (O(n)), which is fine for the
+    handful of events one run schedules.
+    """
+
+    def __init__(self, intervals=()):
+        self._items = sorted(intervals, key=lambda item: item[0])
+        self._rebuild()
+
+    def _rebuild(self):
+        self._starts = [item[0] for item in self._items]
+        size = 1
+        while size < len(self._items):
+            size *= 2
+        # Leaves hold the ends in start order; each parent the later of its two
+        tree = [None] * size + [item[1] for item in self._items]
+        tree += [None] * (2 * size - len(tree))
+        for node in range(size - 1, 0, -1):
+            tree[node] = _later(tree[2 * node], tree[2 * node + 1])
+        self._size = size
+        self._max_end = tree
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, start, end, event=None):
+        position = bisect.bisect_right(self._starts, start)
+        self._items.insert(position, (start, end, event))
+        self._rebuild()
+
+    def remove(self, event):
+        """Drops the intervals carrying this event object."""
+        kept = [item for item in self._items if item[2] is not event]
+        if len(kept) != len(self._items):
+            self._items = kept
+            self._rebuild()
+
+    def overlaps(self, start, end):
+        """True if any interval intersects [start, end)."""
+        # Latest end among the intervals starting before `end`
+        latest = None
+        low = self._size
+        high = self._size + bisect.bisect_left(self._starts, end)
+        while low < high:
+            if low & 1:
+                latest = _later(latest, self._max_end[low])
+                low += 1
+            if high & 1:
+                high -= 1
+                latest = _later(latest, self._max_end[high])
+            low //= 2
+            high //= 2
+        return latest is not None and latest > start
+
+    def conflicts(self, start, end):
+        """The (start, end, event) items intersecting [start, end)."""
+        count = bisect.bisect_left(self._starts, end)
+        found = []
+        stack = [(1, 0, self._size)]  # Tree node and the item range [low, high)
+        while stack:
+            node, low, high = stack.pop()
+            latest = self._max_end[node]
+            if low >= count or latest is None or latest <= start:
+                continue  # Nothing in this range starts early and ends late enough
+            if high - low == 1:
+                found.append(self._items[low])
+                continue
+            middle = (low + high) // 2
+            # Right half pushed first, so results come out in start order
+            stack.append((2 * node + 1, middle, high))
+            stack.append((2 * node, low, middle))
+        return found
+
+    def next_free(self, duration, not_before, not_after=None):
+        """Earliest start >= not_before with `duration` free, or None past not_after."""
+        candidate = not_before
+        while not_after is None or candidate + duration <= not_after:
+            clashes = self.conflicts(candidate, candidate + duration)
+            if not clashes:
+                return candidate
+            candidate = max(item[1] for item in clashes)
+        return None
+
+
+class CalendarSync:
+    """
+    One events.list read per run into an IntervalIndex, local conflict and
+    free-slot queries, and queued event inserts sent as batch requests.
+    Queued events are added to the index straight away, so later requests in
+    the same run see them as busy. Reservations hold slots for events that are
+    not on the calendar yet (pending approvals); they and queued events survive
+    reloads. A query outside the loaded window reads that window first.
+    """
+
+    def __init__(
+        self, service=None, calendar_id="primary", window_days=CALENDAR_WINDOW_DAYS
+    ):
+        self._service = service
+        self.calendar_id = calendar_id
+        self.window = datetime.timedelta(days=window_days)
+        self.index = None
+        self.window_start = self.window_end = None
+        self.pending = []  # (key, event body)
+        self.queued = {}  # key -> (start, end, event) of pending inserts
+        self.reservations = {}  # key -> (start, end, event) held in the index
+        self._keys = itertools.count()
+        self.reads = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def service(self):
+        if self._service is None:
+            self._service = get_google_api_service("calendar", "v3")
+        return self._service
+
+    def _held(self):
+        return list(self.reservations.values()) + list(self.queued.values())
+
+    @timed("calendar.load")
+    def load(self, start=None, end=None):
+        """Reads busy events in [start, max(end, start + window)) into the index."""
+        service = self.service
+        if service is None:
+            print("[!] Calendar service not available; conflict checks disabled.")
+            self.index = IntervalIndex(self._held())
+            return False
+        self.window_start = localize_datetime(start or datetime.datetime.now())
+        self.window_end = self.window_start + self.window
+        if end is not None:
+            self.window_end = max(self.window_end, localize_datetime(end))
+        intervals = []
+        page_token = None
+        try:
+            while True:
+                response = (
+                    service.events()
+                    .list(
+                        calendarId=self.calendar_id,
+                        timeMin=self.window_start.isoformat(),
+                        timeMax=self.window_end.isoformat(),
+                        singleEvents=True,
+                        maxResults=2500,
+                        pageToken=page_token,
+                        fields="items(id,summary,start,end,status,transparency),nextPageToken",
+                    )
+                    .execute()
+                )
+                self.reads += 1
+                for event in response.get("items", []):
+                    interval = _busy_interval(event)
+                    if interval:
+                        intervals.append(interval)
+                page_token = response.get("nextPageToken")
+                if not page_token:
+                    break
+        except HttpError as error:
+            print(f"[!] An error occurred reading calendar events: {error}")
+            self.index = IntervalIndex(intervals + self._held())
+            return False
+        self.index = IntervalIndex(intervals + self._held())
+        print(f"[*] Loaded {len(intervals)} busy calendar intervals.")
+        return True
+
+    def invalidate(self):
+        """Forgets the loaded events; the next query reads the calendar again."""
+        with self._lock:
+            self.index = None
+
+    def _ensure_loaded(self, start, end=None):
+        start = localize_datetime(start)
+        end = localize_datetime(end) if end is not None else start
+        if self.index is None:
+            self.load()
+        if self.window_start and not (
+            self.window_start <= start and end <= self.window_end
+        ):
+            # The index knows nothing about this time: widen the window to cover
+            # it (one more read) rather than report the slot as free
+            print(
+                "[*] Requested time is outside the loaded calendar window. Extending it."
+            )
+            self.load(min(start, self.window_start), max(end, self.window_end))
+        return start
+
+    def _conflicts(self, start, end):
+        return [
+            ((event or {}).get("summary", "Busy"), s, e)
+            for s, e, event in self.index.conflicts(start, end)
+        ]
+
+    def conflicts(self, start, end):
+        """Events (summary, start, end) overlapping the given time range."""
+        with self._lock:
+            start = self._ensure_loaded(start, end)
+            return self._conflicts(start, localize_datetime(end))
+
+    def reserve(self, key, summary, start, end):
+        """
+        Holds [start, end) under key for an event that is not on the calendar
+        yet, unless it conflicts with something else. Returns the conflicts (as
+        conflicts() does); the slot is reserved only if there are none.
+        """
+        with self._lock:
+            start = self._ensure_loaded(start, end)
+            end = localize_datetime(end)
+            self._release(key)
+            clashes = self._conflicts(start, end)
+            if not clashes:
+                event = {"summary": summary, "reserved": key}
+                self.reservations[key] = (start, end, event)
+                self.index.add(start, end, event)
+            return clashes
+
+    def release(self, key):
+        """Frees a slot held by reserve(). Returns True if one was held."""
+        with self._lock:
+            return self._release(key)
+
+    def _release(self, key):
+        reserved = self.reservations.pop(key, None)
+        if reserved is None:
+            return False
+        if self.index is not None:
+            self.index.remove(reserved[2])
+        return True
+
+    def find_free_slot(self, duration, not_before, not_after=None):
+        """Earliest free start of the given timedelta duration, or None."""
+        with self._lock:
+            not_before = self._ensure_loaded(not_before, not_after)
+            limit = localize_datetime(not_after) if not_after else self.window_end
+            slot = self.index.next_free(duration, not_before, limit)
+            return localize_datetime(slot) if slot else None
+
+    def queue_event(self, summary, start, end, description=""):
+        """Queues an insert for flush() and marks the slot busy. Returns its key."""
+        with self._lock:
+            start = self._ensure_loaded(start, end)
+            end = localize_datetime(end)
+            key = f"event-{next(self._keys)}"  # Never reused, even after flush()
+            body = _event_body(summary, start.isoformat(), end.isoformat(), description)
+            event = {"summary": summary, "queued": key}
+            self.pending.append((key, body))
+            self.queued[key] = (start, end, event)
+            self.index.add(start, end, event)
+            return key
+
+    @timed("calendar.flush")
+    def flush(self):
+        """
+        Inserts all queued events with batch requests (CALENDAR_BATCH_SIZE per
+        HTTP round trip). Returns {key: created event or None}.
+        """
+        with self._lock:
+            pending, self.pending = self.pending, []
+            # Sent from here on: on the calendar, or dropped if the insert fails
+            for key, _ in pending:
+                self.queued.pop(key, None)
+        results = {}
+        if not pending:
+            return results
+        service = self.service
+        if service is None:
+            print("[!] Cannot create calendar events: Calendar service not available.")
+            return {key: None for key, _ in pending}
+
+        def handle_response(request_id, response, exception):
+            if exception is not None:
+                print(f"[!] Failed to create calendar event {request_id}: {exception}")
+                results[request_id] = None
+            else:
+                results[request_id] = response
+
+        for start in range(0, len(pending), CALENDAR_BATCH_SIZE):
+            chunk = pending[start : start + CALENDAR_BATCH_SIZE]
+            batch = service.new_batch_http_request(callback=handle_response)
+            for key, body in chunk:
+                batch.add(
+                    service.events().insert(calendarId=self.calendar_id, body=body),
+                    request_id=key,
+                )
+            try:
+                batch.execute()
+                self.writes += 1
+            except HttpError as error:
+                print(f"[!] Calendar batch insert failed: {error}")
+                for key, _ in chunk:
+                    results.setdefault(key, None)
+        created = sum(1 for event in results.values() if event)
+        print(f"[*] Created {created} of {len(pending)} queued calendar events.")
+        return results
+
+
+def _parse_event_time(value):
+    if "dateTime" in value:
+        return datetime.datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+    if "date" in value:  # All-day event: busy for the whole local day
+        day = datetime.date.fromisoformat(value["date"])
+        return localize_datetime(datetime.datetime.combine(day, datetime.time()))
+    return None
+
+
+def _busy_interval(event):
+    if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+        return None
+    start = _parse_event_time(event.get("start", {}))
+    end = _parse_event_time(event.get("end", {}))
+    if not start or not end or end <= start:
+        return None
+    return (start, end, {"id": event.get("id"), "summary": event.get("summary")})
+
+
+_calendar_sync = None
+_calendar_sync_lock = threading.Lock()
+
+
+def get_calendar_sync():
+    """Returns the run's shared CalendarSync (its index is loaded on first use)."""
+    global _calendar_sync
+    with _calendar_sync_lock:
+        if _calendar_sync is None:
+            _calendar_sync = CalendarSync()
+        return _calendar_sync
+
+
+# Example usage (for testing): create one real test event. The batched sync
+# benchmark against a fake Calendar API is scripts/bench_calendar.py.
 if __name__ == "__main__":
     print("\n--- Testing Calendar Event Creation ---")
-    # IMPORTANT: Replace with actual datetime objects for testing
     now = datetime.datetime.now()
-    start_test_time = now + datetime.timedelta(
-        days=1, hours=2
-    )  # Event tomorrow at current time + 2 hours
-    end_test_time = start_test_time + datetime.timedelta(hours=1)  # 1 hour duration
-
-    test_summary = "AI Assistant Test Event"
-    test_description = "This event was created automatically by the AI Email Assistant."
-
+    start_test_time = now + datetime.timedelta(days=1, hours=2)
+    end_test_time = start_test_time + datetime.timedelta(hours=1)
     # Make sure you've authenticated with calendar scope before running this test
-    # Delete token.json if needed
     create_calendar_event(
-        test_summary, start_test_time, end_test_time, description=test_description
+        "AI Assistant Test Event",
+        start_test_time,
+        end_test_time,
+        description="This event was created automatically by the AI Email Assistant.",
     )
     print("------------------------------------")
@@ -1,191 +1,440 @@
 # src/services/email_service.py
-import os.path
-import pickle
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import html
+import json
+import random
+import time
 from googleapiclient.errors import HttpError
 
 # Import config variables and parsing helpers
-from src.utils.config import SCOPES, CREDENTIALS_FILE, TOKEN_FILE
-from src.utils.parsing import get_header_value, parse_email_body, parse_date_string
+from src.utils.config import (
+    GMAIL_PAGE_SIZE,
+    GMAIL_SYNC_MODE,
+    GMAIL_METADATA_PREFILTER,
+)
+from src.utils.metrics import timed
+from src.utils.parsing import index_headers, parse_email_body, parse_date_string
+from src.utils.rules import get_rule_engine
+from src.services.google_auth_service import get_google_api_service
+from src.storage.models import ParsedMessage
 
 # Import database functions
-from src.storage.database import message_exists, store_email  # Add imports
+from src.storage.database import (
+    existing_message_ids,
+    store_emails,
+    get_sync_state,
+    set_sync_state,
+    get_last_history_id,
+    set_last_history_id,
+)
+
+
+# --- Batched message fetching ---
+# Gmail accepts at most 100 calls per batch request.
+GMAIL_BATCH_SIZE = 100
+# Sub-request statuses worth retrying (rate limits and transient server errors)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def batch_get_messages(
+    service,
+    message_ids,
+    batch_size=GMAIL_BATCH_SIZE,
+    max_retries=3,
+    retry_delay=1.0,
+    errors=None,
+    **get_params,
+):
+    """
+    Fetches many messages using Gmail batch requests, one HTTP round trip per
+    `batch_size` ids. Only the sub-requests that failed with a retryable status
+    are sent again (with exponential backoff); other failures are logged and skipped.
+    If errors is a dict, it receives {message id: HTTP status} for those failures.
+    Extra keyword arguments (e.g. format="full") are passed to messages().get.
+    Returns a dict of message id -> message resource.
+    """
+    results = {}
+    pending = list(dict.fromkeys(message_ids))  # De-duplicate, keep order
+    attempt = 0
+
+    while pending:
+        retry_ids = []
+
+        def handle_response(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+                return
+            status = getattr(getattr(exception, "resp", None), "status", None)
+            if status in RETRYABLE_STATUS_CODES and attempt < max_retries:
+                retry_ids.append(request_id)
+            else:
+                print(f"[!] Failed to fetch message {request_id} (status {status}).")
+                if errors is not None:
+                    errors[request_id] = status
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start : start + batch_size]
+            batch = service.new_batch_http_request(callback=handle_response)
+            for msg_id in chunk:
+                batch.add(
+                    service.users()
+                    .messages()
+                    .get(userId="me", id=msg_id, **get_params),
+                    request_id=msg_id,
+                )
+            try:
+                batch.execute()
+            except HttpError as error:
+                # The whole batch was rejected, so every id in it needs another try
+                if (
+                    error.resp.status in RETRYABLE_STATUS_CODES
+                    and attempt < max_retries
+                ):
+                    retry_ids.extend(chunk)
+                else:
+                    raise
+
+        if not retry_ids:
+            break
+        attempt += 1
+        delay = retry_delay * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+        print(
+            f"[*] Retrying {len(retry_ids)} failed message fetches in {delay:.1f}s "
+            f"(attempt {attempt}/{max_retries})..."
+        )
+        time.sleep(delay)
+        pending = retry_ids
 
+    return results
 
-# get_gmail_service function remains the same as Day 1...
-# ... (keep the existing get_gmail_service function here) ...
-def get_gmail_service():
+
+def _parse_gmail_message(msg_id, message):
+    """Turns a Gmail message resource into a ParsedMessage, or None if unusable."""
+    payload = message.get("payload", {})
+    # One pass over the (often 50+) headers instead of a scan per lookup
+    headers = index_headers(payload.get("headers"))
+
+    received_at_dt = parse_date_string(headers.get("date"))
+    # Use current time if date parsing fails? Or skip? Let's skip for now.
+    if not received_at_dt:
+        print(f"[!] Could not parse date for Message-ID {msg_id}. Skipping storage.")
+        return None
+
+    # Parse body
+    body_content = parse_email_body(payload)
+
+    return ParsedMessage(
+        message_id=msg_id,
+        thread_id=message.get("threadId"),
+        sender=headers.get("from"),
+        recipient=headers.get("to"),  # Or 'delivered-to'
+        subject=headers.get("subject"),
+        body_plain=body_content.get("plain"),
+        body_html=body_content.get("html"),
+        received_at=received_at_dt,  # Stored as an ISO string by sqlite3
+        headers=headers,
+    )
+
+
+# --- Two-phase fetch ---
+# Phase one asks only for what the keyword pre-filter and the database need;
+# phase two downloads bodies for the messages that survive the pre-filter.
+METADATA_HEADERS = ["From", "To", "Subject", "Date", "List-Unsubscribe", "List-Id"]
+METADATA_FIELDS = "id,threadId,labelIds,snippet,internalDate,payload(mimeType,headers)"
+FULL_FIELDS = "id,threadId,internalDate,payload"
+
+
+def _skips_body(parsed):
     """
-    Authenticates with the Gmail API using OAuth 2.0 and returns a service object.
-    Handles token storage and refresh.
+    True if a message can be stored from its headers and snippet alone: a rule
+    classifies it, and either that rule is marked skip_body (newsletter
+    markers) or the sender is a mailing list (List-Unsubscribe header). Generic
+    promotion words in a snippet are not enough to drop the body.
     """
-    creds = None
-    # The file token.json stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first time.
-    if os.path.exists(TOKEN_FILE):
-        try:
-            with open(TOKEN_FILE, "rb") as token:
-                creds = pickle.load(token)
-        except (pickle.UnpicklingError, EOFError, FileNotFoundError) as e:
-            print(f"[!] Error loading token file: {e}. Re-authenticating.")
-            creds = None  # Force re-authentication
-            if os.path.exists(TOKEN_FILE):
-                os.remove(TOKEN_FILE)  # Remove corrupted token file
-
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                print("[*] Refreshing access token...")
-                creds.refresh(Request())
-            except Exception as e:
-                print(f"[!] Failed to refresh token: {e}. Need to re-authenticate.")
-                if os.path.exists(TOKEN_FILE):
-                    os.remove(TOKEN_FILE)  # Remove invalid token file
-                creds = None  # Force re-authentication flow
-        else:
-            print("[*] No valid credentials found. Starting authentication flow...")
-            if not os.path.exists(CREDENTIALS_FILE):
-                print(f"[!] ERROR: Credentials file not found at {CREDENTIALS_FILE}")
-                print(
-                    "[!] Please download credentials.json from Google Cloud Console and place it there."
-                )
-                return None
+    engine = get_rule_engine()
+    match = engine.scan(parsed.subject, parsed.body_plain, record=False)
+    rule = engine.classify(match, record=False)
+    if rule is None:
+        return False
+    return rule.skip_body or bool(parsed.headers.get("list-unsubscribe"))
 
-            try:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    CREDENTIALS_FILE, SCOPES
-                )
-                # port=0 finds a random available port
-                creds = flow.run_local_server(port=0)
-                print("[*] Authentication successful!")
-            except Exception as e:
-                print(f"[!] Error during authentication flow: {e}")
-                return None
-
-        # Save the credentials for the next run
-        try:
-            with open(TOKEN_FILE, "wb") as token:
-                pickle.dump(creds, token)
-            print(f"[*] Credentials saved to {TOKEN_FILE}")
-        except Exception as e:
-            print(f"[!] Error saving token file: {e}")
 
-    try:
-        service = build("gmail", "v1", credentials=creds)
-        print("[*] Gmail service object created successfully.")
-        return service
-    except HttpError as error:
-        print(f"[!] An error occurred while building the service: {error}")
-        # If the error is related to revoked credentials, suggest deleting token.json
-        if "invalid_grant" in str(error).lower():
+def fetch_new_messages(
+    service, message_ids, prefilter=GMAIL_METADATA_PREFILTER, errors=None
+):
+    """
+    Downloads and parses new messages, fetching full bodies only where needed.
+    With prefilter on, metadata (selected headers and the snippet) is fetched
+    first; bulk mail a keyword rule already classifies (see _skips_body) is
+    stored with its snippet as the body, since the analyzer never reads more.
+    Everything else is then fetched with format="full".
+    Returns (list of ParsedMessage, {message id: internalDate} of fetched ids);
+    ids that could not be fetched are missing from both (see errors in
+    batch_get_messages).
+    """
+    fetched = {}
+    parsed_messages = []
+    full_ids = list(message_ids)
+
+    if prefilter:
+        metadata = batch_get_messages(
+            service,
+            message_ids,
+            format="metadata",
+            metadataHeaders=METADATA_HEADERS,
+            fields=METADATA_FIELDS,
+            errors=errors,
+        )
+        full_ids = []
+        for msg_id in message_ids:
+            message = metadata.get(msg_id)
+            if not message:
+                continue
+            parsed = _parse_gmail_message(msg_id, message)
+            if parsed is None:
+                fetched[msg_id] = int(message.get("internalDate") or 0)
+                continue
+            parsed.body_plain = html.unescape(message.get("snippet") or "")
+            if _skips_body(parsed):
+                fetched[msg_id] = int(message.get("internalDate") or 0)
+                parsed_messages.append(parsed)
+            else:
+                full_ids.append(msg_id)
+        if message_ids:
             print(
-                "[!] Hint: The token might be invalid or revoked. Try deleting 'credentials/token.json' and re-running."
+                f"[*] Pre-filter: {len(parsed_messages)} of {len(message_ids)} messages "
+                "classified from metadata; skipping their bodies."
             )
+
+    if full_ids:
+        messages = batch_get_messages(
+            service, full_ids, format="full", fields=FULL_FIELDS, errors=errors
+        )
+        for msg_id in full_ids:
+            message = messages.get(msg_id)
+            if not message:
+                continue
+            fetched[msg_id] = int(message.get("internalDate") or 0)
+            parsed = _parse_gmail_message(msg_id, message)
+            if parsed:
+                parsed_messages.append(parsed)
+    return parsed_messages, fetched
+
+
+# --- Streaming inbox ingestion ---
+INBOX_QUERY = "is:unread in:inbox"
+# sync_state keys: the in-progress walk (JSON), the newest message seen so far,
+# and ids whose download failed (JSON list), retried at the start of each walk
+INGEST_CHECKPOINT_KEY = "inbox_ingest_checkpoint"
+INGEST_HIGH_WATER_MARK_KEY = "inbox_high_water_mark"
+INGEST_RETRY_KEY = "inbox_retry_ids"
+
+
+def _load_ingest_checkpoint():
+    raw = get_sync_state(INGEST_CHECKPOINT_KEY)
+    if not raw:
         return None
-    except Exception as e:
-        print(f"[!] An unexpected error occurred while building the service: {e}")
+    try:
+        return json.loads(raw)
+    except ValueError:
+        print("[!] Ignoring corrupt ingest checkpoint.")
         return None
 
 
-# --- Modified fetch function ---
-def fetch_and_store_unread_emails(service, max_results=10):
+def _load_retry_ids():
+    raw = get_sync_state(INGEST_RETRY_KEY)
+    try:
+        return json.loads(raw) if raw else []
+    except ValueError:
+        print("[!] Ignoring corrupt list of messages to retry.")
+        return []
+
+
+def _save_retry_ids(message_ids):
+    set_sync_state(
+        INGEST_RETRY_KEY, json.dumps(sorted(message_ids)) if message_ids else None
+    )
+
+
+def _unfetched(message_ids, fetched, errors):
+    """Ids to download again: not fetched, and not gone from the mailbox (404)."""
+    return {
+        msg_id
+        for msg_id in message_ids
+        if msg_id not in fetched and errors.get(msg_id) != 404
+    }
+
+
+def iter_unread_pages(service, page_size=GMAIL_PAGE_SIZE):
     """
-    Fetches recent unread emails, parses them, and stores new ones in the database.
+    Walks every page of unread inbox messages and yields, per page, the list of
+    ParsedMessage records (see _parse_gmail_message) for messages not stored yet.
+
+    Progress is checkpointed in the sync_state table once the caller asks for
+    the next page, so a page counts as done only after it was handled:
+    - an interrupted walk resumes from its saved page token and query;
+    - once a walk completes, the newest internalDate seen becomes the high-water
+      mark and later walks only list messages received after it.
+    Messages already in the database are skipped without being downloaded.
+    Messages whose download failed are saved in sync_state (the high-water mark
+    can move past them, so no later query would list them again) and retried
+    first thing in the next walk.
+
+    The generator's return value is True when the walk reached the last page
+    and every listed message was downloaded.
     """
-    if not service:
-        print("[!] Cannot fetch emails: Service object is not available.")
-        return 0  # Return count of newly stored emails
-
-    stored_count = 0
-    try:
-        results = (
-            service.users()
-            .messages()
-            .list(userId="me", q="is:unread in:inbox", maxResults=max_results)
-            .execute()
-        )
+    retry_ids = set()
+    failures = False
+    saved_retry_ids = _load_retry_ids()
+    if saved_retry_ids:
+        known_ids = existing_message_ids(saved_retry_ids)
+        pending = [msg_id for msg_id in saved_retry_ids if msg_id not in known_ids]
+        if pending:
+            print(f"[*] Retrying {len(pending)} message(s) that failed to download.")
+            errors = {}
+            emails, fetched = fetch_new_messages(service, pending, errors=errors)
+            retry_ids = _unfetched(pending, fetched, errors)
+            failures = bool(retry_ids)
+            if emails:
+                yield emails
+        _save_retry_ids(retry_ids)
+
+    checkpoint = _load_ingest_checkpoint()
+    if checkpoint:
+        query = checkpoint["query"]
+        page_token = checkpoint.get("page_token")
+        walk_high_water_mark = int(checkpoint.get("high_water_mark") or 0)
+        print(f"[*] Resuming interrupted inbox walk (query: '{query}').")
+    else:
+        query = INBOX_QUERY
+        high_water_mark = get_sync_state(INGEST_HIGH_WATER_MARK_KEY)
+        if high_water_mark:
+            # Gmail's after: filter takes epoch seconds; go back one second so
+            # messages sharing the boundary second are not lost (duplicates are skipped)
+            query += f" after:{int(high_water_mark) // 1000 - 1}"
+        page_token = None
+        walk_high_water_mark = int(high_water_mark or 0)
+
+    page_number = 0
+    while True:
+        page_number += 1
+        try:
+            list_params = {"userId": "me", "q": query, "maxResults": page_size}
+            if page_token:
+                list_params["pageToken"] = page_token
+            results = service.users().messages().list(**list_params).execute()
+        except HttpError as error:
+            if page_token and error.resp.status == 400:
+                # Page tokens expire; start this walk again from the first page
+                print("[!] Saved page token was rejected. Restarting inbox walk.")
+                page_token = None
+                set_sync_state(INGEST_CHECKPOINT_KEY, None)
+                continue
+            raise
 
         messages_info = results.get("messages", [])
+        page_ids = [m["id"] for m in messages_info]
+        known_ids = existing_message_ids(page_ids)
+        new_ids = [msg_id for msg_id in page_ids if msg_id not in known_ids]
+        print(
+            f"[*] Page {page_number}: {len(messages_info)} candidates, {len(new_ids)} new."
+        )
 
-        if not messages_info:
-            print("[*] No new unread messages found in the inbox.")
-            return 0
-        else:
-            print(
-                f"[*] Found {len(messages_info)} unread message candidates. Fetching details..."
+        page_emails, page_failed = [], set()
+        if new_ids:
+            errors = {}
+            page_emails, internal_dates = fetch_new_messages(
+                service, new_ids, errors=errors
             )
-            for msg_info in messages_info:
-                msg_id = msg_info["id"]
+            page_failed = _unfetched(new_ids, internal_dates, errors)
+            walk_high_water_mark = max(
+                walk_high_water_mark, *internal_dates.values(), 0
+            )
+        if page_emails:
+            yield page_emails
+        if page_failed:
+            failures = True
+            retry_ids |= page_failed
+            _save_retry_ids(retry_ids)
+
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
+        # Everything on this page has been handed out; remember where to continue
+        set_sync_state(
+            INGEST_CHECKPOINT_KEY,
+            json.dumps(
+                {
+                    "query": query,
+                    "page_token": page_token,
+                    "high_water_mark": walk_high_water_mark,
+                }
+            ),
+        )
 
-                # Check if we already stored this message to avoid redundant API calls/processing
-                if message_exists(msg_id):
-                    print(f"[*] Message {msg_id} already exists in DB. Skipping.")
-                    continue  # Skip to the next message
+    # The walk finished: advance the high-water mark and drop the checkpoint
+    if walk_high_water_mark:
+        set_sync_state(INGEST_HIGH_WATER_MARK_KEY, walk_high_water_mark)
+    set_sync_state(INGEST_CHECKPOINT_KEY, None)
+    print(f"[*] Inbox walk complete after {page_number} page(s).")
+    if retry_ids:
+        print(f"[!] {len(retry_ids)} message(s) failed to download; retrying next run.")
+    return not failures
 
-                print(f"[*] Fetching full details for Message-ID: {msg_id}...")
-                # Get the FULL message content now
-                message = (
-                    service.users()
-                    .messages()
-                    .get(
-                        userId="me",
-                        id=msg_id,
-                        format="full",  # Request full details including body and parts
-                    )
-                    .execute()
-                )
 
-                payload = message.get("payload", {})
-                headers = payload.get("headers", [])
-
-                # Parse essential details
-                subject = get_header_value(headers, "Subject")
-                sender = get_header_value(headers, "From")
-                recipient = get_header_value(headers, "To")  # Or 'Delivered-To'
-                date_str = get_header_value(headers, "Date")
-
-                received_at_dt = parse_date_string(date_str)
-                # Use current time if date parsing fails? Or skip? Let's skip for now.
-                if not received_at_dt:
-                    print(
-                        f"[!] Could not parse date for Message-ID {msg_id}. Skipping storage."
-                    )
-                    continue
-
-                # Parse body
-                body_content = parse_email_body(payload)
-                plain_body = body_content.get("plain")
-                html_body = body_content.get("html")
-
-                # Get threadId
-                thread_id = message.get("threadId")
-
-                # Prepare data dictionary for storage
-                email_data = {
-                    "message_id": msg_id,
-                    "thread_id": thread_id,
-                    "sender": sender,
-                    "recipient": recipient,
-                    "subject": subject,
-                    "body_plain": plain_body,
-                    "body_html": html_body,
-                    "received_at": received_at_dt,  # Store as datetime object or ISO string
-                }
+def iter_unread_messages(service, page_size=GMAIL_PAGE_SIZE):
+    """Yields parsed unread emails one by one as each page arrives (see iter_unread_pages)."""
+    for page_emails in iter_unread_pages(service, page_size=page_size):
+        yield from page_emails
 
-                # Store the email data in the database
-                if store_email(email_data):
-                    stored_count += 1
 
-                # Optional: Mark email as read in Gmail after processing?
-                # Be careful with this - maybe do it only after successful analysis/action later
-                # service.users().messages().modify(userId='me', id=msg_id, body={'removeLabelIds': ['UNREAD']}).execute()
-                # print(f"[*] Marked email {msg_id} as read in Gmail.")
+# --- Modified fetch function ---
+@timed("gmail.fetch_and_store")
+def fetch_and_store_unread_emails(service, max_results=None, page_size=GMAIL_PAGE_SIZE):
+    """
+    Fetches unread emails page by page, parses them, and stores new ones in the database.
+    Each page is written with a single bulk insert. Stops after the page on which
+    max_results new emails have been stored (None means walk every page); the
+    next call resumes from the saved checkpoint.
+    Returns the number of newly stored emails (see store_unread_emails).
+    """
+    return store_unread_emails(service, max_results, page_size)[0]
+
+
+def store_unread_emails(service, max_results=None, page_size=GMAIL_PAGE_SIZE):
+    """
+    Does the work of fetch_and_store_unread_emails. Returns (newly stored count,
+    complete); complete is True only when the walk reached the last page and
+    every listed message was downloaded and stored.
+    """
+    if not service:
+        print("[!] Cannot fetch emails: Service object is not available.")
+        return 0, False
 
-            print(f"[*] Finished processing batch. Newly stored emails: {stored_count}")
-            return stored_count
+    stored_count = 0
+    complete = False
+    pages = iter_unread_pages(service, page_size=page_size)
+    try:
+        while True:
+            try:
+                page_emails = next(pages)
+            except StopIteration as walk:
+                complete = bool(walk.value)
+                break
+            # Store the page's emails in the database
+            stored_count += store_emails(page_emails)
+            if max_results is not None and stored_count >= max_results:
+                print(f"[*] Reached limit of {max_results} new emails for this run.")
+                pages.close()
+                break
+
+            # Optional: Mark email as read in Gmail after processing?
+            # Be careful with this - maybe do it only after successful analysis/action later
+            # service.users().messages().modify(userId='me', id=msg_id, body={'removeLabelIds': ['UNREAD']}).execute()
+
+        if stored_count == 0:
+            print("[*] No new unread messages found in the inbox.")
+        print(f"[*] Finished fetching. Newly stored emails: {stored_count}")
+        return stored_count, complete
 
     except HttpError as error:
         print(f"[!] An error occurred while fetching/processing emails: {error}")
@@ -193,98 +442,132 @@ def fetch_and_store_unread_emails(service, max_results=10):
             print(
                 "[!] Hint: Ensure the Gmail API is enabled and permissions were granted."
             )
-        return stored_count  # Return count stored so far
+        return stored_count, False  # Return count stored so far
     except Exception as e:
         print(f"[!] An unexpected error occurred during fetching/storing: {e}")
-        return stored_count  # Return count stored so far
+        return stored_count, False  # Return count stored so far
 
 
-# src/services/email_service.py OR src/services/google_auth_service.py
-# ... (keep imports: os, pickle, Request, InstalledAppFlow, build, HttpError) ...
+# --- Incremental sync (Gmail history API) ---
 
 
-def get_google_api_service(api_name, api_version):
+def _collect_history_changes(service, start_history_id):
     """
-    Authenticates using OAuth 2.0 and returns a Google API service object.
-    Handles token storage and refresh for the requested SCOPES.
+    Reads all history records after start_history_id and returns
+    (ids of messages that are now unread in the inbox, latest historyId).
+    Raises HttpError 404 when start_history_id is too old for Gmail to serve.
     """
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        try:
-            with open(TOKEN_FILE, "rb") as token:
-                creds = pickle.load(token)
-        except Exception as e:
-            print(f"[!] Error loading token file: {e}. Re-authenticating.")
-            if os.path.exists(TOKEN_FILE):
-                os.remove(TOKEN_FILE)
-            creds = None
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                print("[*] Refreshing access token...")
-                creds.refresh(Request())
-            except Exception as e:
-                print(f"[!] Failed to refresh token: {e}. Deleting token file.")
-                if os.path.exists(TOKEN_FILE):
-                    os.remove(TOKEN_FILE)
-                creds = None  # Force re-auth
-        else:
-            print(
-                "[*] No valid credentials found or scopes changed. Starting auth flow..."
-            )
-            if not os.path.exists(CREDENTIALS_FILE):
-                print(f"[!] ERROR: Credentials file not found at {CREDENTIALS_FILE}")
-                return None
-            try:
-                # Use SCOPES from config.py
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    CREDENTIALS_FILE, SCOPES
-                )
-                creds = flow.run_local_server(port=0)
-                print("[*] Authentication successful!")
-            except Exception as e:
-                print(f"[!] Error during authentication flow: {e}")
-                return None
-        try:
-            with open(TOKEN_FILE, "wb") as token:
-                pickle.dump(creds, token)
-            print(f"[*] Credentials saved to {TOKEN_FILE}")
-        except Exception as e:
-            print(f"[!] Error saving token file: {e}")
+    latest_labels = {}  # message id -> labels after its most recent change
+    latest_history_id = start_history_id
+    page_token = None
+    while True:
+        params = {
+            "userId": "me",
+            "startHistoryId": start_history_id,
+            "historyTypes": ["messageAdded", "labelRemoved"],
+        }
+        if page_token:
+            params["pageToken"] = page_token
+        response = service.users().history().list(**params).execute()
+        latest_history_id = response.get("historyId", latest_history_id)
+
+        for record in response.get("history", []):
+            # Records arrive oldest first, so later changes overwrite earlier ones
+            for change in record.get("messagesAdded", []) + record.get(
+                "labelsRemoved", []
+            ):
+                message = change.get("message", {})
+                if message.get("id"):
+                    latest_labels[message["id"]] = message.get("labelIds", [])
+
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+
+    # New mail, and mail moved back to the inbox (e.g. out of spam), that is still unread
+    candidate_ids = [
+        msg_id
+        for msg_id, labels in latest_labels.items()
+        if "INBOX" in labels and "UNREAD" in labels
+    ]
+    return candidate_ids, latest_history_id
+
+
+def _full_resync(service, page_size):
+    """Walks the whole unread inbox and records the historyId to continue from."""
+    # Read the historyId *before* walking so changes made during the walk are replayed
+    profile = service.users().getProfile(userId="me").execute()
+    stored_count, complete = store_unread_emails(service, page_size=page_size)
+    if complete:
+        set_last_history_id(profile.get("historyId"))
+    else:
+        # Pages or messages are missing; history alone would never bring them in
+        print("[!] Full sync incomplete; it will continue on the next run.")
+    return stored_count
+
+
+@timed("gmail.sync")
+def sync_inbox(service, page_size=GMAIL_PAGE_SIZE, mode=GMAIL_SYNC_MODE):
+    """
+    Brings the local database up to date with the unread inbox.
+    In "incremental" mode only the changes since the stored historyId are fetched
+    (a single history.list call when nothing changed); without a usable historyId
+    it falls back to a full walk of the unread inbox.
+    Returns the number of newly stored emails.
+    """
+    if not service:
+        print("[!] Cannot sync inbox: Service object is not available.")
+        return 0
+    if mode != "incremental":
+        return fetch_and_store_unread_emails(service, page_size=page_size)
 
     try:
-        service = build(api_name, api_version, credentials=creds)
+        start_history_id = get_last_history_id()
+        if not start_history_id:
+            print("[*] No history checkpoint yet. Running a full inbox sync...")
+            return _full_resync(service, page_size)
+
+        try:
+            candidate_ids, latest_history_id = _collect_history_changes(
+                service, start_history_id
+            )
+        except HttpError as error:
+            if error.resp.status != 404:
+                raise
+            print("[!] Stored historyId has expired. Falling back to a full resync...")
+            return _full_resync(service, page_size)
+
+        known_ids = existing_message_ids(candidate_ids)
+        new_ids = [msg_id for msg_id in candidate_ids if msg_id not in known_ids]
         print(
-            f"[*] Google API service '{api_name} v{api_version}' created successfully."
+            f"[*] History sync: {len(candidate_ids)} changed unread messages, {len(new_ids)} new."
         )
-        return service
-    except HttpError as error:
-        print(f"[!] An error occurred building the {api_name} service: {error}")
-        if (
-            "invalid_grant" in str(error).lower()
-            or "invalid permissions" in str(error).lower()
-        ):
-            print(
-                f"[!] Hint: Token might be invalid/revoked or scopes insufficient. Try deleting '{TOKEN_FILE}' and re-running."
-            )
-        return None
-    except Exception as e:
-        print(f"[!] An unexpected error occurred building the {api_name} service: {e}")
-        return None
+        stored_count = 0
+        if new_ids:
+            errors = {}
+            parsed, fetched = fetch_new_messages(service, new_ids, errors=errors)
+            stored_count = store_emails(parsed)
+            if _unfetched(new_ids, fetched, errors):
+                # Keep the old checkpoint so the failed messages are retried next
+                # run; messages deleted since the change (404) are not waited for
+                print(
+                    "[!] Some messages could not be fetched; keeping history checkpoint."
+                )
+                return stored_count
 
+        set_last_history_id(latest_history_id)
+        print(f"[*] Incremental sync finished. Newly stored emails: {stored_count}")
+        return stored_count
 
-# Keep email-specific functions below if this file is email_service.py
-# Or move them if you created google_auth_service.py
-# ... fetch_and_store_unread_emails etc ...
-# Make sure fetch_and_store_unread_emails now calls:
-# gmail_service = get_google_api_service('gmail', 'v1')
-# instead of get_gmail_service()
+    except HttpError as error:
+        print(f"[!] An error occurred during inbox sync: {error}")
+        return 0
+    except Exception as e:
+        print(f"[!] An unexpected error occurred during inbox sync: {e}")
+        return 0
 
 
-# If you kept this in email_service.py, add a simple wrapper for backwards compatibility or update main.py
+# Kept for older callers; authentication lives in google_auth_service
 def get_gmail_service():
+    """Returns the cached Gmail service object (see google_auth_service)."""
     return get_google_api_service("gmail", "v1")
-
-
-# ... (rest of email_service.py) ...
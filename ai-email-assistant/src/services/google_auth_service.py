@@ -0,0 +1,223 @@
+# src/services/google_auth_service.py
+"""
+Process-wide registry of authenticated Google API service objects.
+
+Credentials are loaded from token.json once and then kept in memory; they are
+refreshed shortly before they expire rather than after a request fails.
+Service objects are built from the discovery documents bundled with
+google-api-python-client (no discovery fetch) and cached per (api, version).
+httplib2 connections are not thread-safe, so each thread gets its own service
+object; within a thread every call reuses the same one.
+
+The Google client libraries take a few hundred milliseconds to import, so they
+are imported on first use rather than with this module.
+"""
+import datetime
+import os.path
+import pickle
+import threading
+
+from src.utils.config import (
+    CREDENTIALS_FILE,
+    GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS,
+    SCOPES,
+    TOKEN_FILE,
+)
+
+
+class GoogleServiceRegistry:
+    def __init__(
+        self,
+        token_file=TOKEN_FILE,
+        credentials_file=CREDENTIALS_FILE,
+        scopes=SCOPES,
+        refresh_margin=GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS,
+    ):
+        self.token_file = token_file
+        self.credentials_file = credentials_file
+        self.scopes = scopes
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin)
+        self._creds = None
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.builds = 0
+        self.refreshes = 0
+
+    # --- Credentials ---
+    def credentials(self):
+        """Returns valid in-memory credentials, refreshing them if they expire soon."""
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._load_token()
+            if self._creds is not None and self._needs_refresh(self._creds):
+                self._refresh()
+            if self._creds is None or not self._creds.valid:
+                self._creds = self._authorize()
+            return self._creds
+
+    def _needs_refresh(self, creds):
+        if not creds.refresh_token:
+            return False
+        if not creds.valid:
+            return True
+        # google-auth stores expiry as a naive UTC datetime
+        expiry = getattr(creds, "expiry", None)
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return expiry is not None and expiry - now <= self.refresh_margin
+
+    def _refresh(self):
+        from google.auth.transport.requests import Request
+
+        try:
+            print("[*] Refreshing access token...")
+            self._creds.refresh(Request())
+            self.refreshes += 1
+            self._save_token(self._creds)
+        except Exception as e:
+            if self._creds.valid:
+                # Still usable for now; try again on a later call
+                print(f"[!] Early token refresh failed: {e}. Keeping current token.")
+            else:
+                print(f"[!] Failed to refresh token: {e}. Deleting token file.")
+                if os.path.exists(self.token_file):
+                    os.remove(self.token_file)
+                self._creds = None  # Force re-auth
+
+    def _load_token(self):
+        if not os.path.exists(self.token_file):
+            return None
+        try:
+            with open(self.token_file, "rb") as token:
+                return pickle.load(token)
+        except Exception as e:
+            print(f"[!] Error loading token file: {e}. Re-authenticating.")
+            if os.path.exists(self.token_file):
+                os.remove(self.token_file)
+            return None
+
+    def _save_token(self, creds):
+        try:
+            os.makedirs(os.path.dirname(self.token_file), exist_ok=True)
+            with open(self.token_file, "wb") as token:
+                pickle.dump(creds, token)
+            print(f"[*] Credentials saved to {self.token_file}")
+        except Exception as e:
+            print(f"[!] Error saving token file: {e}")
+
+    def _authorize(self):
+        print("[*] No valid credentials found or scopes changed. Starting auth flow...")
+        if not os.path.exists(self.credentials_file):
+            print(f"[!] ERROR: Credentials file not found at {self.credentials_file}")
+            return None
+        print(f"[*] Using Credentials file: {self.credentials_file}")
+        print(f"[*] Requesting Scopes: {self.scopes}")
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        try:
+            flow = InstalledAppFlow.from_client_secrets_file(
+                self.credentials_file, self.scopes
+            )
+            creds = flow.run_local_server(port=0)
+            print("[*] Authentication successful!")
+        except Exception as e:
+            print(f"[!] Error during authentication flow: {e}")
+            return None
+        self._save_token(creds)
+        return creds
+
+    # --- Services ---
+    def get(self, api_name, api_version):
+        """Returns this thread's cached service object, building it on first use."""
+        creds = self.credentials()
+        if creds is None:
+            return None
+        services = self._services()
+        key = (api_name, api_version)
+        service = services.get(key)
+        if service is None:
+            from googleapiclient.discovery import build
+
+            try:
+                service = build(
+                    api_name,
+                    api_version,
+                    credentials=creds,
+                    static_discovery=True,
+                    cache_discovery=False,
+                )
+            except Exception as e:
+                print(f"[!] An error occurred building the {api_name} service: {e}")
+                if "invalid_grant" in str(e).lower():
+                    print(
+                        f"[!] Hint: Token might be invalid/revoked or scopes insufficient. Try deleting '{self.token_file}' and re-running."
+                    )
+                return None
+            services[key] = service
+            with self._lock:
+                self.builds += 1
+            print(f"[*] Google API service '{api_name} {api_version}' created.")
+        return service
+
+    def _services(self):
+        services = getattr(self._local, "services", None)
+        if services is None:
+            services = self._local.services = {}
+        return services
+
+    def reset(self):
+        """Forgets credentials and this thread's services (e.g. after revocation)."""
+        with self._lock:
+            self._creds = None
+        self._local.services = {}
+
+
+_registry = GoogleServiceRegistry()
+
+
+def get_service_registry():
+    return _registry
+
+
+def get_google_api_service(api_name, api_version):
+    """
+    Returns an authenticated Google API service object (cached; see the
+    module docstring). Returns None if authentication fails.
+    """
+    return _registry.get(api_name, api_version)
+
+
+# Example usage (for testing): per-call cost of the old "unpickle token, build
+# service" path against the cached registry, using offline fake credentials.
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+
+    token_path = os.path.join(tempfile.mkdtemp(), "token.json")
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    with open(token_path, "wb") as f:
+        pickle.dump(Credentials(token="fake-token", expiry=expiry), f)
+
+    calls = 50
+    start = time.perf_counter()
+    for _ in range(calls):
+        with open(token_path, "rb") as f:
+            creds = pickle.load(f)
+        build("calendar", "v3", credentials=creds, static_discovery=True)
+    uncached = (time.perf_counter() - start) / calls
+
+    registry = GoogleServiceRegistry(token_file=token_path)
+    start = time.perf_counter()
+    for _ in range(calls):
+        registry.get("calendar", "v3")
+    cached = (time.perf_counter() - start) / calls
+
+    print("\n--- Google API service registry ---")
+    print(f"Load token + build per call: {uncached * 1000:.2f} ms/call")
+    print(
+        f"Registry:                    {cached * 1000:.3f} ms/call "
+        f"({registry.builds} build for {calls} calls)"
+    )
+    print("-----------------------------------")
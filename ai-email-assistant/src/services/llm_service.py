@@ -1,29 +1,214 @@
 # src/services/llm_service.py
 import os
-import requests
+import threading
 import time
 import json  # Import json for pretty printing the payload
-from dotenv import load_dotenv
 
-# Load environment variables (specifically the Hugging Face token)
-load_dotenv()
+from src.storage.cache import ResponseCache, make_cache_key
+from src.utils.config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_MEMORY_ENTRIES,
+    HF_CONNECT_TIMEOUT,
+    HF_READ_TIMEOUT,
+    HF_MAX_RETRIES,
+    HF_BACKOFF_BASE,
+    HF_BACKOFF_CAP,
+    HF_POOL_SIZE,
+    HF_RATE_LIMIT_PER_SECOND,
+    HF_RATE_LIMIT_BURST,
+    LLM_ANALYSIS_MODE,
+    LLM_BATCH_SIZE_INITIAL,
+    LLM_BATCH_SIZE_MAX,
+    LLM_BATCH_TARGET_SECONDS,
+)
+from src.utils.metrics import timed
+from src.utils.resilience import (
+    AdaptiveBatchSize,
+    TokenBucket,
+    backoff_delay,
+    parse_retry_after,
+)
 
 # Configuration
 API_URL = "https://api-inference.huggingface.co/models/google/flan-t5-base"
-HF_API_TOKEN = os.getenv("HUGGINGFACE_API_TOKEN")
-
-if not HF_API_TOKEN:
-    print("[!] Warning: HUGGINGFACE_API_TOKEN not found in environment variables.")
-
-
+HF_API_TOKEN = os.getenv("HUGGINGFACE_API_TOKEN")  # Loaded from .env by config
+
+# Responses keyed by (model URL, payload), which covers prompt and parameters
+llm_cache = (
+    ResponseCache(
+        "llm",
+        ttl_seconds=LLM_CACHE_TTL_SECONDS,
+        max_entries=LLM_CACHE_MAX_ENTRIES,
+        memory_entries=LLM_CACHE_MEMORY_ENTRIES,
+    )
+    if LLM_CACHE_ENABLED
+    else None
+)
+
+
+@timed("llm.query")
 def query_huggingface_api(payload):
-    """Sends a payload to the configured Hugging Face Inference API endpoint."""
+    """
+    Sends a payload to the configured Hugging Face Inference API endpoint.
+    Successful responses are cached; a cache hit skips the network call.
+    """
+    cache_key = make_cache_key(API_URL, payload)
+    if llm_cache is not None:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            print("[*] LLM response served from cache.")
+            return cached
+
     if not HF_API_TOKEN:
         print("[!] Cannot query Hugging Face API: Token missing.")
         return None
 
-    headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
+    result = _post_to_huggingface(payload)
+    if llm_cache is not None and isinstance(result, list) and result:
+        llm_cache.set(cache_key, result)
+    return result
+
+
+# --- Pooled Hugging Face client ---
+# Status codes worth retrying: rate limiting, model loading and transient errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class HuggingFaceClient:
+    """
+    Reusable Inference API client.
+    Keeps a pooled requests.Session (so TCP/TLS connections are reused), applies
+    connect/read timeouts, waits on a shared TokenBucket before every request, and
+    retries transient failures with exponential backoff and jitter, honouring
+    Retry-After (or the API's estimated_time while a model is loading). A
+    Retry-After longer than backoff_cap fails the request instead of retrying
+    before the server is ready for it.
+    """
+
+    def __init__(
+        self,
+        api_url,
+        token,
+        rate_limiter=None,
+        connect_timeout=HF_CONNECT_TIMEOUT,
+        read_timeout=HF_READ_TIMEOUT,
+        max_retries=HF_MAX_RETRIES,
+        backoff_base=HF_BACKOFF_BASE,
+        backoff_cap=HF_BACKOFF_CAP,
+        pool_size=HF_POOL_SIZE,
+    ):
+        import requests  # Imported on first use; see get_llm_client()
+        from requests.adapters import HTTPAdapter
+
+        self.api_url = api_url
+        self.rate_limiter = rate_limiter
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def _retry_delay(self, response, attempt):
+        """Seconds to wait before the next attempt, or None to give up."""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                # An earlier retry would only be rejected again
+                return retry_after if retry_after <= self.backoff_cap else None
+            if response.status_code == 503:
+                try:
+                    estimated = float(response.json().get("estimated_time"))
+                    return min(estimated, self.backoff_cap)
+                except (ValueError, TypeError, AttributeError):
+                    pass
+        return backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+
+    def query(self, payload):
+        """Posts payload and returns the decoded JSON, or None after all retries fail."""
+        import requests
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                with timed("llm.rate_limit_wait"):
+                    self.rate_limiter.acquire()
+            response = None
+            try:
+                with timed("llm.http"):
+                    response = self.session.post(
+                        self.api_url, json=payload, timeout=self.timeout
+                    )
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()  # Other 4xx errors are not retried
+                    return response.json()
+                reason = f"HTTP {response.status_code}"
+                if "currently loading" in response.text.lower():
+                    reason += " (model is loading)"
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as e:
+                reason = f"{type(e).__name__}"
+            except requests.exceptions.RequestException as e:
+                # Include response text in error if possible, helpful for 400 errors
+                error_details = f"{e}"
+                if e.response is not None:
+                    error_details += f"\nResponse Status: {e.response.status_code}\nResponse Text: {e.response.text}"
+                print(f"[!] Error querying Hugging Face API: {error_details}")
+                return None
+            except ValueError as e:
+                print(f"[!] Hugging Face API returned invalid JSON: {e}")
+                return None
+
+            if attempt == self.max_retries:
+                print(
+                    f"[!] Hugging Face API failed after {attempt + 1} attempts: {reason}"
+                )
+                return None
+            delay = self._retry_delay(response, attempt)
+            if delay is None:
+                print(
+                    f"[!] Hugging Face API {reason} with Retry-After over "
+                    f"{self.backoff_cap:.0f}s. Giving up on this request."
+                )
+                return None
+            print(
+                f"[!] Hugging Face API {reason}. Retrying in {delay:.1f}s "
+                f"(attempt {attempt + 1}/{self.max_retries})..."
+            )
+            with timed("llm.retry_wait"):
+                time.sleep(delay)
+        return None
+
+    def close(self):
+        self.session.close()
+
 
+# One bucket for the whole process, so parallel pipeline workers share the limit
+hf_rate_limiter = TokenBucket(HF_RATE_LIMIT_PER_SECOND, HF_RATE_LIMIT_BURST)
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Returns the shared HuggingFaceClient, creating it on first use."""
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = HuggingFaceClient(
+                API_URL, HF_API_TOKEN, rate_limiter=hf_rate_limiter
+            )
+        return _llm_client
+
+
+def _post_to_huggingface(payload):
+    """Performs the actual HTTP request to the Inference API."""
     # --- DEBUG Step 1: Print the exact payload ---
     # Use json.dumps for potentially better formatting, especially of the prompt string
     try:
@@ -34,37 +219,7 @@ def query_huggingface_api(payload):
     # --- End DEBUG Step 1 ---
 
     try:
-        response = requests.post(API_URL, headers=headers, json=payload)
-
-        # Handle specific HTTP errors
-        if response.status_code == 429:
-            print("[!] Hugging Face API Rate Limit Hit. Waiting and retrying...")
-            time.sleep(5)
-            response = requests.post(
-                API_URL, headers=headers, json=payload
-            )  # Simple retry
-
-        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-
-        return response.json()
-
-    except requests.exceptions.RequestException as e:
-        # Include response text in error if possible, helpful for 400 errors
-        error_details = f"{e}"
-        if e.response is not None:
-            try:
-                error_details += f"\nResponse Status: {e.response.status_code}\nResponse Text: {e.response.text}"
-            except Exception:
-                pass  # Ignore errors trying to get response details
-        print(f"[!] Error querying Hugging Face API: {error_details}")
-
-        if (
-            response
-            and response.status_code == 503
-            and "currently loading" in response.text.lower()
-        ):
-            print("[!] Model is loading on Hugging Face, try again in a moment.")
-        return None
+        return get_llm_client().query(payload)
     except Exception as e:
         print(f"[!] An unexpected error occurred during API query: {e}")
         return None
@@ -75,16 +230,221 @@ def query_huggingface_api(payload):
 # ... (API_URL, HF_API_TOKEN, query_huggingface_api remain the same) ...
 
 
-def analyze_email_content(subject, body, max_body_length=1500):
+INTENT_CATEGORIES = [
+    "Meeting Request",
+    "Question",
+    "Information Sharing",
+    "Spam/Unimportant",
+    "Action Required",
+    "Other",
+]
+
+# --- Analysis metrics ---
+# Which analysis path each email took and how many LLM requests it cost
+_analysis_metrics = {
+    "emails_analyzed": 0,
+    "mode_combined": 0,
+    "mode_two_step": 0,
+    "combined_fallbacks": 0,
+    "llm_calls": 0,
+    "batch_requests": 0,
+    "batched_prompts": 0,
+}
+_analysis_metrics_lock = threading.Lock()
+
+
+def _record_analysis(mode, llm_calls, fallback=False):
+    with _analysis_metrics_lock:
+        _analysis_metrics["emails_analyzed"] += 1
+        _analysis_metrics[f"mode_{mode}"] += 1
+        _analysis_metrics["llm_calls"] += llm_calls
+        if fallback:
+            _analysis_metrics["combined_fallbacks"] += 1
+
+
+def _record_batch(prompts):
+    with _analysis_metrics_lock:
+        _analysis_metrics["llm_calls"] += 1
+        _analysis_metrics["batch_requests"] += 1
+        _analysis_metrics["batched_prompts"] += prompts
+
+
+def get_analysis_metrics():
+    """Returns analysis counters plus the average number of LLM calls per email."""
+    with _analysis_metrics_lock:
+        metrics = dict(_analysis_metrics)
+    analyzed = metrics["emails_analyzed"]
+    metrics["llm_calls_per_email"] = (
+        round(metrics["llm_calls"] / analyzed, 2) if analyzed else 0.0
+    )
+    return metrics
+
+
+def _generated_text(response_data):
+    """Returns the generated text of an Inference API response, or None."""
+    if response_data and isinstance(response_data, list) and len(response_data) > 0:
+        return response_data[0].get("generated_text", "").strip()
+    return None
+
+
+def _parse_json_object(raw_text):
+    """Parses a JSON object from LLM output, tolerating ```json fences. Returns dict or None."""
+    text = raw_text.strip()
+    # Clean potential markdown ```json ... ``` artifacts
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.endswith("```"):
+        text = text[:-3]
+    text = text.strip()
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        # Some models wrap the object in prose; try the outermost braces
+        first, last = text.find("{"), text.rfind("}")
+        if first == -1 or last <= first:
+            return None
+        try:
+            parsed = json.loads(text[first : last + 1])
+        except json.JSONDecodeError:
+            return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _normalize_intent(raw_intent):
+    """Maps free-form model output onto one of INTENT_CATEGORIES, or None."""
+    cleaned = str(raw_intent or "").strip().strip("[]").strip().lower()
+    for category in INTENT_CATEGORIES:
+        if cleaned == category.lower():
+            return category
+    return None
+
+
+def analyze_email_content(subject, body, max_body_length=1500, mode=None):
     """
-    Analyzes email content. Determines intent first, then attempts to
-    extract meeting details if applicable.
+    Analyzes email content and returns intent, summary and meeting details.
+    In "combined" mode a single structured-output request returns everything;
+    if its output cannot be parsed, the "two_step" flow is used instead
+    (intent first, then a meeting-details request for meeting emails). When
+    the request gets no response at all (API unreachable, token missing) there
+    is no fallback: it returns None rather than send more requests.
+    The mode defaults to LLM_ANALYSIS_MODE; see get_analysis_metrics().
     """
+    mode = mode or LLM_ANALYSIS_MODE
     if not body:
         body = "(No body content)"
     truncated_body = body[:max_body_length]
 
-    # --- Prompt 1: Get Intent First ---
+    if mode == "combined":
+        analysis, answered = _analyze_combined(subject, truncated_body)
+        if analysis:
+            _record_analysis("combined", llm_calls=1)
+            return analysis
+        if not answered:
+            print("[!] LLM unavailable; skipping the two-step fallback.")
+            return None
+        print("[!] Combined analysis output unusable. Falling back to two-step flow.")
+        analysis, calls = _analyze_two_step(subject, truncated_body)
+        _record_analysis("two_step", llm_calls=calls + 1, fallback=True)
+        return analysis
+
+    analysis, calls = _analyze_two_step(subject, truncated_body)
+    _record_analysis("two_step", llm_calls=calls)
+    return analysis
+
+
+def _combined_payload(subject, truncated_body):
+    combined_prompt = f"""Read the following email and respond ONLY with a JSON object with these keys:
+    "intent": exactly one of [{", ".join(INTENT_CATEGORIES)}],
+    "summary": one sentence summarising the email,
+    "meeting_details": null, or for a Meeting Request an object with keys "event_summary", "date", "time", "duration_minutes" and "attendees" (list of email addresses mentioned, if any).
+
+    Subject: {subject}
+
+    Body:
+    {truncated_body}
+
+    JSON Output:
+    """
+
+    return {
+        "inputs": combined_prompt,
+        "parameters": {"max_new_tokens": 200, "temperature": 0.3},
+    }
+
+
+def _analyze_combined(subject, truncated_body):
+    """
+    One request for intent, summary and meeting details. Returns (analysis,
+    answered): analysis is None if the output is unparseable, answered is
+    False if the API gave no response at all.
+    """
+    print(
+        f"[*] Sending Combined analysis prompt to LLM for subject: '{subject[:50]}...'"
+    )
+    payload = _combined_payload(subject, truncated_body)
+    response = query_huggingface_api(payload)
+    if response is None:
+        return None, False
+    return _parse_combined(_generated_text(response)), True
+
+
+def _parse_combined(raw_text):
+    """Builds the analysis dict from combined-prompt output, or None if unusable."""
+    if raw_text is None:
+        return None
+    print(f"[*] LLM Combined Analysis Received (Raw): '{raw_text}'")
+
+    parsed = _parse_json_object(raw_text)
+    intent = _normalize_intent(parsed.get("intent")) if parsed else None
+    if not intent:
+        return None
+
+    meeting_details = parsed.get("meeting_details")
+    if intent != "Meeting Request" or not isinstance(meeting_details, dict):
+        meeting_details = None
+    print(f"[*] Parsed Intent: {intent}")
+    return {
+        "raw": raw_text,
+        "intent": intent,
+        "summary": str(parsed.get("summary") or "N/A"),
+        "meeting_details": meeting_details,
+    }
+
+
+def _extract_meeting_details(subject, truncated_body):
+    """Asks the LLM for meeting details as JSON. Returns a dict or None."""
+    details_prompt = f"""The following email is a meeting request. Extract the key details needed to schedule it. Provide the output ONLY as a JSON object with keys "event_summary", "date", "time", "duration_minutes", and "attendees" (list of potential email addresses mentioned, if any). If a detail cannot be found, use null or an empty string/list.
+
+    Subject: {subject}
+
+    Body:
+    {truncated_body}
+
+    JSON Output:
+    ```json
+    """  # Instruct LLM to output JSON
+
+    details_payload = {
+        "inputs": details_prompt,
+        # Adjust parameters if needed for JSON generation
+        "parameters": {"max_new_tokens": 150, "temperature": 0.3},
+    }
+    print("[*] Sending Meeting Details Extraction prompt to LLM...")
+    raw_details_text = _generated_text(query_huggingface_api(details_payload))
+    if raw_details_text is None:
+        print("[!] Failed to get valid Meeting Details analysis from LLM.")
+        return None
+
+    print(f"[*] LLM Meeting Details Received (Raw): '{raw_details_text}'")
+    meeting_details = _parse_json_object(raw_details_text)
+    if meeting_details is None:
+        print("[!] Failed to parse JSON meeting details from LLM response.")
+    else:
+        print(f"[*] Parsed Meeting Details: {meeting_details}")
+    return meeting_details
+
+
+def _intent_payload(subject, truncated_body):
     intent_prompt = f"""Read the following email subject and body. What is the single primary intent? Choose ONLY ONE category from the list: [Meeting Request, Question, Information Sharing, Spam/Unimportant, Action Required, Other]. Respond with only the chosen category name.
 
     Subject: {subject}
@@ -94,7 +454,7 @@ def analyze_email_content(subject, body, max_body_length=1500):
 
     Primary Intent: """
 
-    intent_payload = {
+    return {
         "inputs": intent_prompt,
         "parameters": {
             "max_new_tokens": 50,
@@ -102,99 +462,51 @@ def analyze_email_content(subject, body, max_body_length=1500):
         },  # Short response expected
     }
 
+
+def _analyze_two_step(subject, truncated_body):
+    """
+    Intent request, then a details request for meeting emails. Returns
+    (analysis, llm_calls); analysis is None without a usable intent reply.
+    """
+    # --- Prompt 1: Get Intent First ---
     print(f"[*] Sending Intent prompt to LLM for subject: '{subject[:50]}...'")
-    intent_response_data = query_huggingface_api(intent_payload)
+    intent_payload = _intent_payload(subject, truncated_body)
+    raw_intent_text = _generated_text(query_huggingface_api(intent_payload))
+    analysis, detail_calls = _complete_two_step(
+        raw_intent_text, subject, truncated_body
+    )
+    return analysis, 1 + detail_calls
+
+
+def _complete_two_step(raw_intent_text, subject, truncated_body):
+    """Turns an intent reply into an analysis, fetching meeting details if needed."""
     primary_intent = "Unknown"  # Default
 
-    if (
-        intent_response_data
-        and isinstance(intent_response_data, list)
-        and len(intent_response_data) > 0
-    ):
-        raw_intent_text = intent_response_data[0].get("generated_text", "").strip()
-        print(f"[*] LLM Intent Received (Raw): '{raw_intent_text}'")
-        cleaned_intent = raw_intent_text.strip().strip("[]").strip()
-        if cleaned_intent:
-            primary_intent = cleaned_intent
-        print(f"[*] Parsed Intent: {primary_intent}")
-    else:
+    if raw_intent_text is None:
+        # No analysis, so the email stays unprocessed and is retried next run
         print("[!] Failed to get valid Intent analysis from LLM.")
-        # Return basic analysis if intent fails
-        return {
-            "raw": "",
-            "intent": primary_intent,
-            "summary": "N/A",
-            "meeting_details": None,
-        }
+        return None, 0
+
+    print(f"[*] LLM Intent Received (Raw): '{raw_intent_text}'")
+    cleaned_intent = raw_intent_text.strip().strip("[]").strip()
+    if cleaned_intent:
+        primary_intent = cleaned_intent
+    print(f"[*] Parsed Intent: {primary_intent}")
 
     # --- Prompt 2 (Conditional): Extract Meeting Details if Intent is Meeting Request ---
     meeting_details = None
+    calls = 0
     if primary_intent == "Meeting Request":
         print(
             f"[*] Intent is '{primary_intent}'. Attempting to extract meeting details..."
         )
-        details_prompt = f"""The following email is a meeting request. Extract the key details needed to schedule it. Provide the output ONLY as a JSON object with keys "event_summary", "date", "time", "duration_minutes", and "attendees" (list of potential email addresses mentioned, if any). If a detail cannot be found, use null or an empty string/list.
-
-        Subject: {subject}
-
-        Body:
-        {truncated_body}
-
-        JSON Output:
-        ```json
-        """  # Instruct LLM to output JSON
-
-        details_payload = {
-            "inputs": details_prompt,
-            # Adjust parameters if needed for JSON generation
-            "parameters": {"max_new_tokens": 150, "temperature": 0.3},
-        }
-        print("[*] Sending Meeting Details Extraction prompt to LLM...")
-        details_response_data = query_huggingface_api(details_payload)
-
-        if (
-            details_response_data
-            and isinstance(details_response_data, list)
-            and len(details_response_data) > 0
-        ):
-            raw_details_text = (
-                details_response_data[0].get("generated_text", "").strip()
-            )
-            print(f"[*] LLM Meeting Details Received (Raw): '{raw_details_text}'")
-
-            # Attempt to parse the JSON from the response
-            try:
-                # Clean potential markdown ```json ... ``` artifacts
-                if raw_details_text.startswith("```json"):
-                    raw_details_text = raw_details_text[7:]
-                if raw_details_text.endswith("```"):
-                    raw_details_text = raw_details_text[:-3]
-                raw_details_text = raw_details_text.strip()
-
-                meeting_details = json.loads(raw_details_text)
-                print(f"[*] Parsed Meeting Details: {meeting_details}")
-                # Basic validation (check if it's a dict)
-                if not isinstance(meeting_details, dict):
-                    print("[!] LLM output for details was not a valid JSON object.")
-                    meeting_details = None  # Reset if not a dictionary
-
-            except json.JSONDecodeError as e:
-                print(
-                    f"[!] Failed to parse JSON meeting details from LLM response: {e}"
-                )
-                meeting_details = None  # Failed parsing
-            except Exception as e:
-                print(f"[!] Unexpected error parsing meeting details: {e}")
-                meeting_details = None
-        else:
-            print("[!] Failed to get valid Meeting Details analysis from LLM.")
+        meeting_details = _extract_meeting_details(subject, truncated_body)
+        calls += 1
 
     # --- Combine results ---
     # For now, we don't ask for summary if extracting details, add later if needed
     analysis = {
-        "raw": (
-            raw_intent_text if "raw_intent_text" in locals() else ""
-        ),  # Store raw intent text
+        "raw": raw_intent_text,  # Store raw intent text
         "intent": primary_intent,
         "summary": (
             "Not requested in prompt"
@@ -203,7 +515,172 @@ def analyze_email_content(subject, body, max_body_length=1500):
         ),
         "meeting_details": meeting_details,  # Add the extracted details (or None)
     }
-    return analysis
+    return analysis, calls
+
+
+# --- Batched analysis ---
+# Shared by all analyze workers, so the batch size tracks the API's behaviour
+llm_batch_size = AdaptiveBatchSize(
+    LLM_BATCH_SIZE_INITIAL,
+    minimum=1,
+    maximum=LLM_BATCH_SIZE_MAX,
+    target_latency=LLM_BATCH_TARGET_SECONDS,
+)
+
+
+# Why a batched request produced no responses
+BATCH_UNAVAILABLE = "unavailable"  # No token, or the client gave up after its retries
+BATCH_BAD_OUTPUT = "bad_output"  # The API answered, but not one output per prompt
+
+
+def _query_batch(payloads, cache_only=False):
+    """
+    Sends several single-prompt payloads as one request with a list of inputs.
+    Returns (responses, failure): one response per payload (in order), shaped
+    like a single-prompt response, and None or why the uncached ones are
+    missing (BATCH_UNAVAILABLE or BATCH_BAD_OUTPUT); their responses are then
+    None. Each prompt is cached under the same key as its single-prompt
+    payload, so cached prompts are not sent again. With cache_only nothing is
+    sent.
+    """
+    responses = [None] * len(payloads)
+    keys = [make_cache_key(API_URL, payload) for payload in payloads]
+    misses = []
+    for index, key in enumerate(keys):
+        cached = llm_cache.get(key) if llm_cache is not None else None
+        if cached is not None:
+            responses[index] = cached
+        else:
+            misses.append(index)
+    if not misses:
+        print(f"[*] All {len(payloads)} batched LLM responses served from cache.")
+        return responses, None
+    if cache_only:
+        return responses, BATCH_UNAVAILABLE
+
+    if not HF_API_TOKEN:
+        print("[!] Cannot query Hugging Face API: Token missing.")
+        return responses, BATCH_UNAVAILABLE
+
+    batch_payload = {
+        "inputs": [payloads[index]["inputs"] for index in misses],
+        "parameters": payloads[misses[0]]["parameters"],
+    }
+    started = time.monotonic()
+    result = _post_to_huggingface(batch_payload)
+    latency = time.monotonic() - started
+    _record_batch(len(misses))
+
+    # Text generation returns one list per input; some models return flat dicts
+    ok = isinstance(result, list) and len(result) == len(misses)
+    llm_batch_size.record(latency, ok=ok)
+    if result is None:
+        # HuggingFaceClient has already retried transient errors with backoff
+        print(f"[!] Batched LLM request for {len(misses)} prompts failed.")
+        return responses, BATCH_UNAVAILABLE
+    if not ok:
+        print(
+            f"[!] Batched LLM request for {len(misses)} prompts returned "
+            f"{len(result) if isinstance(result, list) else 'no'} outputs."
+        )
+        return responses, BATCH_BAD_OUTPUT
+
+    for index, output in zip(misses, result):
+        response = [output] if isinstance(output, dict) else output
+        responses[index] = response
+        if llm_cache is not None and isinstance(response, list) and response:
+            llm_cache.set(keys[index], response)
+    return responses, None
+
+
+def _stop_querying(unavailable):
+    """Switches analyze_emails() to cached responses only; returns True."""
+    if not unavailable:
+        print("[!] LLM unavailable; remaining emails use cached analyses only.")
+    return True
+
+
+def analyze_emails(batch, max_body_length=1500, mode=None):
+    """
+    Analyzes many emails with batched Inference API requests.
+    `batch` is an iterable of (message_id, subject, body) tuples; returns a dict of
+    message_id -> analysis, in the same shape as analyze_email_content(), or
+    None for emails that could not be analyzed.
+    Prompts are packed into requests of llm_batch_size.size() inputs. A request
+    whose output does not match its prompts is split in half and retried, down
+    to single emails, which go through analyze_email_content() instead. If the
+    API is unavailable (no token, retries exhausted, or a fallback request got
+    no response) nothing is split, retried or sent to the two-step fallback:
+    the remaining emails are answered from the cache or left as None.
+    """
+    mode = mode or LLM_ANALYSIS_MODE
+    build_payload = _combined_payload if mode == "combined" else _intent_payload
+    items = []  # (message_id, subject, truncated_body, payload)
+    for message_id, subject, body in batch:
+        truncated_body = (body or "(No body content)")[:max_body_length]
+        items.append(
+            (
+                message_id,
+                subject,
+                truncated_body,
+                build_payload(subject, truncated_body),
+            )
+        )
+
+    results = {}
+    retries = []  # Halves of chunks with mismatched output, sent before new items
+    unavailable = False  # Once set, only cached responses are used
+    while retries or items:
+        if retries:
+            chunk = retries.pop(0)
+        else:
+            # Re-read the size for every chunk so it adapts within one call
+            size = llm_batch_size.size()
+            chunk, items = items[:size], items[size:]
+        if not unavailable:
+            print(f"[*] Sending batched {mode} analysis for {len(chunk)} emails...")
+        responses, failure = _query_batch(
+            [item[3] for item in chunk], cache_only=unavailable
+        )
+        if failure == BATCH_UNAVAILABLE:
+            unavailable = _stop_querying(unavailable)
+        if failure == BATCH_BAD_OUTPUT:
+            if len(chunk) > 1:
+                middle = len(chunk) // 2
+                retries[:0] = [chunk[:middle], chunk[middle:]]
+            else:
+                message_id, subject, truncated_body, _ = chunk[0]
+                results[message_id] = analyze_email_content(
+                    subject, truncated_body, max_body_length, mode
+                )
+                if results[message_id] is None:
+                    unavailable = _stop_querying(unavailable)
+            continue
+
+        for (message_id, subject, truncated_body, _), response in zip(chunk, responses):
+            if response is None:
+                results[message_id] = None
+                continue
+            raw_text = _generated_text(response)
+            if mode == "combined":
+                analysis = _parse_combined(raw_text)
+                if analysis:
+                    _record_analysis("combined", llm_calls=0)
+                elif unavailable:
+                    analysis = None
+                else:
+                    print(
+                        "[!] Combined analysis output unusable. Falling back to two-step flow."
+                    )
+                    analysis, calls = _analyze_two_step(subject, truncated_body)
+                    _record_analysis("two_step", llm_calls=calls, fallback=True)
+                    if analysis is None:
+                        unavailable = _stop_querying(unavailable)
+            else:
+                analysis, calls = _complete_two_step(raw_text, subject, truncated_body)
+                _record_analysis("two_step", llm_calls=calls)
+            results[message_id] = analysis
+    return results
 
 
 # --- Add Reply Drafting function ---
@@ -241,3 +718,88 @@ def draft_reply(original_subject, original_sender, action_context):
     else:
         print("[!] Failed to get reply draft from LLM.")
         return None
+
+
+# Example usage (for testing): exercises HuggingFaceClient against a local stub
+# server that answers 429 (Retry-After), then 503 (model loading), then 200.
+if __name__ == "__main__":
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    scripted = [
+        (429, {"Retry-After": "1"}, {"error": "Rate limit reached"}),
+        (503, {}, {"error": "Model is currently loading", "estimated_time": 0.5}),
+    ]
+    connections = set()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so pooling is observable
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            connections.add(self.client_address)
+            inputs = request.get("inputs")
+            reply = {"generated_text": '{"intent": "Question", "summary": "stub"}'}
+            if isinstance(inputs, list):
+                # Fixed per-request overhead plus a little per prompt
+                time.sleep(0.05 + 0.005 * len(inputs))
+                status, headers, body = 200, {}, [[reply] for _ in inputs]
+            elif scripted:
+                status, headers, body = scripted.pop(0)
+            else:
+                time.sleep(0.05 + 0.005)
+                status, headers, body = 200, {}, [reply]
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/models/stub"
+
+    print("\n--- Testing HuggingFaceClient against a local stub ---")
+    client = HuggingFaceClient(url, "stub-token", rate_limiter=TokenBucket(20, 5))
+    start = time.perf_counter()
+    print(f"First call (429 -> 503 -> 200): {client.query({'inputs': 'hi'})}")
+    print(f"  took {time.perf_counter() - start:.2f}s (Retry-After 1s + loading 0.5s)")
+    start = time.perf_counter()
+    for _ in range(20):
+        client.query({"inputs": "hi"})
+    print(
+        f"20 more calls at 20 req/s (burst 5): {time.perf_counter() - start:.2f}s, "
+        f"{len(connections)} TCP connection(s) used in total"
+    )
+    client.close()
+
+    # Batched analysis: one request per batch instead of one per email
+    import contextlib
+    import io
+
+    llm_cache = None
+    HF_API_TOKEN = "stub-token"
+    _llm_client = HuggingFaceClient(url, HF_API_TOKEN)
+    emails = [(f"id{i}", f"Subject {i}", f"Body of email {i}") for i in range(200)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _, subject, body in emails:
+            analyze_email_content(subject, body)
+        one_by_one = time.perf_counter() - start
+        start = time.perf_counter()
+        results = analyze_emails(emails)
+        batched = time.perf_counter() - start
+    print(f"200 emails one per request: {one_by_one:.2f}s")
+    print(
+        f"200 emails via analyze_emails: {batched:.2f}s, {len(results)} results, "
+        f"batch size adapted to {llm_batch_size.size()}"
+    )
+    print(f"Analysis metrics: {get_analysis_metrics()}")
+    _llm_client.close()
+    server.shutdown()
+    print("------------------------------------------------------")
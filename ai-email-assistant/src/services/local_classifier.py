@@ -0,0 +1,252 @@
+# src/services/local_classifier.py
+"""
+Offline intent classifier for emails, in pure Python.
+
+Emails are turned into TF-IDF vectors (word unigrams and bigrams) and assigned
+to the intent whose centroid is closest by cosine similarity, which is a
+linear model that trains in one pass. It is trained from emails the remote LLM
+has already labeled (see mark_email_processed), so it learns this mailbox.
+"""
+import math
+import re
+import time
+from collections import Counter, defaultdict
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9'%$]*")
+
+
+def tokenize(text):
+    """Lower-cased word unigrams plus bigrams."""
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def email_text(subject, body, max_body_length=1500):
+    """The text the classifier sees for one email."""
+    return f"{subject or ''}\n{(body or '')[:max_body_length]}"
+
+
+class LocalIntentClassifier:
+    """
+    TF-IDF + nearest-centroid classifier.
+    predict() returns (intent, confidence), where confidence is the softmax
+    weight of the best-matching intent; callers decide what is "sure enough".
+    """
+
+    SHARPNESS = 10.0  # Softmax temperature applied to cosine similarities
+
+    def __init__(self, max_features=20000, min_df=2):
+        self.max_features = max_features
+        self.min_df = min_df
+        self.idf = {}
+        self.centroids = {}  # intent -> {term: weight}, L2-normalised
+        self.trained_examples = 0
+
+    @property
+    def trained(self):
+        return len(self.centroids) >= 2
+
+    def fit(self, texts, labels):
+        """Builds the vocabulary and one centroid per intent."""
+        docs = [Counter(tokenize(text)) for text in texts]
+        doc_freq = Counter()
+        for doc in docs:
+            doc_freq.update(doc.keys())
+        vocabulary = [
+            term
+            for term, df in doc_freq.most_common(self.max_features)
+            if df >= self.min_df
+        ]
+        n_docs = len(docs)
+        self.idf = {
+            term: math.log((1 + n_docs) / (1 + doc_freq[term])) + 1.0
+            for term in vocabulary
+        }
+
+        sums = defaultdict(lambda: defaultdict(float))
+        for doc, label in zip(docs, labels):
+            for term, weight in self._weights(doc).items():
+                sums[label][term] += weight
+        self.centroids = {label: _normalize(vector) for label, vector in sums.items()}
+        self.trained_examples = n_docs
+        return self
+
+    def _weights(self, counts):
+        vector = {
+            term: (1.0 + math.log(count)) * self.idf[term]
+            for term, count in counts.items()
+            if term in self.idf
+        }
+        return _normalize(vector)
+
+    def scores(self, text):
+        """Cosine similarity of text to every intent centroid."""
+        vector = self._weights(Counter(tokenize(text)))
+        return {
+            label: sum(
+                weight * centroid.get(term, 0.0) for term, weight in vector.items()
+            )
+            for label, centroid in self.centroids.items()
+        }
+
+    def predict(self, text):
+        """Returns (intent, confidence), or (None, 0.0) if untrained."""
+        if not self.trained:
+            return None, 0.0
+        scores = self.scores(text)
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        total = sum(math.exp(self.SHARPNESS * (s - top)) for s in scores.values())
+        return best, 1.0 / total
+
+    def accuracy(self, texts, labels):
+        if not texts:
+            return 0.0
+        hits = sum(self.predict(t)[0] == label for t, label in zip(texts, labels))
+        return hits / len(texts)
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if not norm:
+        return dict(vector)
+    return {term: w / norm for term, w in vector.items()}
+
+
+def train_from_history(limit=5000, max_body_length=1500):
+    """Trains a classifier on labeled emails in the database. Returns it, or None."""
+    from src.storage.database import get_labeled_emails
+
+    rows = get_labeled_emails(limit)
+    if not rows:
+        return None
+    texts = [email_text(r["subject"], r["body_plain"], max_body_length) for r in rows]
+    classifier = LocalIntentClassifier().fit(texts, [r["intent"] for r in rows])
+    return classifier if classifier.trained else None
+
+
+# --- Synthetic corpus for benchmarks ---
+_SYNTHETIC_TEMPLATES = {
+    "Meeting Request": [
+        "Can we schedule a call {day} at {hour} to discuss the {topic}?",
+        "Are you available {day} for a quick sync up on {topic}?",
+        "Let's meet {day} at {hour} to go over the {topic} proposal.",
+    ],
+    "Question": [
+        "Quick question: how does the {topic} handle retries?",
+        "Do you know what the deadline for the {topic} is?",
+        "What is the best way to set up the {topic}? Any docs?",
+    ],
+    "Information Sharing": [
+        "FYI, the {topic} notes from {day} are attached.",
+        "Sharing the latest update on the {topic} for your reference.",
+        "Here is the monthly newsletter about the {topic} team.",
+    ],
+    "Spam/Unimportant": [
+        "Limited time offer! Save 50% off on {topic} - shop now.",
+        "Exclusive discount on {topic}, coupon expires {day}. Unsubscribe here.",
+        "Last call: clearance sale on every {topic}, view deal today.",
+    ],
+    "Action Required": [
+        "Please approve the {topic} budget by {day}, it is blocking the release.",
+        "Action needed: sign the {topic} contract before {day}.",
+        "Urgent: review and fix the failing {topic} deployment today.",
+    ],
+}
+
+
+def synthetic_corpus(count, seed=7, label_noise=0.1):
+    """Returns (texts, labels) built from the templates above."""
+    import random
+
+    rng = random.Random(seed)
+    days = ["monday", "tuesday", "friday", "next week", "tomorrow"]
+    hours = ["9am", "11:30", "2pm", "4pm"]
+    topics = ["roadmap", "invoice", "pipeline", "launch", "hiring plan", "database"]
+    fillers = ["Hi,", "Thanks!", "Hope you are well.", "Best regards", "Let me know."]
+    labels = list(_SYNTHETIC_TEMPLATES)
+    texts, truth = [], []
+    for i in range(count):
+        label = labels[i % len(labels)]
+        template = rng.choice(_SYNTHETIC_TEMPLATES[label])
+        body = template.format(
+            day=rng.choice(days), hour=rng.choice(hours), topic=rng.choice(topics)
+        )
+        body = f"{rng.choice(fillers)} {body} {rng.choice(fillers)}"
+        texts.append(email_text(f"Re: {rng.choice(topics)}", body))
+        # Some labels disagree with the text, as LLM labels sometimes do
+        truth.append(rng.choice(labels) if rng.random() < label_noise else label)
+    return texts, truth
+
+
+# Example usage (for testing):
+#   python -m src.services.local_classifier            synthetic corpus
+#   python -m src.services.local_classifier db         labeled history in assistant.db
+#   python -m src.services.local_classifier db 20      ...and compare with 20 remote calls
+if __name__ == "__main__":
+    import sys
+
+    use_db = len(sys.argv) > 1 and sys.argv[1] == "db"
+    remote_samples = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    if use_db:
+        from src.storage.database import get_labeled_emails
+
+        rows = get_labeled_emails(10000)
+        texts = [email_text(r["subject"], r["body_plain"]) for r in rows]
+        labels = [r["intent"] for r in rows]
+        source = "assistant.db labeled history"
+    else:
+        texts, labels = synthetic_corpus(5000)
+        source = "synthetic corpus"
+
+    split = int(len(texts) * 0.8)
+    print(f"\n--- Local intent classifier on {source} ({len(texts)} emails) ---")
+    if split == 0 or len(set(labels[:split])) < 2:
+        print("[!] Not enough labeled emails to train (need at least two intents).")
+        sys.exit(0)
+
+    start = time.perf_counter()
+    classifier = LocalIntentClassifier().fit(texts[:split], labels[:split])
+    print(f"Trained on {split} emails in {time.perf_counter() - start:.3f}s")
+
+    test_texts, test_labels = texts[split:], labels[split:]
+    start = time.perf_counter()
+    accuracy = classifier.accuracy(test_texts, test_labels)
+    per_email = (time.perf_counter() - start) / max(1, len(test_texts))
+    print(
+        f"Local:  accuracy {accuracy:.1%} on {len(test_texts)} held-out emails, "
+        f"{per_email * 1000:.3f} ms per email"
+    )
+    for threshold in (0.5, 0.7, 0.9):
+        confident = [
+            (t, label)
+            for t, label in zip(test_texts, test_labels)
+            if classifier.predict(t)[1] >= threshold
+        ]
+        hits = sum(classifier.predict(t)[0] == label for t, label in confident)
+        print(
+            f"  confidence >= {threshold}: {len(confident) / len(test_texts):.0%} of emails "
+            f"handled locally, {hits / max(1, len(confident)):.1%} accurate"
+        )
+
+    if remote_samples:
+        import contextlib
+        import io
+
+        from src.services.llm_service import analyze_email_content
+
+        sample = list(zip(test_texts, test_labels))[:remote_samples]
+        hits = 0
+        start = time.perf_counter()
+        for text, label in sample:
+            subject, _, body = text.partition("\n")
+            with contextlib.redirect_stdout(io.StringIO()):
+                analysis = analyze_email_content(subject, body)
+            hits += bool(analysis) and analysis.get("intent") == label
+        per_email = (time.perf_counter() - start) / len(sample)
+        print(
+            f"Remote: accuracy {hits / len(sample):.1%} on {len(sample)} emails, "
+            f"{per_email * 1000:.0f} ms per email"
+        )
+    print("---------------------------------------------------------------")
@@ -1,51 +1,83 @@
 # src/services/slack_service.py
-import os
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-from dotenv import load_dotenv
+"""
+Slack delivery.
 
-# Load environment variables from .env file
-load_dotenv()
+SlackNotifier is the main path: notify() only queues the notification, and a
+background thread posts everything queued within a short window as a single
+Block Kit digest, retrying rate limits after Retry-After. send_slack_message()
+posts one message synchronously.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
 
-SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
-TARGET_SLACK_CHANNEL_ID = os.getenv("TARGET_SLACK_CHANNEL_ID")
+from src.utils.config import (
+    SLACK_API_URL,
+    SLACK_BOT_TOKEN,
+    SLACK_DIGEST_MAX_ITEMS,
+    SLACK_DIGEST_WINDOW_SECONDS,
+    SLACK_MAX_RETRIES,
+    TARGET_SLACK_CHANNEL_ID,
+)
+from src.utils.metrics import timed
+from src.utils.resilience import backoff_delay, parse_retry_after
+
+# --- Slack Client ---
+# Created (and its token checked with auth.test) on first use, not at import,
+# so commands that never post to Slack skip the slack_sdk import and the call.
+_slack_client = None
+_slack_client_ready = False
+_slack_client_lock = threading.Lock()
+
+
+def get_slack_client():
+    """Returns the shared WebClient, or None if Slack is not configured or auth failed."""
+    global _slack_client, _slack_client_ready
+    with _slack_client_lock:
+        if not _slack_client_ready:
+            _slack_client = _create_slack_client()
+            _slack_client_ready = True
+        return _slack_client
+
+
+def _create_slack_client():
+    if not SLACK_BOT_TOKEN:
+        print(
+            "[!] Warning: SLACK_BOT_TOKEN not found in environment variables. Slack integration disabled."
+        )
+        return None
+    from slack_sdk import WebClient
+    from slack_sdk.errors import SlackApiError
 
-# Initialize Slack Client
-slack_client = None
-if SLACK_BOT_TOKEN:
     try:
-        slack_client = WebClient(token=SLACK_BOT_TOKEN)
+        client = WebClient(token=SLACK_BOT_TOKEN, base_url=SLACK_API_URL)
         # Test authentication (optional but recommended)
-        auth_test = slack_client.auth_test()
+        auth_test = client.auth_test()
         if auth_test.get("ok"):
             print(
                 f"[*] Slack client initialized successfully for user {auth_test.get('user')} in team {auth_test.get('team')}"
             )
-        else:
-            print(f"[!] Slack Authentication failed: {auth_test.get('error')}")
-            slack_client = None  # Invalidate client if auth fails
+            return client
+        print(f"[!] Slack Authentication failed: {auth_test.get('error')}")
     except SlackApiError as e:
         print(f"[!] Error initializing Slack client: {e.response['error']}")
-        slack_client = None
-else:
-    print(
-        "[!] Warning: SLACK_BOT_TOKEN not found in environment variables. Slack integration disabled."
-    )
-
-if not TARGET_SLACK_CHANNEL_ID:
-    print(
-        "[!] Warning: TARGET_SLACK_CHANNEL_ID not found in environment variables. Slack messages may fail."
-    )
+    except Exception as e:
+        print(f"[!] An unexpected error occurred initializing Slack client: {e}")
+    return None  # Invalidate client if auth fails
 
 
+@timed("slack.send_message")
 def send_slack_message(message_text):
     """Sends a message to the configured Slack channel."""
+    slack_client = get_slack_client()
     if not slack_client:
         print("[!] Cannot send Slack message: Client not initialized (check token).")
         return False
     if not TARGET_SLACK_CHANNEL_ID:
         print("[!] Cannot send Slack message: Target channel ID missing.")
         return False
+    from slack_sdk.errors import SlackApiError
 
     try:
         response = slack_client.chat_postMessage(
@@ -70,9 +102,298 @@ def send_slack_message(message_text):
         return False
 
 
-# Example usage (for testing)
+# --- Digests ---
+_FLUSH = object()  # Queue marker: post what has been collected without waiting
+_STOP = object()
+
+SLACK_TEXT_LIMIT = 3000  # Characters per Block Kit text object
+
+
+def _escape(text):
+    """Escapes the characters Slack treats as markup (&, <, >)."""
+    return str(text).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _email_blocks(text, email):
+    if not email:
+        return [
+            {
+                "type": "section",
+                "text": {"type": "mrkdwn", "text": text[:SLACK_TEXT_LIMIT]},
+            }
+        ]
+    fields = [
+        ("From", email.get("sender")),
+        ("Subject", email.get("subject")),
+        ("Intent", email.get("intent")),
+    ]
+    return [
+        {
+            "type": "section",
+            "fields": [
+                {"type": "mrkdwn", "text": f"*{name}:*\n{_escape(value)[:1900]}"}
+                for name, value in fields
+                if value
+            ],
+        },
+        {
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"Message ID: {_escape(email.get('message_id', '?'))}",
+                }
+            ],
+        },
+    ]
+
+
+def build_digest(items):
+    """
+    Block Kit blocks and plain-text fallback for [(text, email)] notifications.
+    email is an optional dict (sender, subject, intent, message_id) rendered as
+    fields; without it the notification's own mrkdwn text is used.
+    """
+    if len(items) == 1:
+        title = "Important email"
+    else:
+        title = f"{len(items)} important emails"
+    blocks = [{"type": "header", "text": {"type": "plain_text", "text": title}}]
+    for index, (text, email) in enumerate(items):
+        if index:
+            blocks.append({"type": "divider"})
+        blocks.extend(_email_blocks(text, email))
+    if len(items) == 1:
+        fallback = items[0][0]
+    else:
+        subjects = [(email or {}).get("subject") or text for text, email in items]
+        fallback = f"{title}: " + "; ".join(s.splitlines()[0] for s in subjects)
+    return blocks, fallback[:SLACK_TEXT_LIMIT]
+
+
+class SlackNotifier:
+    """
+    Queues Slack notifications and posts them from a background thread, so
+    callers never wait on Slack.
+    Everything queued within window_seconds of the first pending notification
+    (up to max_batch) goes out as one digest post, and posts are spaced at
+    least min_interval apart (Slack allows about one message per second per
+    channel), so a busy inbox stays under the rate limit. A 429 still waits
+    for Retry-After; server
+    and connection errors back off with jitter, up to max_retries.
+    notify() returns a Future that resolves to True once the notification has
+    been posted (False if it could not be).
+    """
+
+    def __init__(
+        self,
+        client=None,
+        channel=TARGET_SLACK_CHANNEL_ID,
+        window_seconds=SLACK_DIGEST_WINDOW_SECONDS,
+        max_batch=SLACK_DIGEST_MAX_ITEMS,
+        max_retries=SLACK_MAX_RETRIES,
+        min_interval=1.0,
+        backoff_base=1.0,
+        backoff_cap=30.0,
+    ):
+        self._client = client
+        self.min_interval = min_interval
+        self._next_post_at = 0.0  # Monotonic time the next post may go out
+        self.channel = channel
+        self.window_seconds = window_seconds
+        self.max_batch = max(1, max_batch)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.queued = 0
+        self.digests = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_slack_client()
+        return self._client
+
+    def notify(self, text, email=None):
+        """Queues one notification and returns immediately (see the class docstring)."""
+        future = Future()
+        with self._lock:
+            self.queued += 1
+            self._pending.add(future)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="slack-notifier", daemon=True
+                )
+                self._thread.start()
+        future.add_done_callback(self._discard)
+        self._queue.put((text, email, future))
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def flush(self, timeout=None):
+        """
+        Posts whatever is queued now, without waiting for the digest window, and
+        waits for it to be delivered. Returns True if nothing is left pending.
+        """
+        with self._lock:
+            pending = list(self._pending)
+        if not pending:
+            return True
+        self._queue.put(_FLUSH)
+        done, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def close(self, timeout=None):
+        """Flushes, then stops the background thread."""
+        self.flush(timeout)
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self.queued,
+            "digests": self.digests,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+        }
+
+    # --- Background thread ---
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if item is _FLUSH:
+                continue
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+                if item is _FLUSH:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._deliver(batch)
+            if stop:
+                return
+
+    def _deliver(self, batch):
+        ok = self._post([(text, email) for text, email, _ in batch])
+        with self._lock:
+            self.digests += 1
+            if ok:
+                self.delivered += len(batch)
+            else:
+                self.failed += len(batch)
+        for _, _, future in batch:
+            future.set_result(ok)
+
+    def _post(self, items):
+        client = self.client
+        if not client or not self.channel:
+            print("[!] Cannot send Slack digest: client or target channel missing.")
+            return False
+        from slack_sdk.errors import SlackApiError
+
+        blocks, fallback = build_digest(items)
+        for attempt in range(self.max_retries + 1):
+            time.sleep(max(0.0, self._next_post_at - time.monotonic()))
+            try:
+                try:
+                    with timed("slack.post"):
+                        response = client.chat_postMessage(
+                            channel=self.channel, text=fallback, blocks=blocks
+                        )
+                finally:
+                    self._next_post_at = time.monotonic() + self.min_interval
+                if response.get("ok"):
+                    print(
+                        f"[*] Slack digest with {len(items)} notification(s) sent to {self.channel}"
+                    )
+                    return True
+                print(f"[!] Slack API error posting digest: {response.get('error')}")
+                return False
+            except SlackApiError as e:
+                status = e.response.status_code
+                if status == 429:
+                    with self._lock:
+                        self.rate_limited += 1
+                    delay = parse_retry_after(_header(e.response, "Retry-After"))
+                    if delay is None:
+                        delay = backoff_delay(
+                            attempt, self.backoff_base, self.backoff_cap
+                        )
+                    reason = "rate limited"
+                elif status >= 500:
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                    reason = f"HTTP {status}"
+                else:
+                    print(f"[!] Error sending Slack digest: {e.response.get('error')}")
+                    return False
+            except Exception as e:
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                reason = type(e).__name__
+            if attempt == self.max_retries:
+                break
+            with self._lock:
+                self.retries += 1
+            print(
+                f"[!] Slack digest not sent ({reason}); retrying in {delay:.1f}s "
+                f"(attempt {attempt + 1}/{self.max_retries})."
+            )
+            time.sleep(min(delay, self.backoff_cap))  # Only this thread waits
+        print(f"[!] Giving up on Slack digest after {self.max_retries + 1} attempts.")
+        return False
+
+
+def _header(response, name):
+    for key, value in (response.headers or {}).items():
+        if key.lower() == name.lower():
+            return value[0] if isinstance(value, list) else value
+    return None
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_slack_notifier():
+    """Returns the process-wide SlackNotifier, creating it on first use."""
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = SlackNotifier()
+        return _notifier
+
+
+# Example usage (for testing): send one real test message. The digest
+# benchmark against a fake Slack server is scripts/bench_slack.py.
 if __name__ == "__main__":
-    if slack_client and TARGET_SLACK_CHANNEL_ID:
+    if get_slack_client() and TARGET_SLACK_CHANNEL_ID:
         print("\n--- Testing Slack Integration ---")
         test_message = "Hello from the AI Email Assistant! This is a test message."
         send_slack_message(test_message)
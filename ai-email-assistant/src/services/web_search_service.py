@@ -1,48 +1,420 @@
 # src/services/web_search_service.py
-from duckduckgo_search import DDGS
+"""
+Web search fanned out over several providers, behind a persistent result cache.
+
+Each search runs every configured provider (DuckDuckGo, the local index of past
+answers, registered extras) concurrently under asyncio, each with its own
+timeout and all under one deadline. With the "first" strategy the first
+provider to return results wins and the others are cancelled; with "merge"
+everything that arrives before the deadline is combined.
+
+Queries are normalized first (reply/forward prefixes stripped, casefolded,
+whitespace collapsed), so every message in a "Re: Re: Fwd:" thread shares one
+cache entry. Fresh entries are answered from the cache; expired ones are still
+returned while a background thread refreshes them. Each provider has its own
+circuit breaker, which stops calling it for a while after repeated errors
+instead of sleeping on each one; the other providers keep answering.
+"""
+import asyncio
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
+from src.storage.answers import AnswerIndex
+from src.storage.cache import ResponseCache, make_cache_key
+from src.utils.config import (
+    WEB_SEARCH_BREAKER_FAILURES,
+    WEB_SEARCH_BREAKER_RESET_SECONDS,
+    WEB_SEARCH_CACHE_MAX_ENTRIES,
+    WEB_SEARCH_CACHE_TTL_SECONDS,
+    WEB_SEARCH_DEADLINE_SECONDS,
+    WEB_SEARCH_PROVIDERS,
+    WEB_SEARCH_STALE_SECONDS,
+    WEB_SEARCH_STRATEGY,
+)
+from src.utils.metrics import timed
+from src.utils.resilience import CircuitBreaker
 
-def search_web(query, max_results=3):
+# "Re:", "RE[2]:", "Fwd:", "FW:", "AW:" (German), "SV:" (Nordic), repeated
+_REPLY_PREFIX_RE = re.compile(r"^\s*(?:(?:re|fwd?|aw|sv)(?:\[\d+\])?\s*:\s*)+", re.I)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+search_cache = ResponseCache(
+    "web_search",
+    ttl_seconds=WEB_SEARCH_CACHE_TTL_SECONDS,
+    max_entries=WEB_SEARCH_CACHE_MAX_ENTRIES,
+    stale_seconds=WEB_SEARCH_STALE_SECONDS,
+)
+_breakers = {}  # Provider name -> CircuitBreaker
+_breakers_lock = threading.Lock()
+
+# DuckDuckGo searches run on these long-lived threads (asyncio.run() would shut
+# down its default executor after every search). Each thread keeps one DDGS
+# session and its HTTP connections, so searches run in parallel without sharing
+# a session or holding a lock during the request.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="web-search")
+_clients = threading.local()
+_refreshing = set()  # Cache keys with a background refresh in flight
+_refreshing_lock = threading.Lock()
+_stats = {"searches": 0, "provider_calls": 0, "refreshes": 0, "blocked": 0}
+_stats_lock = threading.Lock()
+answer_index = AnswerIndex()
+
+
+def _bump(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_breaker(name):
+    """The circuit breaker of the provider with this name."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(
+                WEB_SEARCH_BREAKER_FAILURES, WEB_SEARCH_BREAKER_RESET_SECONDS
+            )
+        return breaker
+
+
+def normalize_query(query):
+    """Cache form of a query: no reply prefixes, casefolded, single spaces."""
+    query = _REPLY_PREFIX_RE.sub("", query or "")
+    return _WHITESPACE_RE.sub(" ", query.casefold()).strip()
+
+
+def _new_client():
+    from duckduckgo_search import DDGS  # Heavy import; only needed to search
+
+    return DDGS()
+
+
+def _fetch_results(query, max_results):
     """
-    Performs a web search using DuckDuckGo and returns formatted results.
+    Runs one DuckDuckGo search. Returns a list of {title, href, body} dicts
+    ([] when nothing was found), or None on error.
     """
-    print(f"[*] Performing web search for query: '{query}'")
-    results_string = f"Web search results for '{query}':\n"
+    client = getattr(_clients, "ddgs", None)
     try:
-        # Use a context manager for DDGS object
-        with DDGS() as ddgs:
-            search_results = ddgs.text(query, max_results=max_results)
-
-            if not search_results:
-                print("[*] No search results found.")
-                return f"No results found for '{query}'."
-
-            count = 0
-            for i, result in enumerate(search_results):
-                if count >= max_results:
-                    break
-                title = result.get("title", "No Title")
-                href = result.get("href", "#")
-                body = result.get("body", "No snippet available.")
-                results_string += f"{i+1}. {title} ({href})\n   {body}\n\n"
-                count += 1
-
-            print(f"[*] Web search successful. Found {count} results.")
-            return results_string.strip()
-
+        if client is None:
+            client = _clients.ddgs = _new_client()
+        _bump("provider_calls")
+        raw = client.text(query, max_results=max_results) or []
     except Exception as e:
         print(f"[!] Error during web search: {e}")
-        # Implement retry or fallback if necessary
-        # Adding a small delay in case of frequent errors
-        time.sleep(1)
+        _clients.ddgs = None  # Start a fresh session next time
+        return None
+    return [
+        {
+            "title": result.get("title", "No Title"),
+            "href": result.get("href", "#"),
+            "body": result.get("body", "No snippet available."),
+        }
+        for result in raw[:max_results]
+    ]
+
+
+# --- Providers ---
+class SearchProvider:
+    """
+    A search backend. search() returns a list of {title, href, body} dicts
+    ([] for no results) or None on error; it is cancelled if it runs longer
+    than `timeout` seconds or another provider wins first.
+    """
+
+    name = "provider"
+    timeout = 5.0
+    local = False  # Local providers answer from data the assistant already has
+
+    async def search(self, query, max_results):
+        raise NotImplementedError
+
+
+class DuckDuckGoProvider(SearchProvider):
+    name = "duckduckgo"
+    timeout = 6.0
+
+    async def search(self, query, max_results):
+        # DDGS is blocking; a cancelled call finishes in its thread, unused
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, _fetch_results, query, max_results)
+
+
+class PastAnswersProvider(SearchProvider):
+    """Results already used for similar questions (SQLite FTS5, see AnswerIndex)."""
+
+    name = "past_answers"
+    timeout = 1.0
+    local = True
+
+    def __init__(self, index=None):
+        self.index = index or answer_index
+
+    async def search(self, query, max_results):
+        return await asyncio.to_thread(self.index.search, query, max_results)
+
+
+SEARCH_PROVIDERS = {
+    DuckDuckGoProvider.name: DuckDuckGoProvider,
+    PastAnswersProvider.name: PastAnswersProvider,
+}
+
+
+def register_search_provider(name, factory):
+    """Makes an extra provider available to WEB_SEARCH_PROVIDERS by name."""
+    SEARCH_PROVIDERS[name] = factory
+    global _providers
+    _providers = None
+
+
+_providers = None
+_provider_stats = {}
+_provider_stats_lock = threading.Lock()
+
+
+def get_search_providers():
+    """Instances of the providers named in WEB_SEARCH_PROVIDERS, in that order."""
+    global _providers
+    if _providers is None:
+        providers = []
+        for name in WEB_SEARCH_PROVIDERS:
+            factory = SEARCH_PROVIDERS.get(name)
+            if factory is None:
+                print(f"[!] Unknown web search provider '{name}'. Skipping it.")
+            else:
+                providers.append(factory())
+        _providers = providers
+    return _providers
+
+
+def _count(provider, outcome, elapsed=None):
+    with _provider_stats_lock:
+        stats = _provider_stats.setdefault(
+            provider.name,
+            dict.fromkeys(
+                (
+                    "calls",
+                    "ok",
+                    "empty",
+                    "timeouts",
+                    "errors",
+                    "cancelled",
+                    "blocked",
+                    "wins",
+                ),
+                0,
+            ),
+        )
+        stats[outcome] += 1
+        if elapsed is not None:
+            stats["calls"] += 1
+            stats["seconds"] = round(stats.get("seconds", 0.0) + elapsed, 3)
+
+
+async def _run_provider(provider, query, max_results):
+    breaker = get_breaker(provider.name)
+    if not breaker.allow():
+        _bump("blocked")
+        _count(provider, "blocked")
+        print(
+            f"[!] Search provider '{provider.name}' paused after repeated errors; "
+            "skipping it."
+        )
+        return None
+    start = time.perf_counter()
+    try:
+        results = await asyncio.wait_for(
+            provider.search(query, max_results), provider.timeout
+        )
+    except asyncio.TimeoutError:
+        _count(provider, "timeouts", time.perf_counter() - start)
+        breaker.record_failure()
+        return None
+    except asyncio.CancelledError:
+        # Lost the race; says nothing about the provider's health
+        _count(provider, "cancelled", time.perf_counter() - start)
+        breaker.release()
+        raise
+    except Exception as e:
+        print(f"[!] Search provider '{provider.name}' failed: {e}")
+        _count(provider, "errors", time.perf_counter() - start)
+        breaker.record_failure()
+        return None
+    _count(
+        provider,
+        "empty" if results == [] else "errors" if results is None else "ok",
+        time.perf_counter() - start,
+    )
+    if results is None:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return results
+
+
+async def fan_out(
+    providers,
+    query,
+    max_results=3,
+    strategy=WEB_SEARCH_STRATEGY,
+    deadline=WEB_SEARCH_DEADLINE_SECONDS,
+):
+    """
+    Queries all providers concurrently. Returns (results, names of the providers
+    they came from); results is None if every provider failed or timed out.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = {
+        asyncio.create_task(_run_provider(p, query, max_results)): p for p in providers
+    }
+    answers = {}  # provider -> results
+    # "No results" only counts when a remote provider says so
+    authoritative = [p for p in providers if not p.local] or providers
+    any_ok = False
+    pending = set(tasks)
+    end = loop.time() + deadline
+    try:
+        while pending:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            # Several can finish together; prefer the configured order
+            for task in sorted(done, key=lambda t: providers.index(tasks[t])):
+                results = task.result()
+                if results is not None and tasks[task] in authoritative:
+                    any_ok = True
+                if results:
+                    answers[tasks[task]] = results
+            if answers and strategy != "merge":
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    if not answers:
+        return ([] if any_ok else None), []
+    merged, seen, winners = [], set(), []
+    for provider in providers:
+        for result in answers.get(provider, []):
+            if len(merged) < max_results and result["href"] not in seen:
+                seen.add(result["href"])
+                merged.append(result)
+                if provider not in winners:
+                    winners.append(provider)
+    for provider in winners:
+        _count(provider, "wins")
+    return merged, [p.name for p in winners]
+
+
+def _search_providers(query, max_results, providers=None):
+    """Runs fan_out() to completion from synchronous code (one loop per call)."""
+    providers = get_search_providers() if providers is None else providers
+    if not providers:
+        return None, []
+    results, sources = asyncio.run(fan_out(providers, query, max_results))
+    web_sources = [
+        name
+        for name in sources
+        if not getattr(SEARCH_PROVIDERS.get(name), "local", False)
+    ]
+    if results and web_sources:
+        answer_index.remember(query, results)
+    return results, sources
+
+
+def _refresh(key, query, max_results):
+    try:
+        # Refreshes go to the remote providers; past answers would repeat the entry
+        remote = [p for p in get_search_providers() if not p.local]
+        results, _ = _search_providers(query, max_results, remote)
+        if results is not None:
+            search_cache.set(key, results)
+            _bump("refreshes")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def _refresh_in_background(key, query, max_results):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    threading.Thread(
+        target=_refresh, args=(key, query, max_results), daemon=True
+    ).start()
+
+
+def format_results(query, results):
+    if not results:
+        return f"No results found for '{query}'."
+    results_string = f"Web search results for '{query}':\n"
+    for i, result in enumerate(results):
+        results_string += (
+            f"{i+1}. {result['title']} ({result['href']})\n   {result['body']}\n\n"
+        )
+    return results_string.strip()
+
+
+@timed("search.web")
+def search_web(query, max_results=3):
+    """
+    Searches all configured providers for query and returns formatted results.
+    """
+    normalized = normalize_query(query)
+    _bump("searches")
+    if not normalized:
+        return f"No results found for '{query}'."
+    key = make_cache_key("web_search", normalized, max_results)
+    results, fresh = search_cache.lookup(key)
+    if results is not None:
+        if not fresh:
+            print(f"[*] Serving cached search results for '{normalized}' (refreshing).")
+            _refresh_in_background(key, normalized, max_results)
+        else:
+            print(f"[*] Web search results for '{normalized}' served from cache.")
+        return format_results(query, results)
+
+    print(f"[*] Performing web search for query: '{normalized}'")
+    results, sources = _search_providers(normalized, max_results)
+    if results is None:
         return f"Error occurred during web search for '{query}'."
+    search_cache.set(key, results)
+    print(
+        f"[*] Web search successful. Found {len(results)} results "
+        f"({', '.join(sources) or 'no provider had results'})."
+    )
+    return format_results(query, results)
+
+
+def get_search_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    stats["breakers"] = {
+        name: {"state": breaker.state, "trips": breaker.trips}
+        for name, breaker in breakers.items()
+    }
+    stats["cache"] = search_cache.stats()
+    with _provider_stats_lock:
+        stats["providers"] = {name: dict(s) for name, s in _provider_stats.items()}
+    return stats
 
 
-# Example usage (for testing)
+# Example usage (for testing): a real search, then the same one from the cache
 if __name__ == "__main__":
-    test_query = "What is the capital of France?"
-    search_results = search_web(test_query)
+    test_query = "Re: What is the capital of France?"
+    for _ in range(2):
+        start = time.perf_counter()
+        search_results = search_web(test_query)
+        print(f"(took {time.perf_counter() - start:.2f}s)")
     print("\n--- Test Search Results ---")
     print(search_results)
     print("---------------------------")
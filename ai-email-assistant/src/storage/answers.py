@@ -0,0 +1,96 @@
+# src/storage/answers.py
+import sqlite3
+import threading
+import time
+
+from src.storage.database import fts_match_expression, get_storage
+
+# Database paths whose answer_index table is known to exist
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+class AnswerIndex:
+    """
+    Full-text index (SQLite FTS5) of search results the assistant has already
+    used to answer questions, keyed by the query that found them.
+    A new question is matched against past queries and result text, so it can
+    be answered without going to the web when someone asked something similar.
+    """
+
+    TRIM_EVERY = 100  # Writes between trims to max_rows
+
+    def __init__(self, max_rows=20000):
+        self.max_rows = max_rows
+        self._writes = 0
+
+    def remember(self, query, results):
+        """Stores the results found for query, replacing any earlier ones."""
+        if not results:
+            return
+        try:
+            self._ensure_schema()
+            with get_storage().transaction() as conn:
+                conn.execute("DELETE FROM answer_index WHERE query = ?", (query,))
+                conn.executemany(
+                    "INSERT INTO answer_index (query, title, body, href, created_at) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (query, r["title"], r["body"], r["href"], time.time())
+                        for r in results
+                    ],
+                )
+                self._writes += 1
+                if self._writes % self.TRIM_EVERY:
+                    return
+                conn.execute(
+                    """
+                DELETE FROM answer_index WHERE rowid IN (
+                    SELECT rowid FROM answer_index ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                    (self.max_rows,),
+                )
+        except sqlite3.Error as e:
+            print(f"[!] Could not store past answer: {e}")
+
+    def search(self, query, limit=3):
+        """Best-ranked (bm25) past results containing every query term."""
+        match = fts_match_expression(query)
+        if match is None:
+            return []
+        try:
+            self._ensure_schema()
+            rows = (
+                get_storage()
+                .connection()
+                .execute(
+                    """
+                SELECT title, body, href FROM answer_index
+                WHERE answer_index MATCH ?
+                ORDER BY bm25(answer_index) LIMIT ?
+                """,
+                    (match, limit),
+                )
+                .fetchall()
+            )
+        except sqlite3.Error as e:
+            print(f"[!] Past answer lookup failed: {e}")
+            return []
+        return [
+            {"title": row["title"], "body": row["body"], "href": row["href"]}
+            for row in rows
+        ]
+
+    def _ensure_schema(self):
+        storage = get_storage()
+        if storage.db_path in _schema_ready:  # Per database: DB_PATH can change
+            return
+        with _schema_lock, storage.transaction() as conn:
+            conn.execute(
+                """
+            CREATE VIRTUAL TABLE IF NOT EXISTS answer_index USING fts5(
+                query, title, body, href UNINDEXED, created_at UNINDEXED
+            );
+            """
+            )
+            _schema_ready.add(storage.db_path)
@@ -0,0 +1,233 @@
+# src/storage/cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from src.storage.database import get_storage
+
+# Database paths whose cache_entries table is known to exist
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def make_cache_key(*parts):
+    """Content-addressed key: SHA-256 of the JSON encoding of all parts."""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for JSON-serialisable values.
+    An in-memory LRU sits in front of the `cache_entries` table in the assistant
+    database, so entries survive restarts. Entries expire after ttl_seconds and
+    the table is trimmed to max_entries (least recently used first); hits in
+    memory are written back to last_access in batches, so entries used often
+    are not the first ones trimmed.
+    Several caches can share the table by using different namespaces.
+    With stale_seconds > 0, expired entries are kept that much longer so
+    lookup() can serve them while the caller refreshes them.
+    """
+
+    PRUNE_EVERY = 100  # Writes between clean-ups of the SQLite tier
+    TOUCH_BATCH = 50  # Memory hits collected before last_access is written back
+
+    def __init__(
+        self, namespace, ttl_seconds, max_entries, memory_entries=256, stale_seconds=0
+    ):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> time of its latest memory hit, not yet saved
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    # --- Public API ---
+    def get(self, key):
+        """Returns the cached value, or None on a miss or an expired entry."""
+        value, fresh = self.lookup(key)
+        return value if fresh else None
+
+    def lookup(self, key):
+        """
+        Returns (value, fresh). Expired entries still inside the stale window
+        come back as (value, False); misses are (None, False).
+        """
+        now = time.time()
+        result = None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                result = entry[1], True
+            elif entry and entry[0] + self.stale_seconds > now:
+                self.stale_hits += 1
+                result = entry[1], False
+            elif entry:
+                del self._memory[key]
+            if result is not None:
+                self._touched[key] = now
+                write_back = len(self._touched) >= self.TOUCH_BATCH
+        if result is not None:
+            if write_back:
+                self._save_touches()
+            return result
+
+        value, expires_at = self._load(key, now)
+        fresh = value is not None and expires_at > now
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            elif fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        return value, fresh
+
+    def set(self, key, value):
+        """Stores value under key in both tiers."""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        self._remember(key, expires_at, value)
+        try:
+            self._ensure_schema()
+            with get_storage().transaction() as conn:
+                conn.execute(
+                    """
+                INSERT INTO cache_entries (namespace, key, value, created_at, expires_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(namespace, key) DO UPDATE SET
+                    value = excluded.value,
+                    created_at = excluded.created_at,
+                    expires_at = excluded.expires_at,
+                    last_access = excluded.last_access
+                """,
+                    (self.namespace, key, json.dumps(value), now, expires_at, now),
+                )
+            self._writes += 1
+            self._save_touches()
+            if self._writes % self.PRUNE_EVERY == 0:
+                self.prune()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"[!] Could not persist cache entry ({self.namespace}): {e}")
+
+    def prune(self):
+        """Deletes expired rows and trims the namespace to max_entries."""
+        self._save_touches()  # Trim by up-to-date access times
+        self._ensure_schema()
+        with get_storage().transaction() as conn:
+            removed = conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+                (self.namespace, time.time() - self.stale_seconds),
+            ).rowcount
+            removed += conn.execute(
+                """
+            DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                SELECT key FROM cache_entries WHERE namespace = ?
+                ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+                (self.namespace, self.namespace, self.max_entries),
+            ).rowcount
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def stats(self):
+        """Hit/miss counters for reporting."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "stale_hits": self.stale_hits,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    # --- Internals ---
+    def _save_touches(self):
+        """Writes the access times of memory hits back to the SQLite tier."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        try:
+            self._ensure_schema()
+            with get_storage().transaction() as conn:
+                conn.executemany(
+                    """
+                UPDATE cache_entries SET last_access = ?
+                WHERE namespace = ? AND key = ? AND last_access < ?
+                """,
+                    [(at, self.namespace, key, at) for key, at in touched.items()],
+                )
+        except sqlite3.Error as e:
+            print(f"[!] Could not update cache access times ({self.namespace}): {e}")
+
+    def _remember(self, key, expires_at, value):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, key, now):
+        try:
+            self._ensure_schema()
+            conn = get_storage().connection()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if not row or row["expires_at"] + self.stale_seconds <= now:
+                return None, 0
+            conn.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            conn.commit()
+            value = json.loads(row["value"])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[!] Cache lookup failed ({self.namespace}): {e}")
+            return None, 0
+        self._remember(key, row["expires_at"], value)
+        return value, row["expires_at"]
+
+    def _ensure_schema(self):
+        storage = get_storage()
+        if storage.db_path in _schema_ready:  # Per database: DB_PATH can change
+            return
+        with _schema_lock, storage.transaction() as conn:
+            conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries (namespace, last_access);"
+            )
+            _schema_ready.add(storage.db_path)
@@ -2,18 +2,75 @@
 import sqlite3
 import os
 import datetime
+import json
+import re
+import threading
+from contextlib import contextmanager
 from src.utils.config import ROOT_DIR  # Import root directory to locate the data folder
+from src.storage.models import ParsedMessage, StoredEmail
+from src.utils.metrics import timed
 
 DB_DIR = os.path.join(ROOT_DIR, "data")
 DB_PATH = os.path.join(DB_DIR, "assistant.db")
 
-# Ensure the data directory exists
-os.makedirs(DB_DIR, exist_ok=True)
+# Connection tuning applied to every engine connection.
+# WAL lets readers run alongside a writer, and synchronous=NORMAL is safe with WAL
+# (a power cut can lose the last transactions, never corrupt the file).
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",  # 16 MB page cache
+    "PRAGMA busy_timeout=5000",
+)
+# Stay below SQLite's default limit on bound parameters per statement
+MAX_SQL_VARIABLES = 500
+
+EMAIL_COLUMNS = (
+    "message_id",
+    "thread_id",
+    "sender",
+    "recipient",
+    "subject",
+    "body_plain",
+    "body_html",
+    "received_at",
+)
+# Columns the processing pipeline reads up front; bodies are loaded on demand
+UNPROCESSED_EMAIL_COLUMNS = (
+    "id, message_id, thread_id, sender, recipient, subject, received_at"
+)
+# Keyset ordering for the unprocessed backlog (NULL dates sort first)
+UNPROCESSED_ORDER_KEY = "COALESCE(received_at, '')"
+# Full-text search: bm25 column weights for (subject, sender, body_plain)
+FTS_WEIGHTS = (5.0, 2.0, 1.0)
+_FTS_TERM_RE = re.compile(r"\w+")
+FTS_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or "
+    "the to was we what when where which who why will with you your".split()
+)
+REQUIRED_EMAIL_FIELDS = [
+    "message_id",
+    "thread_id",
+    "sender",
+    "recipient",
+    "subject",
+    "body_plain",
+    "received_at",
+]
+
+
+def _ensure_db_dir(db_path):
+    """Creates the database's folder (data/ by default) when first connecting."""
+    folder = os.path.dirname(db_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
 
 
 def get_db_connection():
     """Establishes a connection to the SQLite database."""
     try:
+        _ensure_db_dir(DB_PATH)
         conn = sqlite3.connect(DB_PATH)
         # Return rows as dictionary-like objects
         conn.row_factory = sqlite3.Row
@@ -24,130 +81,597 @@ def get_db_connection():
         return None
 
 
-def initialize_database():
-    """Creates the necessary tables if they don't exist."""
-    conn = get_db_connection()
-    if not conn:
-        return
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
 
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
+
+def _has_required_fields(email_data):
+    # ParsedMessage always carries every column
+    return isinstance(email_data, ParsedMessage) or all(
+        field in email_data for field in REQUIRED_EMAIL_FIELDS
+    )
+
+
+def fts_match_expression(text, match_all=True, max_terms=8):
+    """
+    Turns free text into a safe FTS5 MATCH expression: word terms without
+    stopwords, each quoted (so FTS syntax in emails is inert), joined by AND
+    (implicit) or OR. Returns None when no searchable terms remain.
+    """
+    terms = []
+    for term in _FTS_TERM_RE.findall((text or "").casefold()):
+        if term not in FTS_STOPWORDS and term not in terms:
+            terms.append(term)
+    if not terms:
+        return None
+    return (" " if match_all else " OR ").join(f'"{t}"' for t in terms[:max_terms])
+
+
+def _email_row(email_data):
+    if isinstance(email_data, ParsedMessage):
+        return tuple(getattr(email_data, column) for column in EMAIL_COLUMNS)
+    return (
+        email_data["message_id"],
+        email_data["thread_id"],
+        email_data["sender"],
+        email_data["recipient"],
+        email_data["subject"],
+        email_data.get("body_plain", ""),  # Provide default empty string
+        email_data.get("body_html"),  # Can be None
+        email_data["received_at"],  # Should be datetime object or ISO string
+    )
+
+
+class StorageEngine:
+    """
+    Long-lived access to the assistant database.
+    Each thread gets its own connection (opened on first use, tuned with
+    SQLITE_PRAGMAS) which is then reused for every call from that thread.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DB_PATH
+        self._dir_ready = False
+        self._local = threading.local()
+        self._connections = {}  # Owning thread -> connection
+        self._lock = threading.Lock()
+
+    # --- Connections ---
+    def connection(self):
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Connections are only used by the thread that opened them;
+            # check_same_thread=False just lets close() run from any thread.
+            if not self._dir_ready:
+                _ensure_db_dir(self.db_path)
+                self._dir_ready = True
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._lock:
+                self._close_dead_thread_connections()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def _close_dead_thread_connections(self):
+        # Short-lived worker threads (pipeline runs) would otherwise leak connections
+        for thread, conn in list(self._connections.items()):
+            if not thread.is_alive():
+                conn.close()
+                del self._connections[thread]
+
+    @contextmanager
+    def transaction(self):
+        """Yields this thread's connection and commits, or rolls back on error."""
+        conn = self.connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def close(self):
+        """Closes every connection opened by this engine."""
+        with self._lock:
+            for conn in self._connections.values():
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = {}
+        self._local = threading.local()
+
+    # --- Schema ---
+    @timed("db.initialize")
+    def initialize(self):
+        """Creates the necessary tables if they don't exist."""
+        with self.transaction() as conn:
+            conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS emails (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id TEXT UNIQUE NOT NULL,
+                thread_id TEXT NOT NULL,
+                sender TEXT,
+                recipient TEXT,
+                subject TEXT,
+                body_plain TEXT,
+                body_html TEXT,
+                received_at TIMESTAMP,
+                stored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                processed BOOLEAN DEFAULT FALSE,
+                intent TEXT
+            );
+            """
+            )
+            # Databases created before the intent column existed
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(emails)")}
+            if "intent" not in columns:
+                conn.execute("ALTER TABLE emails ADD COLUMN intent TEXT;")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_message_id ON emails (message_id);"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_thread_id ON emails (thread_id);"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_processed ON emails (processed);"
+            )
+            # Partial index matching iter_unprocessed_emails' keyset ordering
+            conn.execute(
+                f"""
+            CREATE INDEX IF NOT EXISTS idx_unprocessed_order
+            ON emails ({UNPROCESSED_ORDER_KEY}, id) WHERE processed = FALSE;
+            """
+            )
+            self._initialize_fts(conn)
+            # Actions waiting for a person's decision (see src/services/approvals.py)
+            conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS approvals (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id TEXT NOT NULL,
+                action TEXT NOT NULL,
+                summary TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                result TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                decided_at TIMESTAMP,
+                applied_at TIMESTAMP,
+                UNIQUE (message_id, action)
+            );
+            """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_approvals_status ON approvals (status, id);"
+            )
+            # Small key/value table for sync checkpoints (page tokens, high-water marks)
+            conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
             """
-        CREATE TABLE IF NOT EXISTS emails (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            message_id TEXT UNIQUE NOT NULL,
-            thread_id TEXT NOT NULL,
-            sender TEXT,
-            recipient TEXT,
-            subject TEXT,
-            body_plain TEXT,
-            body_html TEXT,
-            received_at TIMESTAMP,
-            stored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            processed BOOLEAN DEFAULT FALSE
-        );
+            )
+
+    def _initialize_fts(self, conn):
+        """
+        emails_fts indexes subject, sender and body_plain of `emails` (external
+        content, so text is not stored twice). Triggers keep it in sync; updates
+        that only touch other columns (processed, intent) skip the index.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'emails_fts'"
+        ).fetchone()
+        try:
+            conn.execute(
+                """
+            CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+                subject, sender, body_plain,
+                content='emails', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            """
+            )
+        except sqlite3.OperationalError as e:
+            print(f"[!] SQLite FTS5 unavailable, mailbox search disabled: {e}")
+            return
+        conn.execute(
+            """
+        CREATE TRIGGER IF NOT EXISTS emails_fts_insert AFTER INSERT ON emails BEGIN
+            INSERT INTO emails_fts (rowid, subject, sender, body_plain)
+            VALUES (new.id, new.subject, new.sender, new.body_plain);
+        END;
         """
         )
-        # Optional: Add indexes for faster lookups later
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_message_id ON emails (message_id);"
+        conn.execute(
+            """
+        CREATE TRIGGER IF NOT EXISTS emails_fts_delete AFTER DELETE ON emails BEGIN
+            INSERT INTO emails_fts (emails_fts, rowid, subject, sender, body_plain)
+            VALUES ('delete', old.id, old.subject, old.sender, old.body_plain);
+        END;
+        """
         )
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_thread_id ON emails (thread_id);"
+        conn.execute(
+            """
+        CREATE TRIGGER IF NOT EXISTS emails_fts_update
+        AFTER UPDATE OF subject, sender, body_plain ON emails BEGIN
+            INSERT INTO emails_fts (emails_fts, rowid, subject, sender, body_plain)
+            VALUES ('delete', old.id, old.subject, old.sender, old.body_plain);
+            INSERT INTO emails_fts (rowid, subject, sender, body_plain)
+            VALUES (new.id, new.subject, new.sender, new.body_plain);
+        END;
+        """
         )
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_processed ON emails (processed);"
+        if not exists:
+            # Index mail stored before the FTS table existed
+            conn.execute("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild');")
+
+    # --- Emails ---
+    @timed("db.message_exists")
+    def message_exists(self, message_id):
+        row = (
+            self.connection()
+            .execute("SELECT 1 FROM emails WHERE message_id = ?", (message_id,))
+            .fetchone()
         )
+        return row is not None
 
-        conn.commit()
+    @timed("db.existing_message_ids")
+    def existing_message_ids(self, message_ids):
+        """Returns the subset of message_ids already stored, using IN queries."""
+        message_ids = list(message_ids)
+        found = set()
+        conn = self.connection()
+        for chunk in _chunks(message_ids, MAX_SQL_VARIABLES):
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT message_id FROM emails WHERE message_id IN ({placeholders})",
+                chunk,
+            )
+            found.update(row["message_id"] for row in rows)
+        return found
+
+    @timed("db.store_emails")
+    def store_emails(self, emails):
+        """
+        Inserts many parsed emails in a single transaction with executemany.
+        Duplicates (same message_id) are ignored. Returns the number inserted.
+        """
+        rows = []
+        for email_data in emails:
+            if not _has_required_fields(email_data):
+                print(
+                    f"[!] Skipping email storage: Missing required fields in email_data for message {email_data.get('message_id')}"
+                )
+                continue
+            rows.append(_email_row(email_data))
+        if not rows:
+            return 0
+
+        sql = f"""
+        INSERT OR IGNORE INTO emails ({", ".join(EMAIL_COLUMNS)}, processed)
+        VALUES ({", ".join("?" * len(EMAIL_COLUMNS))}, FALSE)
+        """
+        with self.transaction() as conn:
+            # rowcount sums the rows executemany inserted; unlike total_changes
+            # it leaves out the emails_fts trigger writes
+            return conn.executemany(sql, rows).rowcount
+
+    @timed("db.get_unprocessed_emails")
+    def get_unprocessed_emails(self):
+        rows = self.connection().execute(
+            "SELECT * FROM emails WHERE processed = FALSE ORDER BY received_at ASC"
+        )
+        return [dict(row) for row in rows]
+
+    @timed("db.count_unprocessed_emails")
+    def count_unprocessed_emails(self):
+        row = (
+            self.connection()
+            .execute("SELECT COUNT(*) AS n FROM emails WHERE processed = FALSE")
+            .fetchone()
+        )
+        return row["n"]
+
+    def iter_unprocessed_emails(self, page_size=200):
+        """
+        Yields StoredEmail records for unprocessed emails ordered by
+        (received_at, id), reading one page of header columns at a time.
+        Keyset pagination keeps each page query cheap and lets callers mark
+        emails processed while the iteration is still running.
+        """
+        sql = f"""
+        SELECT {UNPROCESSED_EMAIL_COLUMNS}, {UNPROCESSED_ORDER_KEY} AS order_key
+        FROM emails INDEXED BY idx_unprocessed_order
+        WHERE processed = FALSE
+          AND {UNPROCESSED_ORDER_KEY} >= ?  -- lets SQLite seek into the index
+          AND ({UNPROCESSED_ORDER_KEY}, id) > (?, ?)
+        ORDER BY {UNPROCESSED_ORDER_KEY}, id
+        LIMIT ?
+        """
+        last_key, last_id = "", -1
+        while True:
+            with timed("db.unprocessed_page"):
+                rows = self.connection().execute(
+                    sql, (last_key, last_key, last_id, page_size)
+                )
+                rows = rows.fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield StoredEmail(row, self.load_email_body)
+            last_key, last_id = rows[-1]["order_key"], rows[-1]["id"]
+
+    @timed("db.load_email_body")
+    def load_email_body(self, email_id):
+        """Returns the plain-text body of the email with the given row id."""
+        row = (
+            self.connection()
+            .execute("SELECT body_plain FROM emails WHERE id = ?", (email_id,))
+            .fetchone()
+        )
+        return row["body_plain"] if row else None
+
+    @timed("db.mark_processed")
+    def mark_processed(self, message_ids, intent=None):
+        """
+        Marks every id in message_ids as processed. Returns the number updated.
+        If intent is given it is stored as the emails' label (see labeled_emails).
+        """
+        message_ids = list(message_ids)
+        updated = 0
+        with self.transaction() as conn:
+            for chunk in _chunks(message_ids, MAX_SQL_VARIABLES - 1):
+                placeholders = ",".join("?" * len(chunk))
+                cursor = conn.execute(
+                    f"UPDATE emails SET processed = TRUE, intent = COALESCE(?, intent) "
+                    f"WHERE message_id IN ({placeholders})",
+                    [intent, *chunk],
+                )
+                updated += cursor.rowcount
+        return updated
+
+    @timed("db.labeled_emails")
+    def labeled_emails(self, limit=5000):
+        """Most recent processed emails with a recorded intent, for training."""
+        return (
+            self.connection()
+            .execute(
+                """
+            SELECT subject, body_plain, intent FROM emails
+            WHERE processed = TRUE AND intent IS NOT NULL
+            ORDER BY id DESC LIMIT ?
+            """,
+                (limit,),
+            )
+            .fetchall()
+        )
+
+    @timed("db.search_emails")
+    def search_emails(
+        self,
+        query,
+        limit=10,
+        match_all=True,
+        exclude_message_id=None,
+        exclude_thread_id=None,
+    ):
+        """
+        Ranked (bm25) full-text search over subject, sender and body. Returns
+        rows with id, message_id, thread_id, sender, subject, received_at,
+        intent, a highlighted body `snippet` and `score` (lower is better).
+        exclude_* leave out one message and/or every message of one thread.
+        """
+        match = fts_match_expression(query, match_all)
+        if match is None:
+            return []
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        return (
+            self.connection()
+            .execute(
+                f"""
+            SELECT e.id, e.message_id, e.thread_id, e.sender, e.subject,
+                   e.received_at, e.intent,
+                   snippet(emails_fts, 2, '[', ']', '...', 16) AS snippet,
+                   bm25(emails_fts, {weights}) AS score
+            FROM emails_fts JOIN emails e ON e.id = emails_fts.rowid
+            WHERE emails_fts MATCH ? AND e.message_id IS NOT ?
+              AND (? IS NULL OR e.thread_id IS NOT ?)
+            ORDER BY score LIMIT ?
+            """,
+                (
+                    match,
+                    exclude_message_id,
+                    exclude_thread_id,
+                    exclude_thread_id,
+                    limit,
+                ),
+            )
+            .fetchall()
+        )
+
+    # --- Approvals ---
+    @timed("db.add_approval")
+    def add_approval(self, message_id, action, summary, payload):
+        """
+        Queues an action for approval. Re-processing an email does not add a
+        second request for the same action. Returns the approval id.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                """
+            INSERT OR IGNORE INTO approvals (message_id, action, summary, payload)
+            VALUES (?, ?, ?, ?)
+            """,
+                (message_id, action, summary, json.dumps(payload)),
+            )
+            row = conn.execute(
+                "SELECT id FROM approvals WHERE message_id = ? AND action = ?",
+                (message_id, action),
+            ).fetchone()
+        return row["id"]
+
+    @timed("db.list_approvals")
+    def list_approvals(self, statuses=None, ids=None):
+        """Approval rows (payload decoded) filtered by status and/or id, oldest first."""
+        clauses, params = [], []
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if ids:
+            clauses.append(f"id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = (
+            self.connection()
+            .execute(f"SELECT * FROM approvals {where} ORDER BY id", params)
+            .fetchall()
+        )
+        return [dict(row, payload=json.loads(row["payload"])) for row in rows]
+
+    @timed("db.decide_approvals")
+    def decide_approvals(self, ids, approved, statuses=("pending",)):
+        """Marks approvals approved or rejected in bulk. Returns how many changed."""
+        status = "approved" if approved else "rejected"
+        updated = 0
+        with self.transaction() as conn:
+            for chunk in _chunks(list(ids), MAX_SQL_VARIABLES):
+                updated += conn.execute(
+                    f"""
+                UPDATE approvals SET status = ?, decided_at = CURRENT_TIMESTAMP
+                WHERE id IN ({', '.join('?' * len(chunk))})
+                AND status IN ({', '.join('?' * len(statuses))})
+                """,
+                    [status, *chunk, *statuses],
+                ).rowcount
+        return updated
+
+    @timed("db.record_approval_results")
+    def record_approval_results(self, results):
+        """Stores (id, status, result text) outcomes of applied approvals."""
+        with self.transaction() as conn:
+            conn.executemany(
+                """
+            UPDATE approvals SET status = ?, result = ?, applied_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            """,
+                [
+                    (status, result, approval_id)
+                    for approval_id, status, result in results
+                ],
+            )
+
+    # --- Sync checkpoints ---
+    @timed("db.get_sync_state")
+    def get_sync_state(self, key, default=None):
+        row = (
+            self.connection()
+            .execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return row["value"] if row else default
+
+    @timed("db.set_sync_state")
+    def set_sync_state(self, key, value):
+        with self.transaction() as conn:
+            if value is None:
+                conn.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+            else:
+                conn.execute(
+                    """
+                INSERT INTO sync_state (key, value, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value,
+                                               updated_at = excluded.updated_at
+                """,
+                    (key, str(value)),
+                )
+
+
+# --- Shared engine used by the module-level helpers below ---
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_storage():
+    """Returns the process-wide StorageEngine for DB_PATH."""
+    global _engine
+    with _engine_lock:
+        if _engine is None or _engine.db_path != DB_PATH:
+            if _engine is not None:
+                _engine.close()
+            _engine = StorageEngine(DB_PATH)
+        return _engine
+
+
+def initialize_database():
+    """Creates the necessary tables if they don't exist."""
+    try:
+        get_storage().initialize()
         print("[*] Database initialized successfully (tables created if needed).")
     except sqlite3.Error as e:
         print(f"[!] Database initialization error: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 
 def message_exists(message_id):
     """Checks if an email with the given message_id already exists in the database."""
-    conn = get_db_connection()
-    if not conn:
-        return False  # Assume it doesn't exist if DB connection fails
-
-    exists = False
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM emails WHERE message_id = ?", (message_id,))
-        result = cursor.fetchone()
-        if result:
-            exists = True
+        return get_storage().message_exists(message_id)
     except sqlite3.Error as e:
         print(f"[!] Error checking message existence for {message_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
-    return exists
+        return False  # Assume it doesn't exist if the lookup fails
+
+
+def existing_message_ids(message_ids):
+    """Returns the set of the given message ids that are already stored."""
+    try:
+        return get_storage().existing_message_ids(message_ids)
+    except sqlite3.Error as e:
+        print(f"[!] Error checking stored message ids: {e}")
+        return set()
 
 
 def store_email(email_data):
     """Stores the parsed email data into the database."""
     # Ensure required fields are present
-    required_fields = [
-        "message_id",
-        "thread_id",
-        "sender",
-        "recipient",
-        "subject",
-        "body_plain",
-        "received_at",
-    ]
-    if not all(field in email_data for field in required_fields):
+    if not _has_required_fields(email_data):
         print(
             f"[!] Skipping email storage: Missing required fields in email_data for message {email_data.get('message_id')}"
         )
         return False
 
-    conn = get_db_connection()
-    if not conn:
-        return False
-
-    sql = """
-    INSERT INTO emails (message_id, thread_id, sender, recipient, subject, body_plain, body_html, received_at, processed)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            sql,
-            (
-                email_data["message_id"],
-                email_data["thread_id"],
-                email_data["sender"],
-                email_data["recipient"],
-                email_data["subject"],
-                email_data.get("body_plain", ""),  # Provide default empty string
-                email_data.get("body_html"),  # Can be None
-                email_data["received_at"],  # Should be datetime object or ISO string
-                False,  # Default processed to False
-            ),
-        )
-        conn.commit()
-        print(f"[*] Stored email with Message-ID: {email_data['message_id']}")
-        return True
-    except sqlite3.IntegrityError:
-        # This likely means the message_id already exists (UNIQUE constraint)
+        if get_storage().store_emails([email_data]):
+            print(f"[*] Stored email with Message-ID: {email_data['message_id']}")
+            return True
+        # The message_id already exists (UNIQUE constraint)
         print(
             f"[*] Email with Message-ID {email_data['message_id']} already exists. Skipping."
         )
         return False  # Indicate not stored (because it was a duplicate)
     except sqlite3.Error as e:
         print(f"[!] Error storing email {email_data['message_id']}: {e}")
-        conn.rollback()  # Rollback changes on error
         return False
-    finally:
-        if conn:
-            conn.close()
+
+
+def store_emails(emails):
+    """Stores many parsed emails in one transaction. Returns how many were new."""
+    try:
+        stored = get_storage().store_emails(emails)
+        print(f"[*] Stored {stored} new emails.")
+        return stored
+    except sqlite3.Error as e:
+        print(f"[!] Error storing emails: {e}")
+        return 0
 
 
 # --- Functions for Day 3+ (can be added now or later) ---
@@ -155,52 +679,341 @@ def store_email(email_data):
 
 def get_unprocessed_emails():
     """Retrieves all emails marked as unprocessed."""
-    conn = get_db_connection()
-    if not conn:
-        return []
-
     emails = []
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM emails WHERE processed = FALSE ORDER BY received_at ASC"
-        )
-        rows = cursor.fetchall()
-        # Convert rows to dictionaries for easier handling
-        emails = [dict(row) for row in rows]
+        emails = get_storage().get_unprocessed_emails()
     except sqlite3.Error as e:
         print(f"[!] Error fetching unprocessed emails: {e}")
-    finally:
-        if conn:
-            conn.close()
     print(f"[*] Found {len(emails)} unprocessed emails in DB.")
     return emails
 
 
-def mark_email_processed(message_id):
-    """Marks a specific email as processed in the database."""
-    conn = get_db_connection()
-    if not conn:
-        return False
+def count_unprocessed_emails():
+    """Returns how many emails are waiting to be processed."""
+    try:
+        return get_storage().count_unprocessed_emails()
+    except sqlite3.Error as e:
+        print(f"[!] Error counting unprocessed emails: {e}")
+        return 0
+
 
-    sql = "UPDATE emails SET processed = TRUE WHERE message_id = ?"
+def iter_unprocessed_emails(page_size=200):
+    """
+    Streams unprocessed emails as StoredEmail records (bodies load lazily),
+    oldest first, without holding the whole backlog in memory.
+    """
     try:
-        cursor = conn.cursor()
-        cursor.execute(sql, (message_id,))
-        conn.commit()
-        # Check if any row was actually updated
-        if cursor.rowcount > 0:
+        yield from get_storage().iter_unprocessed_emails(page_size=page_size)
+    except sqlite3.Error as e:
+        print(f"[!] Error reading unprocessed emails: {e}")
+
+
+def mark_email_processed(message_id, intent=None):
+    """Marks a specific email as processed, optionally recording its intent label."""
+    try:
+        if get_storage().mark_processed([message_id], intent=intent):
             print(f"[*] Marked email {message_id} as processed.")
             return True
-        else:
-            print(
-                f"[*] Could not mark email {message_id} as processed (not found or already processed?)."
-            )
-            return False
+        print(
+            f"[*] Could not mark email {message_id} as processed (not found or already processed?)."
+        )
+        return False
     except sqlite3.Error as e:
         print(f"[!] Error marking email {message_id} as processed: {e}")
-        conn.rollback()
         return False
-    finally:
-        if conn:
-            conn.close()
+
+
+def mark_processed(message_ids):
+    """Marks many emails as processed in one transaction. Returns the number updated."""
+    try:
+        return get_storage().mark_processed(message_ids)
+    except sqlite3.Error as e:
+        print(f"[!] Error marking emails as processed: {e}")
+        return 0
+
+
+def get_labeled_emails(limit=5000):
+    """Returns (subject, body_plain, intent) rows of labeled processed emails."""
+    try:
+        return get_storage().labeled_emails(limit)
+    except sqlite3.Error as e:
+        print(f"[!] Error reading labeled emails: {e}")
+        return []
+
+
+def search_mailbox(
+    query, limit=10, match_all=True, exclude_message_id=None, exclude_thread_id=None
+):
+    """
+    Full-text search of stored mail (see StorageEngine.search_emails).
+    Returns a list of rows, empty on errors or when nothing matches.
+    """
+    try:
+        return get_storage().search_emails(
+            query,
+            limit,
+            match_all=match_all,
+            exclude_message_id=exclude_message_id,
+            exclude_thread_id=exclude_thread_id,
+        )
+    except sqlite3.Error as e:
+        print(f"[!] Error searching the mailbox: {e}")
+        return []
+
+
+# --- Approvals ---
+
+
+def queue_approval(message_id, action, summary, payload):
+    """Stores an action for later approval. Returns its id, or None on error."""
+    try:
+        return get_storage().add_approval(message_id, action, summary, payload)
+    except (sqlite3.Error, TypeError, ValueError) as e:
+        print(f"[!] Error queueing approval for {message_id}: {e}")
+        return None
+
+
+def get_approvals(statuses=None, ids=None):
+    """Returns approval rows as dicts (see StorageEngine.list_approvals)."""
+    try:
+        return get_storage().list_approvals(statuses, ids)
+    except sqlite3.Error as e:
+        print(f"[!] Error reading approvals: {e}")
+        return []
+
+
+def decide_approvals(ids, approved, statuses=("pending",)):
+    """Approves or rejects the given approval ids. Returns how many changed."""
+    try:
+        return get_storage().decide_approvals(ids, approved, statuses)
+    except sqlite3.Error as e:
+        print(f"[!] Error updating approvals: {e}")
+        return 0
+
+
+def record_approval_results(results):
+    """Stores (id, status, result) outcomes. Returns True on success."""
+    try:
+        get_storage().record_approval_results(results)
+        return True
+    except sqlite3.Error as e:
+        print(f"[!] Error saving approval results: {e}")
+        return False
+
+
+# --- Sync checkpoints ---
+
+
+def get_sync_state(key, default=None):
+    """Returns the stored checkpoint value for key, or default if it is not set."""
+    try:
+        return get_storage().get_sync_state(key, default)
+    except sqlite3.Error as e:
+        print(f"[!] Error reading sync state '{key}': {e}")
+        return default
+
+
+def set_sync_state(key, value):
+    """Stores a checkpoint value for key. Passing None removes the key."""
+    try:
+        get_storage().set_sync_state(key, value)
+        return True
+    except sqlite3.Error as e:
+        print(f"[!] Error saving sync state '{key}': {e}")
+        return False
+
+
+# The Gmail historyId the last incremental sync caught up to
+HISTORY_ID_KEY = "gmail_history_id"
+
+
+def get_last_history_id():
+    """Returns the stored Gmail historyId checkpoint, or None before the first sync."""
+    return get_sync_state(HISTORY_ID_KEY)
+
+
+def set_last_history_id(history_id):
+    """Stores the Gmail historyId that the mailbox has been synced up to."""
+    return set_sync_state(HISTORY_ID_KEY, history_id)
+
+
+# Example usage (for testing): storage benchmarks on synthetic messages.
+#   python -m src.storage.database ingest [count]
+#       "before" repeats the old per-email pattern (connect, check, insert, commit,
+#       close); "after" uses one engine connection, one IN query and executemany.
+#   python -m src.storage.database backlog [count]
+#       peak Python memory of get_unprocessed_emails() vs iter_unprocessed_emails().
+#   python -m src.storage.database search [count]
+#       emails_fts build and ranked query latency vs a LIKE scan (default 100k).
+
+
+def _synthetic_emails(count, body_size=600):
+    received = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    body = ("Lorem ipsum dolor sit amet. " * (body_size // 28 + 1))[:body_size]
+    return (
+        {
+            "message_id": f"bench-{i:08d}",
+            "thread_id": f"thread-{i // 3:08d}",
+            "sender": f"sender{i % 50}@example.com",
+            "recipient": "me@example.com",
+            "subject": f"Benchmark message {i}",
+            "body_plain": body,
+            "body_html": f"<html><body><p>{body}</p></body></html>",
+            "received_at": received + datetime.timedelta(seconds=i),
+        }
+        for i in range(count)
+    )
+
+
+def _benchmark_ingest(count):
+    import tempfile
+    import time
+
+    emails = list(_synthetic_emails(count))
+    print(f"\n--- Storage ingest benchmark ({count} messages) ---")
+
+    before_path = os.path.join(tempfile.mkdtemp(), "before.db")
+    StorageEngine(before_path).initialize()
+    start = time.perf_counter()
+    for email_data in emails:
+        conn = sqlite3.connect(before_path)
+        exists = conn.execute(
+            "SELECT 1 FROM emails WHERE message_id = ?", (email_data["message_id"],)
+        ).fetchone()
+        conn.close()
+        if exists:
+            continue
+        conn = sqlite3.connect(before_path)
+        conn.execute(
+            f"INSERT INTO emails ({', '.join(EMAIL_COLUMNS)}, processed) VALUES ({', '.join('?' * len(EMAIL_COLUMNS))}, FALSE)",
+            _email_row(email_data),
+        )
+        conn.commit()
+        conn.close()
+    before = time.perf_counter() - start
+
+    engine = StorageEngine(os.path.join(tempfile.mkdtemp(), "after.db"))
+    engine.initialize()
+    start = time.perf_counter()
+    known = engine.existing_message_ids(e["message_id"] for e in emails)
+    stored = engine.store_emails(e for e in emails if e["message_id"] not in known)
+    after = time.perf_counter() - start
+    engine.close()
+
+    print(f"Per-email connections: {before:.2f}s ({count / before:,.0f} msg/s)")
+    print(f"StorageEngine bulk:    {after:.2f}s ({count / after:,.0f} msg/s)")
+    print(f"Stored {stored} messages, speed-up x{before / after:.1f}")
+    print("---------------------------------------------------")
+
+
+def _benchmark_backlog(count):
+    import tempfile
+    import tracemalloc
+
+    engine = StorageEngine(os.path.join(tempfile.mkdtemp(), "backlog.db"))
+    engine.initialize()
+    engine.store_emails(_synthetic_emails(count, body_size=4000))
+    print(f"\n--- Unprocessed backlog memory ({count} messages) ---")
+
+    tracemalloc.start()
+    emails = engine.get_unprocessed_emails()
+    total = sum(len(e["body_plain"] or "") for e in emails)
+    _, fetchall_peak = tracemalloc.get_traced_memory()
+    del emails
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    streamed = 0
+    for email in engine.iter_unprocessed_emails():
+        streamed += len(email.body_plain or "")
+    _, stream_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    engine.close()
+
+    assert total == streamed
+    print(f"fetchall + dicts:       peak {fetchall_peak / 1e6:8.1f} MB")
+    print(f"keyset iterator (lazy): peak {stream_peak / 1e6:8.1f} MB")
+    print("---------------------------------------------------")
+
+
+def _benchmark_search(count):
+    import random
+    import tempfile
+    import time
+
+    rng = random.Random(5)
+    vocabulary = [f"w{i}" for i in range(5000)] + [
+        "invoice", "deadline", "roadmap", "offsite", "budget", "migration",
+        "contract", "launch", "hiring", "security", "review", "quarterly",
+    ]  # fmt: skip
+    received = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    emails = [
+        {
+            "message_id": f"search-{i:08d}",
+            "thread_id": f"thread-{i // 3:08d}",
+            "sender": f"sender{i % 500}@example.com",
+            "recipient": "me@example.com",
+            "subject": " ".join(rng.choices(vocabulary, k=5)),
+            "body_plain": " ".join(rng.choices(vocabulary, k=120)),
+            "body_html": None,
+            "received_at": received + datetime.timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+    print(f"\n--- Mailbox full-text search ({count} messages) ---")
+    engine = StorageEngine(os.path.join(tempfile.mkdtemp(), "search.db"))
+    engine.initialize()
+    start = time.perf_counter()
+    engine.store_emails(emails)  # Indexed by the insert trigger
+    ingest = time.perf_counter() - start
+    start = time.perf_counter()
+    with engine.transaction() as conn:
+        conn.execute("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild');")
+    rebuild = time.perf_counter() - start
+    print(f"Store with index triggers: {ingest:.2f}s ({count / ingest:,.0f} msg/s)")
+    print(f"Full index rebuild:        {rebuild:.2f}s")
+
+    queries = ["quarterly budget review", "deadline", "security migration", "w17 w42"]
+    queries += [f"sender{n}@example.com invoice" for n in range(0, 500, 50)]
+    conn = engine.connection()
+    for label, run in (
+        ("LIKE scan", None),
+        ("FTS5 + bm25", engine.search_emails),
+    ):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            if run is None:
+                clauses = " AND ".join(
+                    "(subject LIKE ? OR sender LIKE ? OR body_plain LIKE ?)"
+                    for _ in query.split()
+                )
+                params = [f"%{w}%" for w in query.split() for _ in range(3)]
+                conn.execute(
+                    f"SELECT id FROM emails WHERE {clauses} LIMIT 10", params
+                ).fetchall()
+            else:
+                run(query, limit=10)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{label:12s} p50 {p50 * 1000:7.2f} ms, p95 {p95 * 1000:7.2f} ms")
+    top = engine.search_emails("quarterly budget review", limit=1)
+    if top:
+        print(f"Top hit: {top[0]['subject']!r} ({top[0]['snippet'][:60]}...)")
+    engine.close()
+    print("---------------------------------------------------")
+
+
+if __name__ == "__main__":
+    import sys
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else "ingest"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    if mode == "backlog":
+        _benchmark_backlog(count)
+    elif mode == "search":
+        _benchmark_search(int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
+    else:
+        _benchmark_ingest(count)
@@ -0,0 +1,110 @@
+# src/storage/models.py
+
+
+class ParsedMessage:
+    """
+    A Gmail message parsed for storage.
+    `headers` maps lower-cased header names to their first value, built in one
+    pass over the header list (see parsing.index_headers). Mapping-style access
+    (msg["subject"], msg.get(...), "subject" in msg) keeps code written for the
+    older email dicts working.
+    """
+
+    __slots__ = (
+        "message_id",
+        "thread_id",
+        "sender",
+        "recipient",
+        "subject",
+        "body_plain",
+        "body_html",
+        "received_at",
+        "headers",
+    )
+
+    def __init__(
+        self,
+        message_id,
+        thread_id,
+        sender=None,
+        recipient=None,
+        subject=None,
+        body_plain=None,
+        body_html=None,
+        received_at=None,
+        headers=None,
+    ):
+        self.message_id = message_id
+        self.thread_id = thread_id
+        self.sender = sender
+        self.recipient = recipient
+        self.subject = subject
+        self.body_plain = body_plain
+        self.body_html = body_html
+        self.received_at = received_at
+        self.headers = headers or {}
+
+    def header(self, name, default=None):
+        """Case-insensitive header lookup."""
+        return self.headers.get(name.lower(), default)
+
+    def __getitem__(self, key):
+        if key == "headers" or key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key != "headers" and key in self.__slots__
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return (
+            f"ParsedMessage(message_id={self.message_id!r}, subject={self.subject!r})"
+        )
+
+
+class StoredEmail:
+    """
+    Lightweight view of an unprocessed email row.
+    Only the header columns are read up front; the body is loaded from the
+    database the first time `body_plain` is accessed.
+    """
+
+    __slots__ = (
+        "id",
+        "message_id",
+        "thread_id",
+        "sender",
+        "recipient",
+        "subject",
+        "received_at",
+        "_body_plain",
+        "_body_loader",
+    )
+
+    _NOT_LOADED = object()
+
+    def __init__(self, row, body_loader):
+        self.id = row["id"]
+        self.message_id = row["message_id"]
+        self.thread_id = row["thread_id"]
+        self.sender = row["sender"]
+        self.recipient = row["recipient"]
+        self.subject = row["subject"]
+        self.received_at = row["received_at"]
+        self._body_plain = StoredEmail._NOT_LOADED
+        self._body_loader = body_loader  # Callable: row id -> body text
+
+    @property
+    def body_plain(self):
+        if self._body_plain is StoredEmail._NOT_LOADED:
+            self._body_plain = self._body_loader(self.id)
+        return self._body_plain
+
+    def __repr__(self):
+        return f"StoredEmail(message_id={self.message_id!r}, subject={self.subject!r})"
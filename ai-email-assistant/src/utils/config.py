@@ -1,12 +1,16 @@
 # src/utils/config.py
 import os
 
+from dotenv import load_dotenv
+
+# The one place .env is read; every setting below can come from it
+load_dotenv()
+
 # ... (paths remain the same) ...
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 CREDENTIALS_DIR = os.path.join(ROOT_DIR, "credentials")
 CREDENTIALS_FILE = os.path.join(CREDENTIALS_DIR, "credentials.json")
 TOKEN_FILE = os.path.join(CREDENTIALS_DIR, "token.json")
-os.makedirs(CREDENTIALS_DIR, exist_ok=True)
 
 # --- MODIFIED SCOPES ---
 # Add the calendar scope (read/write for creating events)
@@ -18,6 +22,154 @@ SCOPES = [
 ]
 # --- END MODIFIED SCOPES ---
 
-print(f"[*] Using Credentials file: {CREDENTIALS_FILE}")
-print(f"[*] Using Token file: {TOKEN_FILE}")
-print(f"[*] Requesting Scopes: {SCOPES}")  # Print scopes for verification
+
+def _env_int(name, default):
+    """Reads an integer setting from the environment, falling back to default."""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"[!] Invalid integer for {name}: '{value}'. Using default {default}.")
+        return default
+
+
+def _env_float(name, default):
+    """Reads a float setting from the environment, falling back to default."""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"[!] Invalid number for {name}: '{value}'. Using default {default}.")
+        return default
+
+
+# --- Google API Auth ---
+# Access tokens are refreshed this long before they expire
+GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS = _env_int(
+    "GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS", 300
+)
+
+# --- Processing Pipeline ---
+# Worker threads per stage and the size of the queues between stages.
+# Full queues block the stage before them, which is what throttles the run.
+PIPELINE_ANALYZE_WORKERS = _env_int("PIPELINE_ANALYZE_WORKERS", 4)
+PIPELINE_ACT_WORKERS = _env_int("PIPELINE_ACT_WORKERS", 4)
+PIPELINE_DRAFT_WORKERS = _env_int("PIPELINE_DRAFT_WORKERS", 4)
+PIPELINE_MARK_WORKERS = _env_int("PIPELINE_MARK_WORKERS", 1)
+PIPELINE_QUEUE_SIZE = _env_int("PIPELINE_QUEUE_SIZE", 16)
+
+# --- Gmail Ingestion ---
+# Messages listed per page; each page's bodies are then fetched in one batch.
+GMAIL_PAGE_SIZE = _env_int("GMAIL_PAGE_SIZE", 100)
+# "incremental" follows the Gmail history API after the first full walk;
+# "full" lists the unread inbox on every run.
+GMAIL_SYNC_MODE = os.getenv("GMAIL_SYNC_MODE", "incremental").strip().lower()
+# Fetch headers + snippet first and skip bodies of mail the keyword rules classify
+GMAIL_METADATA_PREFILTER = _env_int("GMAIL_METADATA_PREFILTER", 1) == 1
+
+# --- LLM Response Cache ---
+# Identical prompts (retries, re-runs, look-alike newsletters) are answered from
+# the cache instead of calling the Hugging Face API again. Set to 0 to disable.
+LLM_CACHE_ENABLED = _env_int("LLM_CACHE_ENABLED", 1) == 1
+LLM_CACHE_TTL_SECONDS = _env_int("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+LLM_CACHE_MAX_ENTRIES = _env_int("LLM_CACHE_MAX_ENTRIES", 10000)
+LLM_CACHE_MEMORY_ENTRIES = _env_int("LLM_CACHE_MEMORY_ENTRIES", 512)
+
+# --- Web Search Cache ---
+# Searches are keyed on the normalized query (no "Re:"/"Fwd:", case or spacing).
+# Results older than the TTL are still served for WEB_SEARCH_STALE_SECONDS while
+# a background refresh runs.
+WEB_SEARCH_CACHE_TTL_SECONDS = _env_int("WEB_SEARCH_CACHE_TTL_SECONDS", 24 * 3600)
+WEB_SEARCH_STALE_SECONDS = _env_int("WEB_SEARCH_STALE_SECONDS", 7 * 24 * 3600)
+WEB_SEARCH_CACHE_MAX_ENTRIES = _env_int("WEB_SEARCH_CACHE_MAX_ENTRIES", 2000)
+# Consecutive search errors before searches pause, and for how long (seconds)
+WEB_SEARCH_BREAKER_FAILURES = _env_int("WEB_SEARCH_BREAKER_FAILURES", 3)
+WEB_SEARCH_BREAKER_RESET_SECONDS = _env_float("WEB_SEARCH_BREAKER_RESET_SECONDS", 300.0)
+# Providers queried in parallel for each search (see web_search_service)
+WEB_SEARCH_PROVIDERS = [
+    name.strip()
+    for name in os.getenv("WEB_SEARCH_PROVIDERS", "past_answers,duckduckgo").split(",")
+    if name.strip()
+]
+# "first": the first provider with results wins and the rest are cancelled;
+# "merge": results of every provider that answers before the deadline are merged
+WEB_SEARCH_STRATEGY = os.getenv("WEB_SEARCH_STRATEGY", "first").strip().lower()
+WEB_SEARCH_DEADLINE_SECONDS = _env_float("WEB_SEARCH_DEADLINE_SECONDS", 8.0)
+
+# --- Hugging Face Client ---
+HF_CONNECT_TIMEOUT = _env_float("HF_CONNECT_TIMEOUT", 5.0)  # Seconds
+HF_READ_TIMEOUT = _env_float("HF_READ_TIMEOUT", 60.0)  # Seconds
+HF_MAX_RETRIES = _env_int("HF_MAX_RETRIES", 4)
+HF_BACKOFF_BASE = _env_float("HF_BACKOFF_BASE", 1.0)  # First retry waits up to this
+HF_BACKOFF_CAP = _env_float("HF_BACKOFF_CAP", 30.0)  # Longest single wait
+HF_POOL_SIZE = _env_int("HF_POOL_SIZE", 8)  # Keep-alive connections to the API
+# Shared by every caller in the process (requests per second, and burst size)
+HF_RATE_LIMIT_PER_SECOND = _env_float("HF_RATE_LIMIT_PER_SECOND", 2.0)
+HF_RATE_LIMIT_BURST = _env_int("HF_RATE_LIMIT_BURST", 4)
+
+# --- Email Analysis ---
+# "combined": one structured JSON request for intent, summary and meeting details
+# (falls back to two-step if unparseable); "two_step": intent, then details.
+LLM_ANALYSIS_MODE = os.getenv("LLM_ANALYSIS_MODE", "combined").strip().lower()
+# Prompts packed into one Inference API request by analyze_emails(). The size
+# starts at the initial value and adapts between 1 and the max based on latency
+# and errors; a max of 1 disables batching.
+LLM_BATCH_SIZE_INITIAL = _env_int("LLM_BATCH_SIZE_INITIAL", 4)
+LLM_BATCH_SIZE_MAX = _env_int("LLM_BATCH_SIZE_MAX", 16)
+LLM_BATCH_TARGET_SECONDS = _env_float("LLM_BATCH_TARGET_SECONDS", 15.0)
+
+# --- Analysis Backend ---
+# "remote": Hugging Face API for every email; "local": offline TF-IDF classifier
+# trained on labeled history; "hybrid": local when confident, remote otherwise.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "hybrid").strip().lower()
+LOCAL_MIN_CONFIDENCE = _env_float("LOCAL_MIN_CONFIDENCE", 0.8)
+LOCAL_MIN_TRAINING_EMAILS = _env_int("LOCAL_MIN_TRAINING_EMAILS", 50)
+LOCAL_TRAINING_LIMIT = _env_int("LOCAL_TRAINING_LIMIT", 5000)
+
+# --- Email Body Parsing ---
+# Bytes of body content decoded per message; the LLM only reads ~1500 characters.
+# HTML gets a larger budget because markup takes up most of it.
+MIME_MAX_TEXT_BYTES = _env_int("MIME_MAX_TEXT_BYTES", 32 * 1024)
+MIME_MAX_HTML_BYTES = _env_int("MIME_MAX_HTML_BYTES", 256 * 1024)
+
+# --- Slack ---
+SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
+TARGET_SLACK_CHANNEL_ID = os.getenv("TARGET_SLACK_CHANNEL_ID")
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")
+# Notifications queued within this many seconds of the first one are posted
+# together as one digest message (at most SLACK_DIGEST_MAX_ITEMS emails each)
+SLACK_DIGEST_WINDOW_SECONDS = _env_float("SLACK_DIGEST_WINDOW_SECONDS", 30.0)
+SLACK_DIGEST_MAX_ITEMS = min(15, _env_int("SLACK_DIGEST_MAX_ITEMS", 10))
+SLACK_MAX_RETRIES = _env_int("SLACK_MAX_RETRIES", 4)
+
+# --- Serve Mode ---
+# `python -m src.main serve` polls Gmail every POLL_MIN_SECONDS while mail is
+# arriving; each idle poll multiplies the wait by POLL_BACKOFF, up to the max.
+POLL_MIN_SECONDS = _env_float("POLL_MIN_SECONDS", 15.0)
+POLL_MAX_SECONDS = _env_float("POLL_MAX_SECONDS", 300.0)
+POLL_BACKOFF = _env_float("POLL_BACKOFF", 2.0)
+
+# --- Calendar ---
+# Days of events read (once per run) for local conflict and free-slot checks
+CALENDAR_WINDOW_DAYS = _env_int("CALENDAR_WINDOW_DAYS", 30)
+
+# --- Metrics ---
+# Timings and counters (src/utils/metrics.py), written at the end of each run
+METRICS_ENABLED = _env_int("METRICS_ENABLED", 1) == 1
+METRICS_FORMAT = os.getenv("METRICS_FORMAT", "json").strip().lower()  # or prometheus
+METRICS_FILE = os.getenv(
+    "METRICS_FILE",
+    os.path.join(
+        ROOT_DIR,
+        "data",
+        "metrics.prom" if METRICS_FORMAT == "prometheus" else "metrics.json",
+    ),
+)
+
+# --- Keyword Rules ---
+# Compiled once and checked before the LLM; see src/utils/rules.py
+RULES_FILE = os.getenv("RULES_FILE", os.path.join(ROOT_DIR, "config", "rules.json"))
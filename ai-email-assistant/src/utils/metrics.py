@@ -0,0 +1,293 @@
+# src/utils/metrics.py
+"""
+Lightweight in-process instrumentation.
+
+    from src.utils.metrics import timed, increment
+
+    @timed("gmail.sync")            # as a decorator
+    def sync_inbox(...): ...
+
+    with timed("llm.http"):         # or around a block
+        ...
+
+Timers record each call's duration into a Summary (count, sum, max and
+p50/p95/p99 over the most recent samples) and count calls that raised under
+"<name>.errors". Components that already keep their own counters (caches,
+rules, search, calendar, Slack, the scheduler) are folded in at export time
+through register_collector(). dump_metrics() writes everything as JSON or
+Prometheus text at the end of a run.
+"""
+import functools
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from src.utils.config import METRICS_ENABLED, METRICS_FILE, METRICS_FORMAT
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Summary:
+    """Duration samples for one timer; quantiles cover the last `window` calls."""
+
+    def __init__(self, window=2048):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds):
+        # Called with the registry lock held
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self._samples.append(seconds)
+
+    def snapshot(self):
+        samples = sorted(self._samples)
+        result = {
+            "count": self.count,
+            "sum_seconds": round(self.total, 6),
+            "max_ms": round(self.max * 1000, 3),
+        }
+        for q in QUANTILES:
+            # Nearest-rank quantile
+            value = samples[max(0, math.ceil(q * len(samples)) - 1)] if samples else 0.0
+            result[f"p{int(q * 100)}_ms"] = round(value * 1000, 3)
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self, window=2048):
+        self.window = window
+        self._summaries = {}
+        self._counters = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    # --- Recording ---
+    def observe(self, name, seconds):
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                summary = self._summaries[name] = Summary(self.window)
+            summary.observe(seconds)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def register_collector(self, name, collect):
+        """collect() returns a (possibly nested) dict of numbers, read at export."""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def reset(self):
+        with self._lock:
+            self._summaries.clear()
+            self._counters.clear()
+
+    # --- Export ---
+    def snapshot(self):
+        with self._lock:
+            timers = {name: s.snapshot() for name, s in sorted(self._summaries.items())}
+            counters = dict(sorted(self._counters.items()))
+            collectors = list(self._collectors.items())
+        components = {}
+        for name, collect in collectors:
+            try:
+                components[name] = collect()
+            except Exception as e:
+                print(f"[!] Could not collect '{name}' metrics: {e}")
+        return {
+            "timestamp": time.time(),
+            "timers": timers,
+            "counters": counters,
+            "components": components,
+        }
+
+    def to_json(self, snapshot=None):
+        return json.dumps(snapshot or self.snapshot(), indent=2, default=str)
+
+    def to_prometheus(self, snapshot=None, prefix="assistant"):
+        snapshot = snapshot or self.snapshot()
+        lines = []
+        for name, timer in snapshot["timers"].items():
+            metric = _prometheus_name(prefix, name, "seconds")
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                value = timer[f"p{int(q * 100)}_ms"] / 1000
+                lines.append(f'{metric}{{quantile="{q}"}} {value:.6g}')
+            lines.append(f"{metric}_sum {timer['sum_seconds']:.6g}")
+            lines.append(f"{metric}_count {timer['count']}")
+        for name, value in snapshot["counters"].items():
+            metric = _prometheus_name(prefix, name, "total")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for component, values in snapshot["components"].items():
+            for path, value in _flatten(values):
+                metric = _prometheus_name(prefix, f"{component}.{path}")
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value:.6g}")
+        return "\n".join(lines) + "\n"
+
+
+def _prometheus_name(prefix, name, suffix=None):
+    name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{name}")
+    return f"{name}_{suffix}" if suffix else name
+
+
+def _flatten(values, path=""):
+    """Yields (dotted.path, number) for every numeric leaf of a nested dict."""
+    if isinstance(values, bool):
+        yield path, int(values)
+    elif isinstance(values, (int, float)):
+        if math.isfinite(values):
+            yield path, values
+    elif isinstance(values, dict):
+        for key, value in values.items():
+            yield from _flatten(value, f"{path}.{key}" if path else str(key))
+
+
+class timed:
+    """Times a block (`with timed(name):`) or every call (`@timed(name)`)."""
+
+    __slots__ = ("name", "_start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if METRICS_ENABLED:
+            _registry.observe(self.name, time.perf_counter() - self._start)
+            if exc_type is not None:
+                _registry.increment(f"{self.name}.errors")
+        return False
+
+    def __call__(self, func):
+        name = self.name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                if METRICS_ENABLED:
+                    _registry.increment(f"{name}.errors")
+                raise
+            finally:
+                if METRICS_ENABLED:
+                    _registry.observe(name, time.perf_counter() - start)
+
+        return wrapper
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    return _registry
+
+
+def observe(name, seconds):
+    if METRICS_ENABLED:
+        _registry.observe(name, seconds)
+
+
+def increment(name, amount=1):
+    if METRICS_ENABLED:
+        _registry.increment(name, amount)
+
+
+def register_collector(name, collect):
+    _registry.register_collector(name, collect)
+
+
+def format_timers(snapshot=None):
+    """Console table of the recorded timers, slowest total first."""
+    timers = (snapshot or _registry.snapshot())["timers"]
+    if not timers:
+        return "    (no timings recorded)"
+    rows = sorted(timers.items(), key=lambda item: item[1]["sum_seconds"], reverse=True)
+    lines = [
+        f"    {'timer':<28} {'calls':>7} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    ]
+    for name, t in rows:
+        lines.append(
+            f"    {name:<28} {t['count']:>7} {t['sum_seconds']:>9.3f} "
+            f"{t['p50_ms']:>9.2f} {t['p95_ms']:>9.2f} {t['p99_ms']:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def dump_metrics(path=None, fmt=METRICS_FORMAT):
+    """
+    Writes the current metrics to path (default METRICS_FILE) as "json" or
+    "prometheus". Returns the path written, or None.
+    """
+    path = path or METRICS_FILE
+    if not METRICS_ENABLED or not path:
+        return None
+    snapshot = _registry.snapshot()
+    text = (
+        _registry.to_prometheus(snapshot)
+        if fmt == "prometheus"
+        else _registry.to_json(snapshot)
+    )
+    try:
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    except OSError as e:
+        print(f"[!] Could not write metrics to {path}: {e}")
+        return None
+    return path
+
+
+# Example usage (for testing): per-call overhead of a timer, and both export formats
+if __name__ == "__main__":
+    calls = 200000
+
+    def noop():
+        return None
+
+    timed_noop = timed("bench.noop")(noop)
+    start = time.perf_counter()
+    for _ in range(calls):
+        noop()
+    bare = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(calls):
+        timed_noop()
+    decorated = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(calls):
+        with timed("bench.block"):
+            pass
+    block = time.perf_counter() - start
+
+    print("\n--- Timer overhead ---")
+    print(f"Plain call:     {bare / calls * 1e9:7.0f} ns")
+    print(f"@timed call:    {decorated / calls * 1e9:7.0f} ns")
+    print(f"with timed():   {block / calls * 1e9:7.0f} ns")
+
+    _registry.reset()
+    for ms in range(1, 101):
+        observe("demo.request", ms / 1000)
+    increment("demo.errors", 3)
+    register_collector("demo_cache", lambda: {"hits": 7, "hit_rate": 0.7})
+    print(format_timers())
+    print(_registry.to_prometheus())
+    print("----------------------")
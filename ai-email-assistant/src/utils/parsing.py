@@ -1,65 +1,165 @@
 # src/utils/parsing.py
 import base64
+import codecs
 from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
 import datetime
-from bs4 import (
-    BeautifulSoup,
-)  # For potential HTML cleaning later, not strictly needed for extraction
 from dateutil.parser import parse as dateutil_parse
-import datetime
+
+from src.utils.config import MIME_MAX_HTML_BYTES, MIME_MAX_TEXT_BYTES
 
 
 def get_header_value(headers, name):
     """
     Finds the value of a specific header from the list of headers.
     Gmail header names are case-insensitive in practice.
+    For several lookups on one message, build index_headers() once instead.
     """
     if not headers:
         return None
+    name = name.lower()
     for header in headers:
         # Case-insensitive comparison for header name
-        if header.get("name", "").lower() == name.lower():
+        if header.get("name", "").lower() == name:
             return header.get("value")
     return None
 
 
-def parse_email_body(message_payload):
+def index_headers(headers):
+    """
+    Builds a {lower-cased name: value} map from a Gmail header list in one pass.
+    The first occurrence wins, as with get_header_value.
+    """
+    index = {}
+    for header in headers or ():
+        index.setdefault(header.get("name", "").lower(), header.get("value"))
+    return index
+
+
+def _part_charset(part):
+    """Charset from the part's Content-Type header (Gmail keeps the original bytes)."""
+    content_type = get_header_value(part.get("headers"), "Content-Type") or ""
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            return value.strip().strip('"') or "utf-8"
+    return "utf-8"
+
+
+def decode_body_data(data, max_bytes=None, charset="utf-8"):
+    """
+    Decodes base64url body data to text, decoding at most max_bytes of content.
+    Only the needed prefix of the base64 string is touched, and a multi-byte
+    character cut by the limit is dropped rather than replaced.
+    """
+    if max_bytes is not None:
+        # 4 base64 characters encode 3 bytes
+        data = data[: -(-max_bytes // 3) * 4]
+    raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    if max_bytes is not None:
+        raw = raw[:max_bytes]
+    try:
+        decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    return decoder.decode(raw, final=max_bytes is None or len(raw) < max_bytes)
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Streaming HTML-to-text: keeps visible text, maps block tags to newlines."""
+
+    SKIP_TAGS = {"script", "style", "head", "title", "noscript", "template"}
+    BLOCK_TAGS = set(
+        "br p div tr li ul ol table blockquote h1 h2 h3 h4 h5 h6 hr section article pre".split()
+    )
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self.length = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            self._skip_depth = 0  # Recover from an unclosed <head>
+        elif tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in self.BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            text = " ".join(data.split())
+            if text:
+                self.chunks.append(text + " ")
+                self.length += len(text) + 1
+
+
+def html_to_text(html, max_chars=None, chunk_size=8192):
     """
-    Parses the body content (plain text and HTML) from a Gmail message payload.
-    Handles multipart messages and base64 decoding.
+    Converts HTML to plain text with html.parser, feeding the document in chunks
+    and stopping once max_chars of text have been produced.
     """
-    plain_body = None
-    html_body = None
-
-    mime_type = message_payload.get("mimeType", "")
-    parts = message_payload.get("parts", [])
-    body_data = message_payload.get("body", {}).get("data")
-
-    if "text/plain" in mime_type and body_data:
-        plain_body = base64.urlsafe_b64decode(body_data).decode(
-            "utf-8", errors="replace"
-        )
-    elif "text/html" in mime_type and body_data:
-        html_body = base64.urlsafe_b64decode(body_data).decode(
-            "utf-8", errors="replace"
-        )
-    elif "multipart" in mime_type and parts:
-        for part in parts:
-            # Recursively parse parts
-            part_bodies = parse_email_body(part)
-            # Prioritize plain text if found
-            if part_bodies.get("plain") and not plain_body:
-                plain_body = part_bodies["plain"]
-            if part_bodies.get("html") and not html_body:
-                html_body = part_bodies["html"]
-            # If we found plain text in a multipart/alternative, stop looking in this branch
-            if "multipart/alternative" in mime_type and plain_body:
-                break
-
-    # If we only found HTML, we might want to generate a basic plain text version
-    # For now, we just return what we found. Can add HTML-to-text conversion later if needed.
-
-    return {"plain": plain_body, "html": html_body}
+    if not html:
+        return ""
+    extractor = _HTMLTextExtractor()
+    for start in range(0, len(html), chunk_size):
+        extractor.feed(html[start : start + chunk_size])
+        if max_chars is not None and extractor.length >= max_chars:
+            break
+    else:
+        extractor.close()
+    lines = (line.strip() for line in "".join(extractor.chunks).split("\n"))
+    text = "\n".join(line for line in lines if line)
+    return text[:max_chars] if max_chars is not None else text
+
+
+def parse_email_body(
+    message_payload, max_bytes=MIME_MAX_TEXT_BYTES, max_html_bytes=MIME_MAX_HTML_BYTES
+):
+    """
+    Extracts the body from a Gmail message payload without recursion.
+    Parts are walked depth-first in document order and the walk stops at the
+    first text/plain body; attachments are skipped. Only that part is decoded,
+    up to max_bytes. If there is no plain part, the first text/html part is
+    decoded (up to max_html_bytes) and converted to text, and the HTML is kept.
+    Returns {"plain": str or None, "html": str or None}.
+    """
+    html_part = None
+    stack = [message_payload]
+    while stack:
+        part = stack.pop()
+        mime_type = part.get("mimeType", "").lower()
+        if mime_type.startswith("multipart/"):
+            stack.extend(reversed(part.get("parts") or []))
+            continue
+        if part.get("filename"):
+            continue  # Attachment (Gmail gives inline images/files a filename)
+        data = (part.get("body") or {}).get("data")
+        if not data:
+            continue
+        if mime_type == "text/plain":
+            text = decode_body_data(data, max_bytes, _part_charset(part))
+            return {"plain": text, "html": None}
+        if mime_type == "text/html" and html_part is None:
+            html_part = part
+
+    if html_part is None:
+        return {"plain": None, "html": None}
+    html = decode_body_data(
+        html_part["body"]["data"], max_html_bytes, _part_charset(html_part)
+    )
+    return {"plain": html_to_text(html, max_chars=max_bytes), "html": html}
 
 
 def parse_date_string(date_string):
@@ -123,3 +223,117 @@ def parse_extracted_datetime(date_str, time_str):
     except Exception as e:  # Catch other potential errors
         print(f"[!] Unexpected error parsing datetime '{full_str}': {e}")
         return None
+
+
+# Example usage (for testing): parse cost on typical Gmail MIME shapes, compared
+# with the previous recursive parser that decoded every text part in full.
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+
+    def legacy_parse(payload):
+        plain_body = html_body = None
+        mime_type = payload.get("mimeType", "")
+        parts = payload.get("parts", [])
+        body_data = payload.get("body", {}).get("data")
+        if "text/plain" in mime_type and body_data:
+            plain_body = base64.urlsafe_b64decode(body_data).decode("utf-8", "replace")
+        elif "text/html" in mime_type and body_data:
+            html_body = base64.urlsafe_b64decode(body_data).decode("utf-8", "replace")
+        elif "multipart" in mime_type and parts:
+            for part in parts:
+                found = legacy_parse(part)
+                if found.get("plain") and not plain_body:
+                    plain_body = found["plain"]
+                if found.get("html") and not html_body:
+                    html_body = found["html"]
+                if "multipart/alternative" in mime_type and plain_body:
+                    break
+        return {"plain": plain_body, "html": html_body}
+
+    def leaf(mime_type, text, filename=""):
+        data = base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+        return {"mimeType": mime_type, "filename": filename, "body": {"data": data}}
+
+    def node(mime_type, *parts):
+        return {"mimeType": mime_type, "parts": list(parts)}
+
+    paragraph = "The quarterly numbers are in and the team did great work. " * 20
+    html_page = (
+        "<html><head><style>" + ".c{color:red}" * 2000 + "</style></head><body>"
+        + ("<table><tr><td><p>" + paragraph + "</p></td></tr></table>") * 200
+        + "</body></html>"
+    )  # fmt: skip
+    deep = leaf("text/plain", paragraph * 5)
+    for _ in range(12):
+        deep = node("multipart/mixed", deep, leaf("text/html", html_page[:20000]))
+
+    fixtures = {
+        "plain 2 KB": leaf("text/plain", paragraph[:2000]),
+        "alternative (plain + 250 KB html)": node(
+            "multipart/alternative",
+            leaf("text/plain", paragraph * 5),
+            leaf("text/html", html_page),
+        ),
+        "mixed with 2 MB text attachment first": node(
+            "multipart/mixed",
+            leaf("text/plain", "log line\n" * 230000, filename="server.log"),
+            node(
+                "multipart/alternative",
+                leaf("text/plain", paragraph),
+                leaf("text/html", html_page),
+            ),
+        ),
+        "html-only newsletter (related)": node(
+            "multipart/related",
+            leaf("text/html", html_page),
+            {
+                "mimeType": "image/png",
+                "filename": "logo.png",
+                "body": {"attachmentId": "a1"},
+            },
+        ),
+        "forward chain, 12 levels deep": deep,
+        "plain 2 MB log dump": leaf("text/plain", "log line\n" * 230000),
+    }
+
+    print("\n--- MIME body parsing: recursive full decode vs iterative budgeted ---")
+    for name, payload in fixtures.items():
+        row = []
+        for parser in (legacy_parse, parse_email_body):
+            runs = 20
+            start = time.perf_counter()
+            for _ in range(runs):
+                result = parser(payload)
+            elapsed = (time.perf_counter() - start) / runs
+            tracemalloc.start()
+            parser(payload)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            chars = len(result["plain"] or "") + len(result["html"] or "")
+            row.append(
+                f"{elapsed * 1000:8.2f} ms {peak / 1024:8.0f} KiB {chars:8d} chars"
+            )
+        print(f"{name}\n  before: {row[0]}\n  after:  {row[1]}")
+
+    # Header lookups: four linear scans per message vs one index pass
+    headers = [{"name": f"X-Header-{i}", "value": "v"} for i in range(56)] + [
+        {"name": name, "value": "v"} for name in ("From", "To", "Subject", "Date")
+    ]
+    runs = 20000
+    start = time.perf_counter()
+    for _ in range(runs):
+        for name in ("Subject", "From", "To", "Date"):
+            get_header_value(headers, name)
+    scans = (time.perf_counter() - start) / runs
+    start = time.perf_counter()
+    for _ in range(runs):
+        index = index_headers(headers)
+        for name in ("subject", "from", "to", "date"):
+            index.get(name)
+    indexed = (time.perf_counter() - start) / runs
+    print(
+        f"60-header message, 4 lookups: {scans * 1e6:.1f} us with get_header_value, "
+        f"{indexed * 1e6:.1f} us with index_headers"
+    )
+    print("---------------------------------------------------------------------")
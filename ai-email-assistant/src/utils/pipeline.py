@@ -0,0 +1,227 @@
+# src/utils/pipeline.py
+import queue
+import threading
+import time
+
+from src.utils.metrics import observe
+
+# Sentinel pushed through the queues to tell workers there is no more input
+_STOP = object()
+
+
+class Stage:
+    """
+    One step of the pipeline: a pool of worker threads that read items from an
+    input queue, call `handler(item)` and pass the result on to the next stage.
+    Returning None from the handler drops the item.
+
+    With `batch_size` set (an int, or a callable returning the current size), the
+    handler instead receives a list of up to that many items and returns a list of
+    results. A worker waits at most `batch_wait` seconds to fill a batch.
+    """
+
+    def __init__(self, name, handler, workers=1, batch_size=None, batch_wait=0.05):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _record(self, elapsed, failed=False, count=1):
+        observe(f"pipeline.{self.name}", elapsed)  # Per item (or per batch)
+        with self._lock:
+            self.busy_seconds += elapsed
+            if failed:
+                self.errors += count
+            else:
+                self.processed += count
+
+    def current_batch_size(self):
+        size = self.batch_size() if callable(self.batch_size) else self.batch_size
+        return max(1, int(size or 1))
+
+
+class Pipeline:
+    """
+    Runs items from a source iterable through a chain of Stages.
+    Stages are joined by bounded queues, so a slow stage applies backpressure to
+    the ones before it (their put() blocks) instead of relying on fixed sleeps.
+    """
+
+    def __init__(self, stages, queue_size=16, source_name="fetch"):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage.")
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self.source_name = source_name
+        self.fed = 0
+
+    def run(self, source, stop=None):
+        """
+        Feeds `source` through all stages and blocks until every item is done.
+        Once the optional `stop` event is set no further items are read from
+        `source`; items already in the pipeline are still finished (drained).
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+        start = time.perf_counter()
+
+        # --- Source (fetch) thread ---
+        def feed():
+            try:
+                for item in source:
+                    if stop is not None and stop.is_set():
+                        print("[*] Stop requested; draining items in progress.")
+                        break
+                    queues[0].put(item)  # Blocks while the first stage is behind
+                    self.fed += 1
+            except Exception as e:
+                print(f"[!] Pipeline {self.source_name} stage failed: {e}")
+            finally:
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_STOP)
+
+        threads.append(
+            threading.Thread(target=feed, name=f"{self.source_name}-0", daemon=True)
+        )
+
+        # --- Worker threads for each stage ---
+        for index, stage in enumerate(self.stages):
+            in_q = queues[index]
+            out_q = queues[index + 1] if index + 1 < len(self.stages) else None
+            next_workers = (
+                self.stages[index + 1].workers if index + 1 < len(self.stages) else 0
+            )
+            remaining = {"count": stage.workers, "lock": threading.Lock()}
+
+            for n in range(stage.workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(stage, in_q, out_q, next_workers, remaining),
+                        name=f"{stage.name}-{n}",
+                        daemon=True,
+                    )
+                )
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        elapsed = time.perf_counter() - start
+        return self.summary(elapsed)
+
+    def _work(self, stage, in_q, out_q, next_workers, remaining):
+        """Worker loop for one thread of a stage."""
+        if stage.batch_size:
+            self._work_batches(stage, in_q, out_q)
+            self._finish(remaining, out_q, next_workers)
+            return
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                break
+            t0 = time.perf_counter()
+            try:
+                result = stage.handler(item)
+            except Exception as e:
+                stage._record(time.perf_counter() - t0, failed=True)
+                print(f"[!] Pipeline stage '{stage.name}' error: {e}")
+                continue
+            stage._record(time.perf_counter() - t0)
+            if out_q is not None and result is not None:
+                out_q.put(result)
+        self._finish(remaining, out_q, next_workers)
+
+    def _work_batches(self, stage, in_q, out_q):
+        """Worker loop for a batching stage: hands the handler lists of items."""
+        stopped = False
+        while not stopped:
+            item = in_q.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            limit = stage.current_batch_size()
+            deadline = time.monotonic() + stage.batch_wait
+            while len(batch) < limit:
+                try:
+                    item = in_q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopped = True  # Finish this batch, then exit
+                    break
+                batch.append(item)
+
+            t0 = time.perf_counter()
+            try:
+                results = stage.handler(batch)
+            except Exception as e:
+                stage._record(time.perf_counter() - t0, failed=True, count=len(batch))
+                print(f"[!] Pipeline stage '{stage.name}' error: {e}")
+                continue
+            stage._record(time.perf_counter() - t0, count=len(batch))
+            if out_q is not None:
+                for result in results or []:
+                    if result is not None:
+                        out_q.put(result)
+
+    @staticmethod
+    def _finish(remaining, out_q, next_workers):
+        # The last worker of this stage to finish closes the next stage
+        with remaining["lock"]:
+            remaining["count"] -= 1
+            last = remaining["count"] == 0
+        if last and out_q is not None:
+            for _ in range(next_workers):
+                out_q.put(_STOP)
+
+    def summary(self, elapsed):
+        """Returns per-stage counters for the last run."""
+        return {
+            "items": self.fed,
+            "elapsed_seconds": round(elapsed, 3),
+            "stages": {
+                stage.name: {
+                    "workers": stage.workers,
+                    "processed": stage.processed,
+                    "errors": stage.errors,
+                    "busy_seconds": round(stage.busy_seconds, 3),
+                }
+                for stage in self.stages
+            },
+        }
+
+
+# Example usage (for testing): a mocked LLM with fixed per-call latency.
+# The serial loop costs items * (sum of stage latencies); the pipeline should be
+# close to items * slowest_latency / workers.
+if __name__ == "__main__":
+    items = 40
+    latencies = {"analyze": 0.05, "act": 0.01, "draft": 0.05, "mark": 0.002}
+
+    def make_handler(delay):
+        def handler(item):
+            time.sleep(delay)
+            return item
+
+        return handler
+
+    serial_estimate = items * sum(latencies.values())
+    stages = [
+        Stage("analyze", make_handler(latencies["analyze"]), workers=4),
+        Stage("act", make_handler(latencies["act"]), workers=1),
+        Stage("draft", make_handler(latencies["draft"]), workers=4),
+        Stage("mark", make_handler(latencies["mark"]), workers=1),
+    ]
+    print("\n--- Testing Pipeline with mocked LLM ---")
+    stats = Pipeline(stages, queue_size=8).run(range(items))
+    print(f"Serial loop estimate: {serial_estimate:.2f}s")
+    print(f"Pipeline elapsed:     {stats['elapsed_seconds']:.2f}s")
+    print(stats["stages"])
+    print("----------------------------------------")
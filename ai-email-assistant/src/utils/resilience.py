@@ -0,0 +1,157 @@
+# src/utils/resilience.py
+import email.utils
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+    Tokens refill at `rate` per second up to `capacity`; acquire() blocks until
+    a token is available, so every caller sharing the bucket shares the limit.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1, timeout=None):
+        """Takes tokens, waiting as needed. Returns False if timeout runs out first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate if self.rate > 0 else 1.0
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+def parse_retry_after(value):
+    """
+    Converts a Retry-After header (delta seconds or an HTTP date) to seconds.
+    Returns None when the header is missing or unreadable.
+    """
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Exponential backoff with full jitter for the given retry attempt (0-based)."""
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+class AdaptiveBatchSize:
+    """
+    AIMD controller for request batch sizes.
+    After each batch, record() grows the size by one while requests succeed within
+    target_latency seconds, and halves it after an error or a slow request.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=32, target_latency=10.0):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.target_latency = float(target_latency)
+        self._size = min(self.maximum, max(self.minimum, int(initial)))
+        self._lock = threading.Lock()
+
+    def size(self):
+        with self._lock:
+            return self._size
+
+    def record(self, latency, ok=True):
+        """Adjusts the batch size from one request's outcome; returns the new size."""
+        with self._lock:
+            if ok and latency <= self.target_latency:
+                self._size = min(self.maximum, self._size + 1)
+            else:
+                self._size = max(self.minimum, self._size // 2)
+            return self._size
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a while.
+    After failure_threshold consecutive failures the breaker opens and allow()
+    returns False for reset_timeout seconds; then a single trial call is let
+    through (half-open), and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=60.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """True if a call may be attempted now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            if self._trial_running:
+                return False
+            self._trial_running = True  # Half-open: one trial call at a time
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        """Ends a call that was allowed but had no outcome (e.g. cancelled)."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            reopen = self._trial_running
+            self._trial_running = False
+            if reopen or self.failures >= self.failure_threshold:
+                if reopen or self.opened_at is None:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
@@ -0,0 +1,99 @@
+# src/utils/scheduler.py
+import signal
+import threading
+import time
+from collections import deque
+
+
+class AdaptiveInterval:
+    """
+    Poll interval that follows the mail flow.
+    A cycle that found new mail drops the interval to `minimum`; each idle cycle
+    multiplies it by `backoff`, up to `maximum`.
+    """
+
+    def __init__(self, minimum, maximum, backoff=2.0):
+        self.minimum = max(0.0, float(minimum))
+        self.maximum = max(self.minimum, float(maximum))
+        self.backoff = max(1.0, float(backoff))
+        self.current = self.minimum
+
+    def next(self, found):
+        """Returns the wait before the next poll, given how many items were found."""
+        if found:
+            self.current = self.minimum
+        else:
+            self.current = min(self.maximum, max(self.current, 0.001) * self.backoff)
+        return self.current
+
+
+class PollingScheduler:
+    """
+    Runs `cycle()` repeatedly, sleeping for the AdaptiveInterval between runs.
+    cycle() returns how many new items it found (0 when idle). stop() (or
+    SIGTERM/SIGINT with install_signal_handlers) ends the loop once the current
+    cycle has finished; waits between cycles are interrupted immediately.
+    """
+
+    def __init__(self, cycle, interval, history=100):
+        self.cycle = cycle
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.cycles = 0
+        self.failures = 0
+        self.items = 0
+        self.latencies = deque(maxlen=history)  # Seconds per recent cycle
+        self.idle_wall = 0.0
+        self.idle_cpu = 0.0
+
+    def stop(self, *_):
+        if not self.stop_event.is_set():
+            print("\n[*] Shutdown requested; finishing in-flight work...")
+        self.stop_event.set()
+
+    def install_signal_handlers(self):
+        """Stops gracefully on SIGTERM/SIGINT. Returns the previous handlers."""
+        previous = {}
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous[sig] = signal.signal(sig, self.stop)
+        return previous
+
+    def run(self, max_cycles=None):
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                found = self.cycle() or 0
+            except Exception as e:
+                print(f"[!] Poll cycle failed: {e}")
+                self.failures += 1
+                found = 0
+            self.latencies.append(time.perf_counter() - start)
+            self.cycles += 1
+            self.items += found
+            if max_cycles is not None and self.cycles >= max_cycles:
+                break
+
+            wait = self.interval.next(found)
+            wall, cpu = time.perf_counter(), time.process_time()
+            self.stop_event.wait(wait)  # Returns early on stop()
+            self.idle_wall += time.perf_counter() - wall
+            self.idle_cpu += time.process_time() - cpu
+        return self.stats()
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "cycles": self.cycles,
+            "failures": self.failures,
+            "items": self.items,
+            "interval_seconds": round(self.interval.current, 3),
+            "cycle_p50_ms": (
+                round(latencies[len(latencies) // 2] * 1000, 2) if latencies else 0.0
+            ),
+            "cycle_max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            "idle_cpu_percent": (
+                round(100 * self.idle_cpu / self.idle_wall, 3)
+                if self.idle_wall
+                else 0.0
+            ),
+        }
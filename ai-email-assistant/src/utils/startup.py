@@ -0,0 +1,116 @@
+# src/utils/startup.py
+"""
+Startup benchmark: how long `import src.main` takes (via `python -X importtime`)
+and, in a source checkout, how much of a cold fake-mailbox run
+(`python -m scripts.fake_gmail run N`) that import accounts for.
+
+    python -m src.utils.startup            # report
+    python -m src.utils.startup 150        # also fail (exit 1) above 150 ms
+
+Service clients (Google, Slack, Hugging Face, DuckDuckGo) are created on first
+use, so importing the app should stay far below the cost of processing mail.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from src.utils.config import ROOT_DIR
+
+
+def _python(*args):
+    """Runs the current interpreter in the project root; returns (seconds, stderr)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        print(f"[!] {' '.join(args)} exited with {result.returncode}")
+    return elapsed, result.stderr
+
+
+def parse_importtime(stderr):
+    """
+    Parses `-X importtime` output into [(depth, module, self_ms, cumulative_ms)],
+    in the order printed (children before their parent).
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # Two spaces per level
+        rows.append(
+            (depth, name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000)
+        )
+    return rows
+
+
+def import_profile(module="src.main", runs=5):
+    """
+    Imports module in `runs` fresh interpreters. Returns the median cumulative
+    import time in ms and the module's direct imports from the last run,
+    slowest first.
+    """
+    totals, children = [], []
+    for _ in range(runs):
+        _, stderr = _python("-X", "importtime", "-c", f"import {module}")
+        rows = parse_importtime(stderr)
+        index = next((i for i, row in enumerate(rows) if row[1] == module), None)
+        if index is None:
+            return None, []
+        depth = rows[index][0]
+        totals.append(rows[index][3])
+        # Its imports are printed just before it, one level deeper
+        children = []
+        for d, name, _, cumulative in reversed(rows[:index]):
+            if d <= depth:
+                break
+            if d == depth + 1:
+                children.append((name, cumulative))
+        children.sort(key=lambda item: item[1], reverse=True)
+    return statistics.median(totals), children
+
+
+def wall_time(*args, runs=3):
+    """Median wall-clock seconds of `python <args>`."""
+    return statistics.median(_python(*args)[0] for _ in range(runs))
+
+
+# Example usage (for testing)
+if __name__ == "__main__":
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    print("\n--- Startup benchmark ---")
+    baseline = wall_time("-c", "pass")
+    imported = wall_time("-c", "import src.main")
+    total_ms, children = import_profile()
+    if total_ms is None:
+        print("[!] Could not import src.main.")
+        sys.exit(1)
+    print(f"Interpreter start:        {baseline * 1000:7.1f} ms")
+    print(f"+ import src.main (wall): {(imported - baseline) * 1000:7.1f} ms")
+    print(f"import src.main (-X importtime, median): {total_ms:.1f} ms")
+    print("Slowest direct imports:")
+    for name, cumulative in children[:8]:
+        print(f"  {cumulative:7.1f} ms  {name}")
+
+    count = 20
+    if os.path.exists(os.path.join(ROOT_DIR, "scripts", "fake_gmail.py")):
+        cold = wall_time("-m", "scripts.fake_gmail", "run", str(count))
+        print(
+            f"Cold fake-mailbox run of {count} emails: {cold * 1000:.0f} ms, of which "
+            f"{100 * (imported - baseline) / cold:.0f}% importing and "
+            f"{100 * baseline / cold:.0f}% interpreter start"
+        )
+    print("-------------------------")
+    if budget_ms is not None and total_ms > budget_ms:
+        print(
+            f"[!] Import time {total_ms:.1f} ms is over the {budget_ms:.0f} ms budget."
+        )
+        sys.exit(1)
@@ -0,0 +1,47 @@
+# tests/conftest.py
+import pytest
+from googleapiclient.discovery import build
+
+import src.storage.database as database
+from tests.fakes.gmail import FakeGmailHttp
+from tests.fakes.google_calendar import FakeCalendarHttp
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """A fresh SQLite database for one test; assistant.db is left alone."""
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    database.initialize_database()
+    return database
+
+
+@pytest.fixture
+def gmail():
+    """make(http) -> Gmail service talking to a FakeGmailHttp."""
+
+    def make(http):
+        return build("gmail", "v1", http=http, static_discovery=True)
+
+    return make
+
+
+@pytest.fixture
+def mailbox(gmail):
+    """make(count) -> (FakeGmailHttp with count unread messages, service)."""
+
+    def make(count):
+        http = FakeGmailHttp.with_messages(count)
+        return http, gmail(http)
+
+    return make
+
+
+@pytest.fixture
+def calendar():
+    """make(busy_events) -> (FakeCalendarHttp, Calendar service)."""
+
+    def make(busy_events=0, **kwargs):
+        http = FakeCalendarHttp.with_events(busy_events, **kwargs)
+        return http, build("calendar", "v3", http=http, static_discovery=True)
+
+    return make
@@ -0,0 +1,352 @@
+# tests/fakes/gmail.py
+"""
+In-memory stand-in for the Gmail REST API, used by the tests and benchmarks.
+
+FakeGmailHttp plugs into googleapiclient as the `http` transport, so the real
+client code (including batch requests) runs unchanged against a fake mailbox:
+
+    http = FakeGmailHttp.with_messages(250)
+    service = build("gmail", "v1", http=http, static_discovery=True)
+
+It counts HTTP round trips so callers can check how many requests a fetch costs.
+"""
+import base64
+import email.parser
+import json
+import urllib.parse
+
+import httplib2
+
+BATCH_PATH = "/batch"  # Also matches the older /batch/gmail/v1 form
+API_PREFIX = "/gmail/v1/users/me/"
+
+
+def _body(text):
+    return {
+        "size": len(text),
+        "data": base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii"),
+    }
+
+
+def make_message(
+    index,
+    unread=True,
+    subject=None,
+    body=None,
+    sender=None,
+    html=None,
+    attachment_bytes=0,
+    extra_headers=0,
+    list_unsubscribe=None,
+):
+    """
+    Builds a Gmail API message resource (format="full") for the fake mailbox.
+    With html and/or attachment_bytes the payload becomes multipart, and
+    extra_headers adds Received-style headers, as real mail has;
+    list_unsubscribe adds the header bulk senders include.
+    """
+    msg_id = f"{index:016x}"
+    subject = subject if subject is not None else f"Test message {index}"
+    body = body if body is not None else f"Hello,\n\nThis is test message {index}.\n"
+    sender = sender or f"sender{index % 7}@example.com"
+    labels = ["INBOX"] + (["UNREAD"] if unread else [])
+    headers = [
+        {"name": "Received", "value": f"from relay{i}.example.net by mx.google.com"}
+        for i in range(extra_headers)
+    ] + [
+        {"name": "From", "value": sender},
+        {"name": "To", "value": "me@example.com"},
+        {"name": "Subject", "value": subject},
+        {"name": "Date", "value": "Mon, 13 Nov 2023 10:00:00 +0000"},
+    ]
+    if list_unsubscribe:
+        headers.append({"name": "List-Unsubscribe", "value": list_unsubscribe})
+    payload = {"mimeType": "text/plain", "body": _body(body)}
+    if html is not None:
+        payload = {
+            "mimeType": "multipart/alternative",
+            "body": {"size": 0},
+            "parts": [
+                {"partId": "0.0", "mimeType": "text/plain", "body": _body(body)},
+                {"partId": "0.1", "mimeType": "text/html", "body": _body(html)},
+            ],
+        }
+    if attachment_bytes:
+        payload = {
+            "mimeType": "multipart/mixed",
+            "body": {"size": 0},
+            "parts": [
+                payload,
+                {
+                    "partId": "1",
+                    "mimeType": "application/pdf",
+                    "filename": "attachment.pdf",
+                    "body": _body("%" * attachment_bytes),
+                },
+            ],
+        }
+    payload["headers"] = headers
+    return {
+        "id": msg_id,
+        "threadId": f"t{index:015x}",
+        "labelIds": labels,
+        "snippet": body[:100],
+        "sizeEstimate": len(json.dumps(payload)),
+        "internalDate": str(1700000000000 + index * 1000),
+        "payload": payload,
+    }
+
+
+class FakeGmailHttp:
+    """
+    Minimal httplib2.Http replacement serving messages.list/get, history.list,
+    getProfile and the /batch endpoint from an in-memory mailbox.
+    Changes made after construction (add_message, remove_labels) are recorded
+    as history entries, like the real mailbox history.
+    """
+
+    def __init__(self, messages=None):
+        self.messages = {}  # id -> message resource, newest first on listing
+        self.round_trips = 0
+        self.bytes_received = 0  # Response body bytes sent back to the client
+        self.requests_by_kind = {}
+        self.full_fetches = []  # Ids served with their full payload, in order
+        # message id -> list of HTTP status codes to return before succeeding
+        self.failures = {}
+        self.list_failures = []  # HTTP status codes for the next messages.list calls
+        self.history = []  # History records, oldest first
+        self.history_id = 1000
+        self.oldest_history_id = self.history_id  # Older start ids get a 404
+        for message in messages or []:
+            self.messages[message["id"]] = message
+
+    @classmethod
+    def with_messages(cls, count, unread=True):
+        return cls([make_message(i, unread=unread) for i in range(count)])
+
+    def add_message(self, message):
+        """Delivers a new message and records a messagesAdded history entry."""
+        self.messages[message["id"]] = message
+        self._record_history("messagesAdded", {"message": _summary(message)})
+
+    def remove_labels(self, msg_id, *labels):
+        """Removes labels (e.g. "UNREAD" when read) and records labelsRemoved."""
+        message = self.messages[msg_id]
+        message["labelIds"] = [
+            label for label in message["labelIds"] if label not in labels
+        ]
+        self._record_history(
+            "labelsRemoved", {"message": _summary(message), "labelIds": list(labels)}
+        )
+
+    def expire_history(self):
+        """Simulates Gmail discarding old history: earlier start ids return 404."""
+        self.oldest_history_id = self.history_id + 1
+        self.history = []
+
+    def _record_history(self, kind, change):
+        self.history_id += 1
+        self.history.append(
+            {
+                "id": str(self.history_id),
+                "messages": [change["message"]],
+                kind: [change],
+            }
+        )
+
+    def fail(self, msg_id, *statuses):
+        """Makes the next get() calls for msg_id fail with the given statuses."""
+        self.failures.setdefault(msg_id, []).extend(statuses)
+
+    # --- httplib2.Http interface ---
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        self.round_trips += 1
+        parsed = urllib.parse.urlparse(uri)
+        if parsed.path.startswith(BATCH_PATH):
+            self._count("batch")
+            response, content = self._handle_batch(body, headers or {})
+        else:
+            status, payload = self._dispatch(method, parsed.path, parsed.query)
+            response, content = self._response(status), json.dumps(payload).encode()
+        self.bytes_received += len(content)
+        return response, content
+
+    def _count(self, kind):
+        self.requests_by_kind[kind] = self.requests_by_kind.get(kind, 0) + 1
+
+    @staticmethod
+    def _response(status, content_type="application/json; charset=UTF-8"):
+        return httplib2.Response({"status": status, "content-type": content_type})
+
+    # --- REST routing ---
+    def _dispatch(self, method, path, query):
+        pairs = urllib.parse.parse_qsl(query)
+        params = dict(pairs)
+        params["metadataHeaders"] = [v for k, v in pairs if k == "metadataHeaders"]
+        if not path.startswith(API_PREFIX):
+            return 404, _error(404, f"Unknown path {path}")
+        resource = path[len(API_PREFIX) :]
+
+        if method == "GET" and resource == "messages":
+            self._count("messages.list")
+            if self.list_failures:
+                status = self.list_failures.pop(0)
+                return status, _error(status, "Injected failure")
+            return self._list_messages(params)
+        if method == "GET" and resource.startswith("messages/"):
+            self._count("messages.get")
+            return self._get_message(resource.split("/", 1)[1], params)
+        if method == "GET" and resource == "history":
+            self._count("history.list")
+            return self._list_history(params)
+        if method == "GET" and resource == "profile":
+            self._count("getProfile")
+            return 200, {
+                "emailAddress": "me@example.com",
+                "messagesTotal": len(self.messages),
+                "historyId": str(self.history_id),
+            }
+        return 404, _error(404, f"Unsupported call {method} {path}")
+
+    def _list_messages(self, params):
+        query = params.get("q", "")
+        after = None
+        for term in query.split():
+            if term.startswith("after:"):
+                after = int(term[len("after:") :]) * 1000
+        ids = [
+            msg_id
+            for msg_id, message in self.messages.items()
+            if ("is:unread" not in query or "UNREAD" in message.get("labelIds", []))
+            and (after is None or int(message["internalDate"]) > after)
+        ]
+        ids.sort(key=lambda i: int(self.messages[i]["internalDate"]), reverse=True)
+        page_size = int(params.get("maxResults", 100))
+        try:
+            start = int(params.get("pageToken", "0") or 0)
+        except ValueError:
+            return 400, _error(400, "Invalid pageToken")
+        page = ids[start : start + page_size]
+        result = {"resultSizeEstimate": len(ids)}
+        if page:
+            result["messages"] = [
+                {"id": i, "threadId": self.messages[i]["threadId"]} for i in page
+            ]
+        if start + page_size < len(ids):
+            result["nextPageToken"] = str(start + page_size)
+        return 200, result
+
+    def _list_history(self, params):
+        start = int(params.get("startHistoryId", "0"))
+        if start < self.oldest_history_id:
+            return 404, _error(404, "Requested entity was not found.")
+        records = [r for r in self.history if int(r["id"]) > start]
+        page_size = int(params.get("maxResults", 100))
+        offset = int(params.get("pageToken", "0") or 0)
+        result = {"historyId": str(self.history_id)}
+        if records[offset : offset + page_size]:
+            result["history"] = records[offset : offset + page_size]
+        if offset + page_size < len(records):
+            result["nextPageToken"] = str(offset + page_size)
+        return 200, result
+
+    def _get_message(self, msg_id, params):
+        pending = self.failures.get(msg_id)
+        if pending:
+            status = pending.pop(0)
+            return status, _error(status, "Injected failure")
+        message = self.messages.get(msg_id)
+        if message is None:
+            return 404, _error(404, "Requested entity was not found.")
+        if params.get("format") == "metadata":
+            wanted = {name.lower() for name in params["metadataHeaders"]}
+            headers = message["payload"]["headers"]
+            message = dict(message)
+            message["payload"] = {
+                "mimeType": message["payload"]["mimeType"],
+                "headers": [
+                    h for h in headers if not wanted or h["name"].lower() in wanted
+                ],
+            }
+        else:
+            self.full_fetches.append(msg_id)
+        if params.get("fields"):
+            message = _apply_fields(message, _parse_fields(params["fields"]))
+        return 200, message
+
+    # --- Batch endpoint ---
+    def _handle_batch(self, body, headers):
+        content_type = headers.get("content-type") or headers.get("Content-Type")
+        parser = email.parser.FeedParser()
+        parser.feed(f"content-type: {content_type}\r\n\r\n{body}")
+        envelope = parser.close()
+
+        boundary = "batch_fake_boundary"
+        parts = []
+        for part in envelope.get_payload():
+            content_id = part["Content-ID"]
+            request_line = part.get_payload().split("\n", 1)[0]
+            method, target, _ = request_line.split(" ", 2)
+            target = urllib.parse.urlparse(target)
+            status, payload = self._dispatch(method, target.path, target.query)
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id[1:-1]}>\r\n"
+                "\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n"
+                "\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        content = "".join(parts) + f"--{boundary}--\r\n"
+        response = self._response(200, f"multipart/mixed; boundary={boundary}")
+        return response, content.encode("utf-8")
+
+
+def _summary(message):
+    return {
+        "id": message["id"],
+        "threadId": message["threadId"],
+        "labelIds": list(message.get("labelIds", [])),
+    }
+
+
+def _parse_fields(spec):
+    """Parses a partial-response mask like "id,payload(headers,body/data)"."""
+    tree, depth, start = {}, 0, 0
+    items = []
+    for i, ch in enumerate(spec):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            items.append(spec[start:i])
+            start = i + 1
+    items.append(spec[start:])
+    for item in filter(None, (item.strip() for item in items)):
+        sub = None
+        if item.endswith(")"):
+            item, _, inner = item[:-1].partition("(")
+            sub = _parse_fields(inner)
+        node = tree
+        path = item.split("/")
+        for name in path[:-1]:
+            node = node.setdefault(name, {})
+        node[path[-1]] = sub
+    return tree
+
+
+def _apply_fields(value, tree):
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_apply_fields(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {k: _apply_fields(value[k], sub) for k, sub in tree.items() if k in value}
+
+
+def _error(status, message):
+    return {"error": {"code": status, "message": message}}
@@ -0,0 +1,147 @@
+# tests/fakes/google_calendar.py
+"""
+In-memory stand-in for the Google Calendar REST API, used by the tests and
+benchmarks (see gmail.py for the Gmail equivalent):
+
+    http = FakeCalendarHttp.with_events(500)
+    service = build("calendar", "v3", http=http, static_discovery=True)
+
+Serves events.list (with paging and timeMin/timeMax), events.insert and the
+/batch endpoint, and counts HTTP round trips per kind of request.
+"""
+import datetime
+import email.parser
+import json
+import urllib.parse
+
+import httplib2
+
+BATCH_PATH = "/batch"
+API_PREFIX = "/calendar/v3/calendars/"
+
+
+def make_event(index, start, minutes=30, summary=None):
+    end = start + datetime.timedelta(minutes=minutes)
+    return {
+        "id": f"evt{index:06d}",
+        "status": "confirmed",
+        "summary": summary or f"Busy block {index}",
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": end.isoformat()},
+    }
+
+
+class FakeCalendarHttp:
+    """Minimal httplib2.Http replacement backed by one in-memory calendar."""
+
+    PAGE_SIZE = 250  # Small pages so paging gets exercised
+
+    def __init__(self, events=None):
+        self.events = list(events or [])
+        self.round_trips = 0
+        self.requests_by_kind = {}
+
+    @classmethod
+    def with_events(cls, count, start=None, spacing_minutes=90):
+        """count 30-minute events, one every spacing_minutes from start."""
+        tz = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+        start = start or datetime.datetime.now(tz).replace(second=0, microsecond=0)
+        step = datetime.timedelta(minutes=spacing_minutes)
+        return cls([make_event(i, start + i * step) for i in range(count)])
+
+    # --- httplib2.Http interface ---
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        self.round_trips += 1
+        parsed = urllib.parse.urlparse(uri)
+        if parsed.path.startswith(BATCH_PATH):
+            self._count("batch")
+            return self._handle_batch(body, headers or {})
+        status, payload = self._dispatch(method, parsed.path, parsed.query, body)
+        return self._response(status), json.dumps(payload).encode()
+
+    def _count(self, kind):
+        self.requests_by_kind[kind] = self.requests_by_kind.get(kind, 0) + 1
+
+    @staticmethod
+    def _response(status, content_type="application/json; charset=UTF-8"):
+        return httplib2.Response({"status": status, "content-type": content_type})
+
+    # --- REST routing ---
+    def _dispatch(self, method, path, query, body):
+        params = dict(urllib.parse.parse_qsl(query))
+        if not path.startswith(API_PREFIX) or not path.endswith("/events"):
+            return 404, _error(404, f"Unsupported call {method} {path}")
+        if method == "GET":
+            self._count("events.list")
+            return self._list_events(params)
+        if method == "POST":
+            self._count("events.insert")
+            return self._insert_event(json.loads(body or "{}"))
+        return 404, _error(404, f"Unsupported call {method} {path}")
+
+    def _list_events(self, params):
+        time_min = _parse_time(params.get("timeMin"))
+        time_max = _parse_time(params.get("timeMax"))
+        matching = [
+            event
+            for event in self.events
+            if (time_max is None or _parse_time(event["start"]["dateTime"]) < time_max)
+            and (time_min is None or _parse_time(event["end"]["dateTime"]) > time_min)
+        ]
+        matching.sort(key=lambda event: _parse_time(event["start"]["dateTime"]))
+        offset = int(params.get("pageToken") or 0)
+        page_size = min(int(params.get("maxResults", 250)), self.PAGE_SIZE)
+        response = {"items": matching[offset : offset + page_size]}
+        if offset + page_size < len(matching):
+            response["nextPageToken"] = str(offset + page_size)
+        return 200, response
+
+    def _insert_event(self, event):
+        if event.get("id") and any(e["id"] == event["id"] for e in self.events):
+            return 409, _error(409, "The requested identifier already exists.")
+        event = dict(event, status="confirmed")
+        event.setdefault("id", f"new{len(self.events):06d}")
+        event["htmlLink"] = f"https://calendar.example/event?eid={event['id']}"
+        self.events.append(event)
+        return 200, event
+
+    # --- Batch endpoint ---
+    def _handle_batch(self, body, headers):
+        content_type = headers.get("content-type") or headers.get("Content-Type")
+        parser = email.parser.FeedParser()
+        parser.feed(f"content-type: {content_type}\r\n\r\n{body}")
+        envelope = parser.close()
+
+        boundary = "batch_fake_boundary"
+        parts = []
+        for part in envelope.get_payload():
+            content_id = part["Content-ID"]
+            request, _, request_body = part.get_payload().partition("\n\n")
+            method, target, _ = request.split("\n", 1)[0].split(" ", 2)
+            target = urllib.parse.urlparse(target)
+            status, payload = self._dispatch(
+                method, target.path, target.query, request_body.strip()
+            )
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id[1:-1]}>\r\n"
+                "\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n"
+                "\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        content = "".join(parts) + f"--{boundary}--\r\n"
+        response = self._response(200, f"multipart/mixed; boundary={boundary}")
+        return response, content.encode("utf-8")
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _error(status, message):
+    return {"error": {"code": status, "message": message}}
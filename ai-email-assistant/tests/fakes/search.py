@@ -0,0 +1,53 @@
+# tests/fakes/search.py
+"""
+Stand-ins for web search: FakeProvider plugs into fan_out() like any
+SearchProvider, FakeDDGS replaces the DuckDuckGo session behind
+_fetch_results().
+"""
+import asyncio
+import time
+
+from src.services.web_search_service import SearchProvider
+
+
+def hits(source, count=3):
+    """count distinct {title, href, body} results labelled with source."""
+    return [
+        {"title": f"{source} {i}", "href": f"https://{source}/{i}", "body": ""}
+        for i in range(count)
+    ]
+
+
+class FakeProvider(SearchProvider):
+    """Provider with injected latency and results, for tests and benchmarks."""
+
+    def __init__(self, name, latency, results=None, fail=False, timeout=5.0):
+        self.name = name
+        self.latency = latency
+        self.results = results
+        self.fail = fail
+        self.timeout = timeout
+        self.finished = 0
+
+    async def search(self, query, max_results):
+        await asyncio.sleep(self.latency)
+        self.finished += 1
+        if self.fail:
+            raise RuntimeError("injected failure")
+        return list(self.results or [])[:max_results]
+
+
+class FakeDDGS:
+    """duckduckgo_search.DDGS replacement that counts calls and can fail."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.failing = False
+
+    def text(self, query, max_results=3):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.failing:
+            raise RuntimeError("202 Ratelimit")
+        return [{"title": query, "href": "https://example.com", "body": "..."}]
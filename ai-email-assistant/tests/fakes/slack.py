@@ -0,0 +1,116 @@
+# tests/fakes/slack.py
+"""
+Local stand-in for the Slack Web API, used by the tests and benchmarks.
+slack_sdk's WebClient talks to it over real HTTP through `base_url`:
+
+    with FakeSlackServer() as slack:
+        client = WebClient(token="xoxb-fake", base_url=slack.url)
+
+Serves auth.test and chat.postMessage, records every posted message, and
+enforces Slack's per-channel posting rate: a post within `channel_interval`
+seconds of the previous one gets 429 with a Retry-After header.
+"""
+import json
+import math
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeSlackServer:
+    def __init__(self, channel_interval=1.0, latency=0.05):
+        self.channel_interval = channel_interval
+        self.latency = latency  # Seconds added to every API call
+        self.messages = []  # chat.postMessage arguments, in order
+        self.requests = 0
+        self.rate_limited = 0
+        self.fail_next = []  # Status codes to return for the next posts
+        self._last_post = {}  # channel -> time of last accepted post
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/api/"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-slack", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- Slack API methods ---
+    def _call(self, method, args):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        if method == "auth.test":
+            return 200, {}, {"ok": True, "user": "assistant", "team": "Fake Team"}
+        if method != "chat.postMessage":
+            return 200, {}, {"ok": False, "error": "unknown_method"}
+        channel = args.get("channel")
+        if not channel:
+            return 200, {}, {"ok": False, "error": "channel_not_found"}
+        with self._lock:
+            if self.fail_next:
+                status = self.fail_next.pop(0)
+                if status == 429:
+                    self.rate_limited += 1
+                    return (
+                        429,
+                        {"Retry-After": "1"},
+                        {"ok": False, "error": "ratelimited"},
+                    )
+                return status, {}, {"ok": False, "error": "fatal_error"}
+            now = time.monotonic()
+            wait = self._last_post.get(channel, -math.inf) + self.channel_interval - now
+            if wait > 0:
+                self.rate_limited += 1
+                headers = {"Retry-After": str(math.ceil(wait))}
+                return 429, headers, {"ok": False, "error": "ratelimited"}
+            self._last_post[channel] = now
+            self.messages.append(args)
+            ts = f"{time.time():.6f}"
+        return 200, {}, {"ok": True, "channel": channel, "ts": ts}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length).decode("utf-8") if length else ""
+                if "json" in (self.headers.get("Content-Type") or ""):
+                    args = json.loads(raw or "{}")
+                else:
+                    args = dict(urllib.parse.parse_qsl(raw))
+                    if isinstance(args.get("blocks"), str):
+                        args["blocks"] = json.loads(args["blocks"])
+                method = self.path.rsplit("/", 1)[-1]
+                status, headers, body = fake._call(method, args)
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
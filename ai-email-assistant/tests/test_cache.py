@@ -0,0 +1,69 @@
+# tests/test_cache.py
+"""ResponseCache: the memory tier in front of the SQLite cache_entries table."""
+import itertools
+
+import pytest
+
+import src.storage.cache as cache_module
+import src.storage.database as database
+from src.storage.cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A time.time() that moves forward one second per call."""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(cache_module.time, "time", lambda: float(next(ticks)))
+
+
+def _stored_keys(cache):
+    rows = (
+        database.get_storage()
+        .connection()
+        .execute(
+            "SELECT key FROM cache_entries WHERE namespace = ? ORDER BY key",
+            (cache.namespace,),
+        )
+    )
+    return [row["key"] for row in rows]
+
+
+def test_memory_hits_keep_entries_from_being_trimmed(temp_db, clock):
+    cache = ResponseCache("test", ttl_seconds=3600, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    for _ in range(3):
+        assert cache.get("a") == 1  # Served from memory only
+    cache.set("c", 3)
+    cache.prune()
+    assert _stored_keys(cache) == ["a", "c"]  # "b" was the least recently used
+
+
+def test_memory_hits_are_written_back_in_batches(temp_db, clock):
+    cache = ResponseCache("test", ttl_seconds=3600, max_entries=100)
+    others = [f"k{i}" for i in range(cache.TOUCH_BATCH - 1)]
+    for key in ["a"] + others:
+        cache.set(key, key)
+    conn = database.get_storage().connection()
+
+    def last_access():
+        return conn.execute(
+            "SELECT last_access FROM cache_entries WHERE key = 'a'"
+        ).fetchone()[0]
+
+    written = last_access()
+    for _ in range(5):
+        cache.get("a")
+    assert last_access() == written  # Held back until a batch is full
+    for key in others:
+        cache.get(key)
+    assert last_access() > written
+
+
+def test_schema_is_created_in_each_database(temp_db, tmp_path, monkeypatch):
+    cache = ResponseCache("test", ttl_seconds=3600, max_entries=10)
+    cache.set("a", 1)
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "other.db"))
+    cache.set("b", 2)
+    cache._memory.clear()
+    assert cache.get("b") == 2  # Read back from the second database
@@ -0,0 +1,152 @@
+# tests/test_calendar_sync.py
+"""CalendarSync and IntervalIndex against FakeCalendarHttp."""
+import datetime
+import math
+import random
+
+from src.services.calendar_service import (
+    CALENDAR_BATCH_SIZE,
+    CalendarSync,
+    IntervalIndex,
+    localize_datetime,
+)
+
+MINUTE = datetime.timedelta(minutes=1)
+ORIGIN = datetime.datetime(2030, 1, 7, 9, tzinfo=datetime.timezone.utc)
+
+
+def _sync(service):
+    sync = CalendarSync(service)
+    sync.load(ORIGIN)
+    return sync
+
+
+# --- IntervalIndex ---
+def test_index_matches_a_linear_scan():
+    rng = random.Random(7)
+    for _ in range(200):
+        intervals = []
+        for key in range(rng.randint(0, 60)):
+            start = ORIGIN + rng.randint(0, 2000) * MINUTE
+            length = rng.choice([5, 30, 60, 600, 3000]) * MINUTE
+            intervals.append((start, start + length, key))
+        index = IntervalIndex(intervals[: len(intervals) // 2])
+        for interval in intervals[len(intervals) // 2 :]:
+            index.add(*interval)
+        if intervals:
+            index.remove(intervals[0][2])
+            intervals = intervals[1:]
+        for _ in range(30):
+            start = ORIGIN + rng.randint(-100, 5000) * MINUTE
+            end = start + rng.randint(1, 200) * MINUTE
+            expected = [item for item in intervals if item[0] < end and item[1] > start]
+            found = index.conflicts(start, end)
+            assert sorted(found, key=lambda item: item[2]) == sorted(
+                expected, key=lambda item: item[2]
+            )
+            assert [item[0] for item in found] == sorted(item[0] for item in found)
+            assert index.overlaps(start, end) == bool(expected)
+
+
+def test_long_early_event_is_found_once():
+    week = (ORIGIN, ORIGIN + datetime.timedelta(days=7), "off-site")
+    short = [
+        (ORIGIN + i * 10 * MINUTE, ORIGIN + (i * 10 + 5) * MINUTE, i)
+        for i in range(500)
+    ]
+    index = IntervalIndex([week] + short)
+    found = index.conflicts(ORIGIN + 1006 * MINUTE, ORIGIN + 1008 * MINUTE)
+    assert [item[2] for item in found] == ["off-site"]
+
+
+def test_next_free_skips_busy_intervals():
+    index = IntervalIndex(
+        [
+            (ORIGIN, ORIGIN + 30 * MINUTE, "a"),
+            (ORIGIN + 30 * MINUTE, ORIGIN + 90 * MINUTE, "b"),
+        ]
+    )
+    assert index.next_free(30 * MINUTE, ORIGIN) == ORIGIN + 90 * MINUTE
+    assert index.next_free(30 * MINUTE, ORIGIN, ORIGIN + 60 * MINUTE) is None
+
+
+# --- CalendarSync ---
+def test_one_read_and_batched_inserts(calendar):
+    http, service = calendar(400, start=ORIGIN)
+    sync = _sync(service)
+    assert sync.reads == math.ceil(400 / http.PAGE_SIZE)
+
+    meetings = 120
+    scheduled = 0
+    for i in range(meetings):
+        begin = ORIGIN + (45 * i + 35) * MINUTE  # Every other one is free
+        if not sync.conflicts(begin, begin + 30 * MINUTE):
+            sync.queue_event(f"Meeting {i}", begin, begin + 30 * MINUTE)
+            scheduled += 1
+    created = sync.flush()
+    assert scheduled == meetings // 2
+    assert sum(1 for event in created.values() if event) == scheduled
+    assert sync.writes == math.ceil(scheduled / CALENDAR_BATCH_SIZE)
+    assert http.requests_by_kind["events.list"] == sync.reads
+
+    # Nothing overlaps once the queued events are on the calendar
+    busy = [
+        (
+            datetime.datetime.fromisoformat(e["start"]["dateTime"]),
+            datetime.datetime.fromisoformat(e["end"]["dateTime"]),
+        )
+        for e in http.events
+    ]
+    busy.sort()
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(busy, busy[1:]))
+
+
+def test_reservation_blocks_the_slot_until_released(calendar):
+    _, service = calendar(0)
+    sync = _sync(service)
+    start = localize_datetime(ORIGIN + datetime.timedelta(days=1))
+    end = start + 60 * MINUTE
+
+    assert sync.reserve("m1", "Planning", start, end) == []
+    assert [c[0] for c in sync.reserve("m2", "Review", start, end)] == ["Planning"]
+    assert sync.reserve("m1", "Planning", start, end) == []  # Own hold is no conflict
+
+    sync.invalidate()  # Reservations survive a reload
+    assert [c[0] for c in sync.conflicts(start, end)] == ["Planning"]
+
+    assert sync.release("m1")
+    assert sync.conflicts(start, end) == []
+    assert not sync.release("m1")
+
+
+def test_query_outside_the_window_reads_it_first(calendar):
+    later = ORIGIN + datetime.timedelta(days=3)
+    http, service = calendar(1, start=later)
+    sync = CalendarSync(service, window_days=1)
+    sync.load(ORIGIN)
+    queued = sync.queue_event("Planning", ORIGIN, ORIGIN + 30 * MINUTE)
+
+    assert [c[0] for c in sync.conflicts(later, later + 30 * MINUTE)] == [
+        "Busy block 0"
+    ]
+    assert sync.window_start <= localize_datetime(ORIGIN)
+    assert sync.window_end >= localize_datetime(later + 30 * MINUTE)
+    # The queued event is still busy after the reload
+    assert [c[0] for c in sync.conflicts(ORIGIN, ORIGIN + MINUTE)] == ["Planning"]
+    assert queued in dict(sync.pending)
+
+
+def test_queued_event_keys_are_never_reused(calendar):
+    _, service = calendar(0)
+    sync = _sync(service)
+    first = [
+        sync.queue_event(
+            f"M{i}", ORIGIN + i * 60 * MINUTE, ORIGIN + (i * 60 + 30) * MINUTE
+        )
+        for i in range(2)
+    ]
+    created = sync.flush()
+    later = sync.queue_event("M2", ORIGIN + 300 * MINUTE, ORIGIN + 330 * MINUTE)
+    assert later not in first
+    assert sorted(created) == sorted(first)
+    assert [e["summary"] for e in sync.flush().values()] == ["M2"]
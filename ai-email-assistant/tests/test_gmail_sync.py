@@ -0,0 +1,178 @@
+# tests/test_gmail_sync.py
+"""Gmail fetch and sync against FakeGmailHttp: round trips, retries, checkpoints."""
+import math
+
+import pytest
+
+from src.services import email_service
+from src.services.email_service import (
+    INGEST_RETRY_KEY,
+    batch_get_messages,
+    fetch_new_messages,
+    sync_inbox,
+)
+from tests.fakes.gmail import FakeGmailHttp, make_message
+
+
+# --- Batched fetch ---
+@pytest.mark.parametrize("count", [1, 99, 100, 101, 250, 1000])
+def test_batch_fetch_costs_one_round_trip_per_100_messages(mailbox, count):
+    http, service = mailbox(count)
+    fetched = batch_get_messages(service, list(http.messages), format="full")
+    assert len(fetched) == count
+    assert http.round_trips == math.ceil(count / 100)
+
+
+def test_transient_failure_retries_only_the_failed_message(mailbox):
+    http, service = mailbox(150)
+    http.fail(list(http.messages)[120], 503)
+    fetched = batch_get_messages(service, list(http.messages), retry_delay=0)
+    assert len(fetched) == 150
+    assert http.round_trips == 3  # Two batches, then one for the retried message
+
+
+def test_final_failure_status_is_reported(mailbox):
+    http, service = mailbox(10)
+    failing = list(http.messages)[4]
+    http.fail(failing, 404)
+    errors = {}
+    fetched = batch_get_messages(
+        service, list(http.messages), retry_delay=0, errors=errors
+    )
+    assert failing not in fetched
+    assert errors == {failing: 404}
+
+
+# --- Incremental sync ---
+def test_incremental_sync_round_trips(temp_db, mailbox):
+    http, service = mailbox(120)
+    assert sync_inbox(service, page_size=50, mode="incremental") == 120
+
+    http.round_trips = 0
+    assert sync_inbox(service, page_size=50, mode="incremental") == 0
+    assert http.round_trips == 1  # One history.list call for an idle mailbox
+
+    http.add_message(make_message(500))
+    http.round_trips = 0
+    assert sync_inbox(service, page_size=50, mode="incremental") == 1
+    assert http.round_trips == 3  # history.list, then metadata and full batches
+
+    # Expired history falls back to a full walk, which skips stored messages
+    http.expire_history()
+    http.add_message(make_message(501))
+    assert sync_inbox(service, page_size=50, mode="incremental") == 1
+    assert temp_db.count_unprocessed_emails() == 122
+
+
+def test_failed_walk_does_not_record_history_id(temp_db, mailbox):
+    http, service = mailbox(30)
+    http.list_failures = [500]
+    sync_inbox(service, mode="incremental")
+    assert temp_db.get_last_history_id() is None
+
+    # The next run walks the inbox again and only then records the checkpoint
+    sync_inbox(service, mode="incremental")
+    assert temp_db.get_last_history_id() is not None
+    assert temp_db.count_unprocessed_emails() == 30
+
+
+def test_failed_message_is_retried_on_later_runs(temp_db, mailbox, monkeypatch):
+    monkeypatch.setattr(email_service.time, "sleep", lambda seconds: None)
+    http, service = mailbox(30)
+    failing = sorted(http.messages)[5]
+    http.fail(failing, *[503] * 20)
+
+    sync_inbox(service, mode="incremental")
+    assert temp_db.count_unprocessed_emails() == 29
+    assert temp_db.get_last_history_id() is None  # Walk incomplete
+    assert failing in temp_db.get_sync_state(INGEST_RETRY_KEY)
+
+    http.failures.clear()
+    sync_inbox(service, mode="incremental")
+    assert temp_db.count_unprocessed_emails() == 30
+    assert temp_db.get_sync_state(INGEST_RETRY_KEY) is None
+    assert temp_db.get_last_history_id() is not None
+
+
+def test_deleted_message_is_not_retried(temp_db, mailbox):
+    http, service = mailbox(30)
+    http.fail(sorted(http.messages)[3], 404, 404)
+    sync_inbox(service, mode="incremental")
+    assert temp_db.count_unprocessed_emails() == 29
+    assert temp_db.get_sync_state(INGEST_RETRY_KEY) is None
+    assert temp_db.get_last_history_id() is not None
+
+
+def test_message_deleted_after_history_change_does_not_hold_checkpoint(
+    temp_db, mailbox
+):
+    http, service = mailbox(10)
+    sync_inbox(service, mode="incremental")
+    http.add_message(make_message(500))
+    http.add_message(make_message(501))
+    deleted = make_message(500)["id"]
+    http.fail(deleted, 404, 404)  # Added, then deleted before we fetched it
+
+    assert sync_inbox(service, mode="incremental") == 1
+    assert temp_db.get_last_history_id() == str(http.history_id)
+
+    # The next poll starts after the deletion instead of replaying it
+    http.round_trips = 0
+    assert sync_inbox(service, mode="incremental") == 0
+    assert http.round_trips == 1
+
+
+def test_transient_history_failure_holds_checkpoint(temp_db, mailbox, monkeypatch):
+    monkeypatch.setattr(email_service.time, "sleep", lambda seconds: None)
+    http, service = mailbox(10)
+    sync_inbox(service, mode="incremental")
+    checkpoint = temp_db.get_last_history_id()
+    http.add_message(make_message(500))
+    http.fail(make_message(500)["id"], *[503] * 20)
+
+    assert sync_inbox(service, mode="incremental") == 0
+    assert temp_db.get_last_history_id() == checkpoint
+
+    http.failures.clear()
+    assert sync_inbox(service, mode="incremental") == 1
+    assert temp_db.get_last_history_id() == str(http.history_id)
+
+
+# --- Metadata pre-filter ---
+def _promotion(index, list_unsubscribe=None):
+    return make_message(
+        index,
+        subject="Last call: 40% off, coupon inside",
+        body="Limited time sale - shop now. Unsubscribe here.",
+        html="<p>Shop now: 40% off everything!</p>" * 500,
+        list_unsubscribe=list_unsubscribe,
+    )
+
+
+def test_prefilter_skips_bodies_only_for_bulk_mail(gmail):
+    mailbox = [
+        _promotion(0, list_unsubscribe="<mailto:leave@shop.example.com>"),
+        _promotion(1),  # Promotion words, but not from a mailing list
+        make_message(2, subject="Our weekly newsletter", body="View in browser"),
+        make_message(3, subject="Your job offer expires Friday"),
+    ]
+    http = FakeGmailHttp(mailbox)
+    parsed, fetched = fetch_new_messages(gmail(http), list(http.messages))
+    assert len(parsed) == len(fetched) == 4
+    assert sorted(http.full_fetches) == [mailbox[1]["id"], mailbox[3]["id"]]
+
+
+def test_prefilter_transfers_less(gmail):
+    mailbox = [
+        _promotion(i, list_unsubscribe="<mailto:leave@shop.example.com>")
+        for i in range(20)
+    ] + [make_message(i) for i in range(20, 40)]
+    sizes = {}
+    for prefilter in (False, True):
+        http = FakeGmailHttp(mailbox)
+        parsed, _ = fetch_new_messages(
+            gmail(http), list(http.messages), prefilter=prefilter
+        )
+        assert len(parsed) == 40
+        sizes[prefilter] = http.bytes_received
+    assert sizes[True] < sizes[False] / 2
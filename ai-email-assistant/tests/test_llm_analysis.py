@@ -0,0 +1,64 @@
+# tests/test_llm_analysis.py
+"""Combined-prompt analysis and its two-step fallback, with the API stubbed out."""
+import json
+
+import pytest
+
+from src.services import llm_service
+from src.services.llm_service import analyze_email_content, analyze_emails
+
+
+def _text(value):
+    return [{"generated_text": value}]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """replies(*responses) -> list of payloads sent; each post pops a response."""
+    monkeypatch.setattr(llm_service, "HF_API_TOKEN", "token")
+    monkeypatch.setattr(llm_service, "llm_cache", None)
+    sent = []
+
+    def replies(*responses):
+        queue = list(responses)
+
+        def post(payload):
+            sent.append(payload)
+            return queue.pop(0) if queue else None
+
+        monkeypatch.setattr(llm_service, "_post_to_huggingface", post)
+        return sent
+
+    return replies
+
+
+def test_unparseable_output_falls_back_to_two_step(api):
+    sent = api(_text("not json at all"), _text("Question"))
+    analysis = analyze_email_content("Deadline?", "When is it due?", mode="combined")
+    assert analysis["intent"] == "Question"
+    assert len(sent) == 2
+
+
+def test_no_response_does_not_fall_back(api):
+    sent = api(None)
+    assert analyze_email_content("Deadline?", "When?", mode="combined") is None
+    assert len(sent) == 1  # Not doubled by the two-step flow
+
+
+def test_batch_stops_falling_back_once_the_api_is_gone(api):
+    emails = [(f"m{i}", f"Subject {i}", "Body") for i in range(4)]
+    garbled = [_text("garbled") for _ in emails]
+    sent = api(garbled, None)  # The first fallback request gets no response
+    results = analyze_emails(emails, mode="combined")
+    assert results == {message_id: None for message_id, _, _ in emails}
+    assert len(sent) == 2  # The batch, then one fallback; no more per email
+
+
+def test_batch_fallback_while_the_api_answers(api):
+    emails = [(f"m{i}", f"Subject {i}", "Body") for i in range(2)]
+    ok = _text(json.dumps({"intent": "Other", "summary": "fine"}))
+    sent = api([_text("garbled"), ok], _text("Question"))
+    results = analyze_emails(emails, mode="combined")
+    assert results["m0"]["intent"] == "Question"
+    assert results["m1"]["intent"] == "Other"
+    assert len(sent) == 2
@@ -0,0 +1,55 @@
+# tests/test_llm_client.py
+"""HuggingFaceClient retries, with the HTTP session stubbed out."""
+import pytest
+import requests
+
+from src.services import llm_service
+from src.services.llm_service import HuggingFaceClient
+
+
+def _response(status, body=b"[]", retry_after=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """make(*responses) -> client whose posts return responses in order."""
+    waits = []
+    monkeypatch.setattr(llm_service.time, "sleep", waits.append)
+
+    def make(*responses, **kwargs):
+        client = HuggingFaceClient("http://llm.invalid", "token", **kwargs)
+        replies = list(responses)
+        client.posts = 0
+        client.waits = waits
+
+        def post(*args, **kw):
+            client.posts += 1
+            return replies.pop(0)
+
+        client.session.post = post
+        return client
+
+    return make
+
+
+def test_retry_after_is_honoured_in_full(client):
+    llm = client(
+        _response(429, retry_after=20),
+        _response(200, b'[{"generated_text": "ok"}]'),
+        backoff_cap=30.0,
+    )
+    assert llm.query({"inputs": "hi"}) == [{"generated_text": "ok"}]
+    assert llm.waits == [20.0]
+
+
+def test_retry_after_over_the_cap_gives_up(client):
+    llm = client(_response(429, retry_after=120), _response(200), backoff_cap=30.0)
+    assert llm.query({"inputs": "hi"}) is None
+    assert llm.posts == 1  # No early retry into another 429
+    assert llm.waits == []
@@ -0,0 +1,121 @@
+# tests/test_pipeline.py
+"""Pipeline: ordering, shutdown, worker errors and backpressure."""
+import threading
+import time
+
+from src.utils.pipeline import Pipeline, Stage
+
+
+def _collector():
+    """A final stage handler that records what reached it, in order."""
+    seen = []
+
+    def collect(item):
+        seen.append(item)
+        return item
+
+    return seen, collect
+
+
+def _pipeline_threads():
+    names = ("fetch-", "double-", "collect-", "slow-", "fast-", "batch-")
+    return [t for t in threading.enumerate() if t.name.startswith(names)]
+
+
+def test_single_workers_keep_source_order():
+    seen, collect = _collector()
+    stats = Pipeline(
+        [Stage("double", lambda x: x * 2), Stage("collect", collect)], queue_size=2
+    ).run(range(50))
+    assert seen == [x * 2 for x in range(50)]
+    assert stats["items"] == 50
+    assert stats["stages"]["collect"]["processed"] == 50
+
+
+def test_stop_sentinel_ends_every_worker():
+    seen, collect = _collector()
+    stages = [
+        Stage("double", lambda x: x * 2, workers=4),
+        Stage("batch", lambda batch: batch, workers=3, batch_size=5),
+        Stage("collect", collect, workers=2),
+    ]
+    Pipeline(stages, queue_size=4).run(range(100))
+    assert sorted(seen) == [x * 2 for x in range(100)]
+    assert _pipeline_threads() == []  # run() returned after every _STOP
+
+
+def test_stop_event_drains_items_already_fed():
+    stop = threading.Event()
+    seen, collect = _collector()
+
+    def source():
+        for i in range(1000):
+            if i == 20:
+                stop.set()
+            yield i
+
+    pipeline = Pipeline([Stage("collect", collect)], queue_size=4)
+    stats = pipeline.run(source(), stop=stop)
+    assert stats["items"] == 20
+    assert seen == list(range(20))
+
+
+def test_worker_errors_drop_only_their_items():
+    seen, collect = _collector()
+
+    def fail_on_sevens(x):
+        if x % 7 == 0:
+            raise ValueError(f"bad item {x}")
+        return x
+
+    def fail_batches_with_ten(batch):
+        if 10 in batch:
+            raise ValueError("bad batch")
+        return batch
+
+    stages = [
+        Stage("double", fail_on_sevens, workers=3),
+        Stage("batch", fail_batches_with_ten, batch_size=1),
+        Stage("collect", collect),
+    ]
+    stats = Pipeline(stages, queue_size=4).run(range(30))
+    assert sorted(seen) == [x for x in range(30) if x % 7 and x != 10]
+    assert stats["stages"]["double"]["errors"] == 5
+    assert stats["stages"]["batch"]["errors"] == 1
+    assert stats["stages"]["collect"]["errors"] == 0
+
+
+def test_failing_source_still_shuts_down():
+    seen, collect = _collector()
+
+    def source():
+        yield from range(5)
+        raise OSError("database went away")
+
+    stats = Pipeline([Stage("collect", collect, workers=2)]).run(source())
+    assert stats["items"] == 5
+    assert sorted(seen) == list(range(5))
+
+
+def test_bounded_queues_hold_back_the_source():
+    queue_size = 2
+    fed, done = [0], [0]
+    lead = []
+
+    def source():
+        for i in range(40):
+            fed[0] += 1
+            lead.append(fed[0] - done[0])
+            yield i
+
+    def slow(item):
+        time.sleep(0.005)
+        done[0] += 1
+        return item
+
+    Pipeline(
+        [Stage("fast", lambda x: x), Stage("slow", slow)], queue_size=queue_size
+    ).run(source())
+    # Two queues, one item in each handler and one waiting in the feeder
+    assert max(lead) <= 2 * queue_size + 3
+    assert done[0] == 40
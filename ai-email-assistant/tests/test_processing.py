@@ -0,0 +1,51 @@
+# tests/test_processing.py
+"""The email pipeline in src/main.py end to end, with the LLM stubbed out."""
+import json
+
+import pytest
+
+import src.main as main
+from src.services import llm_service
+from src.services.analysis_backend import RemoteBackend
+from src.services.email_service import sync_inbox
+from tests.fakes.gmail import FakeGmailHttp, make_message
+
+
+@pytest.fixture
+def inbox(temp_db, gmail, monkeypatch):
+    """Stores a small inbox and routes analysis to the remote backend only."""
+    monkeypatch.setattr(main, "get_analysis_backend", RemoteBackend)
+    monkeypatch.setattr(llm_service, "llm_cache", None)
+    messages = [
+        make_message(0, subject="Budget review notes"),
+        make_message(1, subject="Release checklist"),
+        make_message(2, subject="Our weekly newsletter", body="View in browser"),
+        make_message(3, subject="", body=""),
+    ]
+    sync_inbox(gmail(FakeGmailHttp(messages)), mode="full")
+    return temp_db
+
+
+def _process():
+    main.build_pipeline().run(main.iter_unprocessed_emails())
+
+
+def _answer(payload):
+    inputs = payload["inputs"]
+    output = {"generated_text": json.dumps({"intent": "Other", "summary": "ok"})}
+    return [[output] for _ in inputs] if isinstance(inputs, list) else [output]
+
+
+@pytest.mark.parametrize("batch_size", [1, 16])
+def test_llm_outage_leaves_emails_for_the_next_run(inbox, monkeypatch, batch_size):
+    monkeypatch.setattr(main, "LLM_BATCH_SIZE_MAX", batch_size)
+    monkeypatch.setattr(llm_service, "HF_API_TOKEN", None)
+    _process()
+    # The rule-classified newsletter and the empty email are done; the two
+    # that needed the LLM are not consumed by the outage
+    assert inbox.count_unprocessed_emails() == 2
+
+    monkeypatch.setattr(llm_service, "HF_API_TOKEN", "token")
+    monkeypatch.setattr(llm_service, "_post_to_huggingface", _answer)
+    _process()
+    assert inbox.count_unprocessed_emails() == 0
@@ -0,0 +1,56 @@
+# tests/test_rules.py
+"""Keyword rules from config/rules.json."""
+import pytest
+
+from src.utils.config import RULES_FILE
+from src.utils.rules import load_rules
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return load_rules(RULES_FILE)
+
+
+def _classify(engine, subject, body=""):
+    rule = engine.classify(engine.scan(subject, body, record=False), record=False)
+    return rule and rule.intent
+
+
+def test_keywords_match_whole_words_only(engine):
+    match = engine.scan("We buy wholesale", "Offers are handled by sales", record=False)
+    assert "sale" not in match.keywords.get("promotion", set())
+    assert "offer" not in match.keywords.get("promotion", set())
+    assert engine.scan("Big SALE: 50% off", record=False).keywords["promotion"] == {
+        "sale",
+        "% off",
+    }
+
+
+def test_generic_words_do_not_classify(engine):
+    assert (
+        _classify(engine, "Your job offer expires Friday", "Wholesale pricing") is None
+    )
+
+
+def test_strong_markers_classify(engine):
+    assert (
+        _classify(engine, "Big SALE: 50% off everything", "Shop now. Unsubscribe here.")
+        == "Spam/Unimportant"
+    )
+    assert (
+        _classify(engine, "Our weekly newsletter", "View in browser")
+        == "Information Sharing"
+    )
+
+
+@pytest.mark.parametrize(
+    "subject",
+    [
+        "Can we set up a meeting?",
+        "Scheduling our next review",
+        "Quick discussion about the roadmap",
+        "What is your availability next week?",
+    ],
+)
+def test_inflected_meeting_cues_are_tagged(engine, subject):
+    assert engine.scan(subject, record=False).hit("meeting_cues")
@@ -0,0 +1,81 @@
+# tests/test_slack_notifier.py
+"""SlackNotifier digests and retries against FakeSlackServer."""
+import math
+import time
+
+import pytest
+from slack_sdk import WebClient
+
+from src.services.slack_service import SlackNotifier
+from tests.fakes.slack import FakeSlackServer
+
+INTERVAL = 0.2  # Per-channel posting interval, shortened from Slack's 1s
+
+
+@pytest.fixture
+def slack():
+    with FakeSlackServer(channel_interval=INTERVAL, latency=0.0) as server:
+        yield server
+
+
+@pytest.fixture
+def notifier(slack):
+    notifier = SlackNotifier(
+        WebClient(token="xoxb-fake", base_url=slack.url),
+        "C1",
+        window_seconds=0.2,
+        max_batch=10,
+        max_retries=2,
+        min_interval=INTERVAL,
+        backoff_base=0.01,
+        backoff_cap=2.0,
+    )
+    yield notifier
+    notifier.close(timeout=10)
+
+
+def _email(i):
+    return {
+        "sender": f"person{i}@example.com",
+        "subject": f"Contract <draft {i}> & pricing",
+        "intent": "Action Required",
+        "message_id": f"msg{i:04d}",
+    }
+
+
+def test_notifications_go_out_as_digests(slack, notifier):
+    count = 25
+    start = time.perf_counter()
+    futures = [notifier.notify(_email(i)["subject"], _email(i)) for i in range(count)]
+    assert time.perf_counter() - start < 0.1  # notify() never waits on Slack
+    assert notifier.flush(timeout=10)
+
+    assert all(future.result() for future in futures)
+    assert len(slack.messages) == math.ceil(count / notifier.max_batch)
+    assert slack.rate_limited == 0  # Posts were spaced by min_interval
+    assert notifier.stats()["delivered"] == count
+
+    # Subjects are escaped for mrkdwn, not sent as raw angle brackets
+    text = str(slack.messages[0]["blocks"])
+    assert "&lt;draft 0&gt;" in text and "<draft 0>" not in text
+
+
+def test_server_errors_and_rate_limits_are_retried(slack, notifier):
+    slack.fail_next = [500, 429]  # The 429 carries Retry-After: 1
+    start = time.perf_counter()
+    future = notifier.notify("Retried notification")
+    assert notifier.flush(timeout=10)
+    assert future.result() is True
+    assert time.perf_counter() - start >= 1.0
+    assert notifier.retries == 2
+    assert notifier.rate_limited == 1
+    assert len(slack.messages) == 1
+
+
+def test_gives_up_after_max_retries(slack, notifier):
+    slack.fail_next = [500] * (notifier.max_retries + 1)
+    future = notifier.notify("Never delivered")
+    notifier.flush(timeout=10)
+    assert future.result() is False
+    assert notifier.stats()["failed"] == 1
+    assert slack.messages == []
@@ -0,0 +1,172 @@
+# tests/test_web_search.py
+"""Provider fan-out, the search cache and per-provider circuit breakers."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import src.services.web_search_service as web
+from src.storage.answers import AnswerIndex
+from src.storage.cache import ResponseCache
+from tests.fakes.search import FakeDDGS, FakeProvider, hits
+
+
+@pytest.fixture(autouse=True)
+def fresh_search_state(monkeypatch):
+    """Module-level search state (cache, breakers, sessions) per test."""
+    monkeypatch.setattr(web, "_breakers", {})
+    monkeypatch.setattr(web, "_provider_stats", {})
+    monkeypatch.setattr(web, "_stats", dict.fromkeys(web._stats, 0))
+    monkeypatch.setattr(web, "_clients", threading.local())
+    monkeypatch.setattr(web, "_providers", None)
+
+
+def _fan_out(providers, strategy="first", deadline=2.0):
+    start = time.perf_counter()
+    results, sources = asyncio.run(
+        web.fan_out(providers, "q", strategy=strategy, deadline=deadline)
+    )
+    return results, sources, time.perf_counter() - start
+
+
+# --- Fan-out ---
+def test_first_strategy_returns_the_fastest_answer():
+    providers = [
+        FakeProvider("past_answers", 0.01, hits("local")),
+        FakeProvider("duckduckgo", 0.8, hits("ddg")),
+    ]
+    results, sources, elapsed = _fan_out(providers)
+    assert sources == ["past_answers"]
+    assert [r["href"] for r in results] == [r["href"] for r in hits("local")]
+    assert elapsed < 0.5  # The slower provider was cancelled, not awaited
+    assert providers[1].finished == 0
+
+
+def test_empty_local_answer_waits_for_a_remote_one():
+    providers = [
+        FakeProvider("past_answers", 0.01, []),
+        FakeProvider("duckduckgo", 0.8, hits("ddg")),
+        FakeProvider("extra", 0.3, hits("extra")),
+    ]
+    results, sources, elapsed = _fan_out(providers)
+    assert sources == ["extra"]
+    assert elapsed < 0.7
+
+
+def test_merge_combines_results_up_to_max():
+    providers = [
+        FakeProvider("a", 0.01, hits("a", 2)),
+        FakeProvider("b", 0.05, hits("b", 2)),
+    ]
+    results, sources, _ = _fan_out(providers, strategy="merge")
+    assert sources == ["a", "b"]
+    assert len(results) == 3
+
+
+def test_failures_and_timeouts_give_none():
+    providers = [
+        FakeProvider("duckduckgo", 3.0, hits("ddg"), timeout=0.2),
+        FakeProvider("extra", 0.05, fail=True),
+    ]
+    results, sources, elapsed = _fan_out(providers)
+    assert results is None and sources == []
+    assert elapsed < 1.0
+    stats = web.get_search_stats()["providers"]
+    assert stats["duckduckgo"]["timeouts"] == 1
+    assert stats["extra"]["errors"] == 1
+
+
+# --- Circuit breakers ---
+def test_failing_provider_is_paused_without_pausing_others(monkeypatch):
+    monkeypatch.setattr(web, "WEB_SEARCH_BREAKER_FAILURES", 2)
+    failing = FakeProvider("flaky", 0.0, fail=True)
+    healthy = FakeProvider("steady", 0.01, hits("steady"))
+    for _ in range(4):
+        results, sources, _ = _fan_out([failing, healthy])
+        assert sources == ["steady"]
+    assert failing.finished == 2  # Then its breaker opened
+    breakers = web.get_search_stats()["breakers"]
+    assert breakers["flaky"]["state"] == "open"
+    assert breakers["steady"]["state"] == "closed"
+
+
+def test_losing_the_race_is_not_a_failure(monkeypatch):
+    monkeypatch.setattr(web, "WEB_SEARCH_BREAKER_FAILURES", 1)
+    slow = FakeProvider("slow", 0.5, hits("slow"))
+    for _ in range(3):
+        _fan_out([FakeProvider("fast", 0.0, hits("fast")), slow])
+    assert web.get_breaker("slow").state == "closed"
+
+
+# --- DuckDuckGo sessions ---
+def test_duckduckgo_calls_run_in_parallel(monkeypatch):
+    monkeypatch.setattr(web, "_new_client", lambda: FakeDDGS(latency=0.3))
+    threads = [
+        threading.Thread(target=web._fetch_results, args=(f"q{i}", 3)) for i in range(8)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - start < 1.0  # Not 8 x 0.3s behind one lock
+    assert web.get_search_stats()["provider_calls"] == 8
+
+
+def test_duckduckgo_sessions_are_reused_across_searches(monkeypatch):
+    created = []
+
+    def new_client():
+        created.append(FakeDDGS())
+        return created[-1]
+
+    monkeypatch.setattr(web, "_new_client", new_client)
+    provider = web.DuckDuckGoProvider()
+    for i in range(10):
+        results, sources, _ = _fan_out([provider])
+        assert sources == ["duckduckgo"]
+    # One session per pool thread, not one per asyncio.run()
+    assert 1 <= len(created) <= web._executor._max_workers
+    assert sum(client.calls for client in created) == 10
+
+
+# --- Cache ---
+@pytest.fixture
+def search_backend(temp_db, monkeypatch):
+    """search_web() over FakeDDGS with an empty cache and past-answer index."""
+    fake = FakeDDGS()
+    monkeypatch.setattr(web, "_new_client", lambda: fake)
+    monkeypatch.setattr(
+        web,
+        "search_cache",
+        ResponseCache(
+            "web_search", ttl_seconds=3600, max_entries=100, stale_seconds=3600
+        ),
+    )
+    monkeypatch.setattr(web, "answer_index", AnswerIndex())
+    monkeypatch.setattr(web, "WEB_SEARCH_PROVIDERS", ["past_answers", "duckduckgo"])
+    return fake
+
+
+def test_reply_prefixes_share_one_cache_entry(search_backend):
+    for subject in [
+        "Re: Deadline for Q3?",
+        "RE: re: deadline  for q3?",
+        "Fwd: Deadline for Q3?",
+    ]:
+        assert "example.com" in web.search_web(subject)
+    assert search_backend.calls == 1
+    assert web.normalize_query("RE[2]: AW: Fwd:  Budget ") == "budget"
+
+
+def test_stale_entry_is_served_while_refreshing(search_backend):
+    web.search_cache.ttl_seconds = 0  # Entries written from now on are stale
+    web.search_web("Stale question")
+    start = time.perf_counter()
+    assert "example.com" in web.search_web("Re: stale question")
+    assert time.perf_counter() - start < 0.1
+    deadline = time.monotonic() + 5
+    while web.get_search_stats()["refreshes"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert search_backend.calls == 2